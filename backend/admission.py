@@ -0,0 +1,80 @@
+"""
+Контроль допуска запросов к идентификации.
+
+Одновременно выполняется не больше max_inflight идентификаций; остальные
+ждут в очереди длиной не больше max_queue и не дольше queue_timeout секунд.
+Если очередь полна или срок ожидания истёк, запрос сразу отклоняется
+(AdmissionRejected -> 503 с Retry-After), а не копится, увеличивая задержку
+всех остальных. Лёгкие маршруты (/health, монитор) через контроль не
+проходят и при перегрузке отвечают как обычно.
+
+Retry-After оценивается по скользящему среднему времени выполнения:
+сколько примерно займёт разбор уже стоящей очереди.
+"""
+
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+
+
+class AdmissionRejected(Exception):
+    """Запрос не допущен к выполнению — повторить через retry_after секунд"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Ограничение одновременных запросов с ограниченной очередью и сроком ожидания"""
+
+    def __init__(self, max_inflight: int, max_queue: int = 64, queue_timeout: float = 5.0):
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self.inflight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._service_time = 0.5  # скользящее среднее, секунды
+        self._semaphore = asyncio.Semaphore(max_inflight)
+
+    def retry_after(self) -> int:
+        """Примерное время до освобождения места, целые секунды (не меньше 1)"""
+        backlog = (self.waiting + self.inflight) / self.max_inflight
+        return max(1, math.ceil(backlog * self._service_time))
+
+    @asynccontextmanager
+    async def slot(self):
+        """Место для одного запроса; AdmissionRejected, если его не дождаться"""
+        if self._semaphore.locked():
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                raise AdmissionRejected(
+                    f"Сервис перегружен: в очереди {self.waiting} запросов", self.retry_after()
+                )
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.timed_out += 1
+                raise AdmissionRejected(
+                    f"Запрос не дождался обработки за {self.queue_timeout:g} сек", self.retry_after()
+                )
+            finally:
+                self.waiting -= 1
+        else:
+            await self._semaphore.acquire()
+
+        self.inflight += 1
+        self.admitted += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.inflight -= 1
+            self._semaphore.release()
+            self._service_time = 0.9 * self._service_time + 0.1 * (time.perf_counter() - start)
@@ -0,0 +1,41 @@
+"""
+Приведение входящего аудио к каноническому виду: моно, float32, 16 кГц.
+
+Модуль не зависит от настроек сервера (config), поэтому им пользуются и
+пул идентификации, и автономные скрипты вроде prepare_initial_dataset.py.
+"""
+
+import io
+
+from metrics import metrics
+
+TARGET_SR = 16000
+
+
+def to_canonical(audio_data, sr: int):
+    """Моно float32 с частотой TARGET_SR"""
+    if audio_data.ndim > 1:
+        audio_data = audio_data.mean(axis=1)
+
+    # Ресемплинг если нужно
+    if sr != TARGET_SR:
+        import librosa
+        with metrics.stage("resample"):
+            audio_data = librosa.resample(audio_data, orig_sr=sr, target_sr=TARGET_SR)
+
+    return audio_data.astype("float32", copy=False), TARGET_SR
+
+
+def decode_audio(source):
+    """Декодирует аудиофайл (байты или путь) в канонический вид"""
+    import soundfile as sf
+
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    with metrics.stage("decode"):
+        try:
+            audio_data, sr = sf.read(source, dtype="float32")
+        except RuntimeError as e:  # ошибки libsndfile — подкласс RuntimeError
+            raise ValueError(f"Не удалось декодировать аудио: {getattr(e, 'error_string', e)}")
+
+    return to_canonical(audio_data, sr)
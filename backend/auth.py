@@ -5,17 +5,22 @@ if not hasattr(bcrypt, "__about__"):
     bcrypt.__about__ = type('About', (object,), {'__version__': bcrypt.__version__})
 
 
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import event, inspect
 from sqlalchemy.orm import Session
 from database import get_db
 import models
 import schemas
 from config import settings
+from metrics import metrics
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
@@ -28,6 +33,62 @@ def get_password_hash(password: str) -> str:
     # Truncate to 72 bytes for bcrypt compatibility
     return pwd_context.hash(password[:72])
 
+class UserCache:
+    """
+    Пользователи по имени (subject JWT) на короткое время.
+    
+    Запись хранится отсоединённой от сессии, поэтому доступны только
+    загруженные столбцы — связи (voice_profiles и т.п.) из кэша не читаются.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # имя -> (момент истечения, пользователь)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, username: str) -> Optional[models.User]:
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[username]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(username)
+            return entry[1]
+
+    def set(self, username: str, user: models.User):
+        if self.max_entries <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[username] = (time.monotonic() + self.ttl, user)
+            self._entries.move_to_end(username)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, username: str):
+        with self._lock:
+            self._entries.pop(username, None)
+
+user_cache = UserCache(settings.AUTH_CACHE_SIZE, settings.AUTH_CACHE_TTL)
+
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _invalidate_cached_user(mapper, connection, target):
+    """
+    Изменённый (например, деактивированный) или удалённый пользователь
+    сразу убирается из кэша. Событие срабатывает на изменения через ORM
+    в этом процессе; правки в обход него вступят в силу через AUTH_CACHE_TTL.
+    """
+    user_cache.invalidate(target.username)
+    for old_username in inspect(target).attrs.username.history.deleted:
+        user_cache.invalidate(old_username)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -38,6 +99,28 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
+def get_user_from_token(token: str, db: Session) -> Optional[models.User]:
+    """Пользователь по JWT-токену или None, если токен недействителен"""
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        return None
+    username: str = payload.get("sub")
+    if username is None:
+        return None
+    
+    user = user_cache.get(username)
+    if user is None:
+        with metrics.stage("auth_db"):
+            user = db.query(models.User).filter(models.User.username == username).first()
+        if user is None:
+            return None
+        db.expunge(user)
+        user_cache.set(username, user)
+    if not user.is_active:
+        return None
+    return user
+
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db)
@@ -47,15 +130,7 @@ async def get_current_user(
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    
-    user = db.query(models.User).filter(models.User.username == username).first()
+    user = get_user_from_token(token, db)
     if user is None:
         raise credentials_exception
     return user
\ No newline at end of file
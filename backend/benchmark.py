@@ -0,0 +1,336 @@
+"""
+Воспроизводимый замер производительности конвейера идентификации.
+
+Синтетические речеподобные записи (feature_engine.synthetic_speech, с
+фиксированными seed) нескольких длительностей и частот дискретизации
+прогоняются через:
+    - MLService.preprocess_audio и MLService.extract_features;
+    - predict_proba каждой модели (RF, SVM, LR) на пакетах разного размера;
+    - весь путь /api/identify через ASGI-клиент в том же процессе
+      (декодирование, ресемплинг, пул воркеров, классификация, лог);
+    - с --audio-dir — чтение и извлечение признаков на настоящих записях,
+      подготовленных prepare_initial_dataset.py (по его manifest.json).
+
+Для каждого замера — p50/p95/p99, среднее, пропускная способность и пик
+памяти Python-аллокаций (tracemalloc, отдельным прогоном, чтобы трассировка
+не искажала время). Результат пишется в JSON, который можно сравнить
+с результатом другого коммита:
+
+    python benchmark.py --output before.json
+    python benchmark.py --output after.json --compare before.json
+
+Путь /api/identify пишет логи идентификации — запускайте с DATABASE_URL
+тестовой базы.
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+# Рост p50 больше этой доли при сравнении считается замедлением
+REGRESSION_THRESHOLD = 0.10
+
+
+def measure(fn: Callable, repeat: int, warmup: int = 1, items: int = 1) -> Dict:
+    """Время вызовов fn и пик памяти; items — записей за один вызов"""
+    for _ in range(warmup):
+        fn()
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return summarize(timings, items, peak)
+
+
+def summarize(timings: List[float], items: int = 1, peak_memory: int = None) -> Dict:
+    timings = np.asarray(timings)
+    result = {
+        "n": len(timings),
+        "p50_ms": float(np.percentile(timings, 50) * 1000),
+        "p95_ms": float(np.percentile(timings, 95) * 1000),
+        "p99_ms": float(np.percentile(timings, 99) * 1000),
+        "mean_ms": float(timings.mean() * 1000),
+        "throughput_per_s": float(items * len(timings) / timings.sum()),
+    }
+    if peak_memory is not None:
+        result["peak_memory_mb"] = peak_memory / 2**20
+    return result
+
+
+def wav_bytes(audio: np.ndarray, sr: int) -> bytes:
+    import soundfile as sf
+
+    buffer = io.BytesIO()
+    sf.write(buffer, audio, sr, format="WAV")
+    return buffer.getvalue()
+
+
+def bench_features(ml_service, durations: List[float], repeat: int) -> Dict:
+    import feature_engine
+
+    results = {}
+    for duration in durations:
+        audio = feature_engine.synthetic_speech(duration, 16000, seed=int(duration * 10))
+        results[f"preprocess_audio/{duration:g}s"] = measure(
+            lambda: ml_service.preprocess_audio(audio, 16000), repeat
+        )
+        results[f"extract_features/{duration:g}s"] = measure(
+            lambda: ml_service.extract_features(audio, 16000), repeat
+        )
+        print(f"   признаки {duration:g} сек: "
+              f"{results[f'extract_features/{duration:g}s']['p50_ms']:.1f} мс (p50)")
+    return results
+
+
+def bench_corpus(ml_service, audio_dir: str, limit: int, repeat: int) -> Dict:
+    """Записи из манифеста подготовленного датасета: уже канонические, без ресемплинга"""
+    import soundfile as sf
+    from pathlib import Path
+
+    manifest = json.loads((Path(audio_dir) / "manifest.json").read_text(encoding="utf-8"))
+    paths = [Path(audio_dir) / key for key in sorted(manifest)[:limit]]
+    clips = [sf.read(str(path), dtype="float32")[0] for path in paths]
+    seconds = sum(len(clip) for clip in clips) / 16000
+
+    results = {
+        "corpus/read": measure(
+            lambda: [sf.read(str(path), dtype="float32") for path in paths], repeat, items=len(paths)
+        ),
+        "corpus/extract_features": measure(
+            lambda: [ml_service.extract_features(clip, 16000) for clip in clips], repeat, items=len(clips)
+        ),
+    }
+    for result in results.values():
+        result["audio_seconds"] = seconds
+    print(f"   {len(paths)} записей ({seconds:.0f} сек): "
+          f"{results['corpus/extract_features']['throughput_per_s']:.1f} записей/сек")
+    return results
+
+
+def bench_models(ml_service, batch_sizes: List[int], repeat: int) -> Dict:
+    import feature_engine
+
+    bundle = ml_service.bundle
+    rows = [
+        ml_service.extract_features(feature_engine.synthetic_speech(2.0, 16000, f0=100 + 5 * i, seed=i), 16000)
+        for i in range(max(batch_sizes))
+    ]
+    features = np.vstack(rows)
+
+    results = {}
+    for batch_size in batch_sizes:
+        batch = features[:batch_size]
+        results[f"scaler/batch{batch_size}"] = measure(
+            lambda: bundle.scaler.transform(batch), repeat, items=batch_size
+        )
+        scaled = bundle.scaler.transform(batch)
+        for name in ("rf", "svm", "lr"):
+            model = getattr(bundle, f"{name}_model")
+            results[f"{name}.predict_proba/batch{batch_size}"] = measure(
+                lambda: model.predict_proba(scaled), repeat, items=batch_size
+            )
+        results[f"score_batch/batch{batch_size}"] = measure(
+            lambda: ml_service.score_batch(batch), repeat, items=batch_size
+        )
+        print(f"   модели, пакет {batch_size}: "
+              f"{results[f'score_batch/batch{batch_size}']['p50_ms']:.1f} мс (p50)")
+    return results
+
+
+@asynccontextmanager
+async def in_process_client(username: str, timeout: float = 60):
+    """
+    HTTP-клиент к приложению в этом же процессе (ASGI, без сети) от имени
+    служебного пользователя, без проверки токена.
+
+    ASGI-клиент сам не запускает lifespan приложения, поэтому он входит в
+    него явно: без этого не стартуют пул и фоновая запись логов, и строки
+    лога вставлялись бы прямо в запросе — измерялась бы в основном она.
+    """
+    import httpx
+    import main
+    import models
+    from auth import get_current_user
+
+    user = models.User(id=None, username=username, email=f"{username}@localhost", is_active=True)
+    main.app.dependency_overrides[get_current_user] = lambda: user
+    try:
+        async with main.app.router.lifespan_context(main.app), httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=main.app), base_url=f"http://{username}", timeout=timeout
+        ) as client:
+            yield client
+    finally:
+        main.app.dependency_overrides.pop(get_current_user, None)
+
+
+async def _bench_endpoint(durations: List[float], sample_rates: List[int], repeat: int) -> Dict:
+    import feature_engine
+    import main
+
+    # Одинаковые записи иначе отвечались бы из кэша результатов
+    main.result_cache.enabled = False
+
+    results = {}
+    try:
+        async with in_process_client("benchmark") as client:
+            async def identify(audio_bytes: bytes):
+                response = await client.post(
+                    "/api/identify",
+                    files={"audio_file": ("sample.wav", audio_bytes, "audio/wav")}
+                )
+                response.raise_for_status()
+
+            for sr in sample_rates:
+                for duration in durations:
+                    audio_bytes = wav_bytes(feature_engine.synthetic_speech(duration, sr, seed=sr % 97), sr)
+                    await identify(audio_bytes)  # прогрев воркеров пула
+
+                    timings = []
+                    for _ in range(repeat):
+                        start = time.perf_counter()
+                        await identify(audio_bytes)
+                        timings.append(time.perf_counter() - start)
+
+                    # Параллельные запросы: пропускная способность всего пула
+                    concurrency = main.inference_pool.workers
+                    start = time.perf_counter()
+                    await asyncio.gather(*(identify(audio_bytes) for _ in range(concurrency * 2)))
+                    elapsed = time.perf_counter() - start
+
+                    key = f"identify/{sr}Hz/{duration:g}s"
+                    results[key] = summarize(timings)
+                    results[key]["concurrent_throughput_per_s"] = concurrency * 2 / elapsed
+                    print(f"   /api/identify {sr} Гц, {duration:g} сек: "
+                          f"{results[key]['p50_ms']:.1f} мс (p50)")
+    finally:
+        main.result_cache.enabled = True
+    return results
+
+
+def environment() -> Dict:
+    """Сведения для сопоставимости результатов разных прогонов"""
+    import sklearn
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "sklearn": sklearn.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def peak_rss_mb() -> Optional[float]:
+    """
+    Пиковый RSS процесса в МБ. resource есть только на POSIX; на Windows —
+    peak_wset из psutil (или текущий RSS, если пик недоступен), а без
+    psutil — None.
+    """
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        memory = psutil.Process(os.getpid()).memory_info()
+        return getattr(memory, "peak_wset", memory.rss) / 2**20
+    # ru_maxrss — в КБ на Linux и в байтах на macOS
+    scale = 2**20 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def compare(current: Dict, baseline: Dict) -> bool:
+    """Печатает изменение p50 по общим замерам; False, если есть замедления"""
+    ok = True
+    print(f"\nСравнение с {baseline['environment'].get('commit') or 'базовым прогоном'}:")
+    for key, result in current["results"].items():
+        old = baseline["results"].get(key)
+        if old is None:
+            continue
+        change = result["p50_ms"] / old["p50_ms"] - 1
+        slower = change > REGRESSION_THRESHOLD
+        ok = ok and not slower
+        print(f"   {key:40s} {old['p50_ms']:9.2f} -> {result['p50_ms']:9.2f} мс "
+              f"({change:+.1%}){'  ЗАМЕДЛЕНИЕ' if slower else ''}")
+    return ok
+
+
+def parse_list(value: str, cast) -> list:
+    return [cast(item) for item in value.split(",") if item.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Замер производительности конвейера идентификации")
+    parser.add_argument("--durations", default="1,3,10", help="Длительности записей, сек")
+    parser.add_argument("--sample-rates", default="16000,44100", help="Частоты дискретизации для /api/identify")
+    parser.add_argument("--batch-sizes", default="1,32", help="Размеры пакетов для моделей")
+    parser.add_argument("--repeat", type=int, default=20, help="Повторов каждого замера")
+    parser.add_argument("--audio-dir", help="Подготовленный датасет (с manifest.json) для замера на записях")
+    parser.add_argument("--corpus-files", type=int, default=50, help="Сколько записей датасета замерять")
+    parser.add_argument("--skip-endpoint", action="store_true", help="Не замерять /api/identify")
+    parser.add_argument("--output", default="benchmark.json", help="Файл результатов")
+    parser.add_argument("--compare", help="Результат другого прогона для сравнения")
+    args = parser.parse_args()
+
+    durations = parse_list(args.durations, float)
+
+    print("Загрузка моделей...")
+    from ml_service import ml_service
+
+    results = {}
+    print("Извлечение признаков:")
+    results.update(bench_features(ml_service, durations, args.repeat))
+    if args.audio_dir:
+        print("Подготовленный датасет:")
+        results.update(bench_corpus(ml_service, args.audio_dir, args.corpus_files, args.repeat))
+    print("Модели:")
+    results.update(bench_models(ml_service, parse_list(args.batch_sizes, int), args.repeat))
+    if not args.skip_endpoint:
+        print("Полный путь /api/identify:")
+        results.update(asyncio.run(
+            _bench_endpoint(durations, parse_list(args.sample_rates, int), args.repeat)
+        ))
+
+    report = {
+        "environment": {**environment(), "model_version": ml_service.model_version},
+        "settings": {"repeat": args.repeat},
+        "max_rss_mb": peak_rss_mb(),
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nРезультаты записаны в {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            if not compare(report, json.load(f)):
+                raise SystemExit(1)
@@ -0,0 +1,49 @@
+"""
+Каскад ансамбля без привязки к сервису: общий для MLService и для оценки
+каскада при переобучении (retrain_model.evaluate_cascade).
+
+Модели запускаются по очереди, и каждая следующая получает только записи,
+где разрыв между двумя лучшими классами текущего голосования меньше margin.
+Если дошло до всех моделей, результат совпадает с полным ансамблем.
+"""
+
+from typing import Callable, List, Tuple
+
+import numpy as np
+
+# Веса моделей во взвешенном голосовании ансамбля (больше веса SVM для акцентов)
+MODEL_WEIGHTS = {"rf": 0.5, "svm": 0.3, "lr": 0.2}
+
+
+def cascade_vote(predict_proba: Callable[[str, np.ndarray], np.ndarray], n: int,
+                 stages: List[str], margin: float) -> Tuple[np.ndarray, List[List[str]]]:
+    """
+    predict_proba(имя модели, номера записей) -> вероятности этих записей.
+
+    Returns:
+        (вероятности формы (n, n_classes), список запущенных моделей для каждой записи)
+    """
+    weighted = None
+    weights = np.zeros(n)
+    ran = [[] for _ in range(n)]
+    active = np.arange(n)
+
+    for i, name in enumerate(stages):
+        proba = predict_proba(name, active)
+        if weighted is None:
+            weighted = np.zeros((n, proba.shape[1]))
+        weighted[active] += MODEL_WEIGHTS[name] * proba
+        weights[active] += MODEL_WEIGHTS[name]
+        for row in active:
+            ran[row].append(name)
+
+        if i == len(stages) - 1 or weighted.shape[1] < 2:
+            break
+
+        # Уверенные записи выходят из каскада
+        top_2 = np.sort(weighted[active] / weights[active, None], axis=1)[:, -2:]
+        active = active[top_2[:, 1] - top_2[:, 0] < margin]
+        if len(active) == 0:
+            break
+
+    return weighted / weights[:, None], ran
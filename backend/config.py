@@ -4,6 +4,17 @@ from typing import Optional
 class Settings(BaseSettings):
     # Database
     DATABASE_URL: str
+    DB_ECHO: bool = False  # печать SQL-запросов (отдельно от DEBUG)
+    
+    # Логи идентификации пишутся в базу пачками
+    LOG_BATCH_SIZE: int = 100
+    LOG_FLUSH_INTERVAL: float = 0.5
+    LOG_QUEUE_SIZE: int = 10000
+    
+    # Панель оператора: сколько последних событий отдавать при подключении
+    MONITOR_REPLAY_SIZE: int = 50
+    MONITOR_HEARTBEAT: float = 15.0
+    ACCESS_CONFIDENCE: float = 0.8  # порог «доступ разрешён»
     
     # Redis
     REDIS_URL: str = "redis://localhost:6379"
@@ -12,6 +23,8 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    AUTH_CACHE_SIZE: int = 1024  # пользователей в кэше проверки токена
+    AUTH_CACHE_TTL: float = 30.0  # секунд
     
     # Application
     DEBUG: bool = True
@@ -20,6 +33,68 @@ class Settings(BaseSettings):
     
     # Models
     MODELS_PATH: str = "./models"
+    MODELS_KEEP_VERSIONS: int = 5  # сколько последних версий хранить (0 — все)
+    RETRAIN_TIMEOUT: int = 600
+    
+    # Inference pool ("process" или "thread"; 0 воркеров = число ядер)
+    INFERENCE_EXECUTOR: str = "process"
+    INFERENCE_WORKERS: int = 0
+    INFERENCE_QUEUE_SIZE: int = 32
+    BATCH_MAX_FILES: int = 5000
+    
+    # Приём образцов для регистрации
+    ENROLL_MAX_BYTES: int = 50 * 1024 * 1024
+    ENROLL_MIN_SECONDS: float = 1.0
+    ENROLL_MAX_SECONDS: float = 60.0
+    # Упакованное хранилище образцов для переобучения ("" — не вести)
+    CORPUS_DIR: str = "./corpus"
+    
+    # Контроль допуска к /api/identify
+    ADMISSION_MAX_INFLIGHT: int = 0  # 0 — по числу воркеров пула
+    ADMISSION_QUEUE_SIZE: int = 64
+    ADMISSION_QUEUE_TIMEOUT: float = 5.0  # секунд ожидания в очереди
+    
+    # Потоковая идентификация (WebSocket): решение принимается, как только
+    # уверенность достигла порога, но не раньше STREAM_MIN_SECONDS звука
+    STREAM_MIN_SECONDS: float = 1.5
+    STREAM_MAX_SECONDS: float = 10.0
+    STREAM_UPDATE_SECONDS: float = 0.5
+    STREAM_CONFIDENCE: float = 0.8
+    # Допустимая частота дискретизации, которую присылает клиент
+    STREAM_MIN_SR: int = 8000
+    STREAM_MAX_SR: int = 192000
+    
+    # Каскад ансамбля: модели запускаются по порядку (lr, svm, rf), следующая —
+    # только если разрыв между двумя лучшими вероятностями меньше CASCADE_MARGIN.
+    # Выключен, пока отчёт каскада в retrain_model.py (согласие с полным
+    # ансамблем и точность по порогам) не подтвердит выбранный порог
+    CASCADE_ENABLED: bool = False
+    CASCADE_STAGES: str = "lr,svm,rf"
+    CASCADE_MARGIN: float = 0.3
+    
+    # Индекс говорящих (идентификация ближайшим соседом, без переобучения)
+    SPEAKER_INDEX_PATH: str = "./speaker_index"
+    SPEAKER_INDEX_TOP_K: int = 5
+    # Открытое множество: если косинусная близость к лучшему образцу ниже
+    # порога, голос считается незнакомым. Шкала не вероятностная, поэтому
+    # порог свой, а не ACCESS_CONFIDENCE
+    SPEAKER_INDEX_MIN_SCORE: float = 0.7
+    
+    # Онлайн-модель: дообучается на каждом новом образце и участвует в ансамбле
+    ONLINE_MODEL_ENABLED: bool = False
+    ONLINE_MODEL_PATH: str = "./online_model"
+    ONLINE_MODEL_WEIGHT: float = 0.2
+    # Новый говорящий получает вес ONLINE_OVERRIDE_WEIGHT, только если основные
+    # модели не уверены, а разрыв между двумя лучшими кандидатами самой
+    # онлайн-модели не меньше ONLINE_OVERRIDE_MARGIN
+    ONLINE_OVERRIDE_CONFIDENCE: float = 0.7
+    ONLINE_OVERRIDE_MARGIN: float = 0.3
+    ONLINE_OVERRIDE_WEIGHT: float = 0.5
+    
+    # Кэш результатов идентификации ("memory" или "redis" по REDIS_URL; 0 — отключён)
+    RESULT_CACHE_BACKEND: str = "memory"
+    RESULT_CACHE_SIZE: int = 1024
+    RESULT_CACHE_TTL: int = 300
     
     class Config:
         env_file = ".env"
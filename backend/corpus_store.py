@@ -0,0 +1,416 @@
+"""
+Упакованное хранилище образцов для переобучения.
+
+Вместо тысяч файлов audio_samples/<говорящий>/sample_N.wav записи лежат
+подряд в нескольких больших сегментах (сырые float32, 16 кГц, моно), а
+положение каждой — в индексе: сегмент, смещение и длина в отсчётах.
+
+Индекс — снимок index.json и журнал journal-NNNNNN.jsonl (номер поколения
+записан в снимке): добавление и удаление записи дописывают в журнал одну
+строку, а не переписывают весь индекс. Снимок пишется заново, когда журнал
+дорос до размера индекса (не меньше JOURNAL_MIN_RECORDS строк), и при
+уплотнении; новый снимок начинает журнал следующего поколения, так что
+упавший между ними писатель не применит старый журнал дважды.
+Читатель отображает сегменты в память (np.memmap) и получает запись как
+представление без копирования — ни открытия файла, ни разбора заголовка
+на каждую запись.
+
+Новые записи дописываются в конец последнего сегмента; замена или удаление
+записи оставляет в сегменте «мёртвые» отсчёты, которые убирает compact().
+Сегменты только дописываются, а при уплотнении пишутся новые. Сегменты
+предыдущего поколения не удаляются сразу, а попадают в список "retired"
+индекса и удаляются только следующим уплотнением: читатель, который
+прочитал индекс до уплотнения, может пользоваться им до следующего
+(после него — должен вызвать reload()).
+
+    python corpus_store.py pack --audio-dir ./audio_samples
+    python corpus_store.py compact
+    python corpus_store.py stats
+
+Ключ записи — "<говорящий>/<имя файла>", как в manifest.json
+подготовленного датасета. FLAC здесь не подходит: сжатый сегмент нельзя
+отобразить в память.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+SAMPLE_RATE = 16000
+DTYPE = np.dtype("<f4")
+# Размер сегмента, после которого начинается следующий
+SEGMENT_BYTES = 1 << 30
+# Журнал короче этого не сворачивается в снимок index.json
+JOURNAL_MIN_RECORDS = 1000
+
+
+def audio_sha256(audio: np.ndarray) -> str:
+    return hashlib.sha256(np.ascontiguousarray(audio, dtype=DTYPE).tobytes()).hexdigest()
+
+
+class CorpusStore:
+    """Сегменты segment-NNNNN.f32, index.json и журнал индекса в каталоге root"""
+
+    def __init__(self, root: Path, segment_bytes: int = SEGMENT_BYTES):
+        self.root = Path(root)
+        self.segment_bytes = segment_bytes
+        self._lock = threading.Lock()
+        self._maps = {}  # имя сегмента -> np.memmap
+        self._index_mtime = None
+        self._segments: List[str] = []
+        self._retired: List[str] = []  # сегменты прошлого поколения, ещё не удалённые
+        self._clips: Dict[str, dict] = {}
+        self._generation = 0       # поколение журнала, записанное в снимке
+        self._journal_offset = 0   # прочитанная часть журнала, байт
+        self._journal_records = 0
+        self._load()
+
+    @property
+    def index_file(self) -> Path:
+        return self.root / "index.json"
+
+    @property
+    def journal_file(self) -> Path:
+        return self.root / f"journal-{self._generation:06d}.jsonl"
+
+    def _load(self):
+        self._segments, self._retired, self._clips = [], [], {}
+        self._generation = self._journal_offset = self._journal_records = 0
+        if not self.index_file.exists():
+            return
+        self._index_mtime = self.index_file.stat().st_mtime_ns
+        index = json.loads(self.index_file.read_text(encoding="utf-8"))
+        self._segments = index["segments"]
+        self._retired = index.get("retired", [])
+        self._clips = index["clips"]
+        self._generation = index.get("journal", 0)
+        self._read_journal()
+
+    def _read_journal(self):
+        """Применяет ещё не прочитанные строки журнала (оборванную последнюю — нет)"""
+        if not self.journal_file.exists():
+            return
+        with open(self.journal_file, "rb") as f:
+            f.seek(self._journal_offset)
+            data = f.read()
+        complete = data[:data.rfind(b"\n") + 1]
+        for line in complete.splitlines():
+            self._apply(json.loads(line))
+            self._journal_records += 1
+        self._journal_offset += len(complete)
+
+    def _apply(self, record: dict):
+        """Одна строка журнала: запись добавлена (или заменена) либо удалена"""
+        if record.get("removed"):
+            self._clips.pop(record["clip"], None)
+            return
+        entry = record["entry"]
+        if entry["segment"] not in self._segments:
+            self._segments.append(entry["segment"])
+        self._clips[record["clip"]] = entry
+
+    def reload(self) -> bool:
+        """Подхватывает изменения другого процесса: новый снимок или новые строки журнала"""
+        if self.index_file.exists() and self.index_file.stat().st_mtime_ns != self._index_mtime:
+            self._load()
+            return True
+        records = self._journal_records
+        self._read_journal()
+        return self._journal_records != records
+
+    def _log(self, record: dict):
+        """
+        Дописывает строку журнала; когда журнал дорос до размера индекса,
+        сворачивает его в снимок — в среднем O(1) на запись
+        """
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        with open(self.journal_file, "ab") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal_offset += len(line)
+        self._journal_records += 1
+        if self._journal_records >= max(JOURNAL_MIN_RECORDS, len(self._clips)):
+            self._save()
+
+    def _save(self):
+        """Снимок индекса целиком; следующие изменения идут в журнал нового поколения"""
+        generation = self._generation + 1
+        tmp_index = self.index_file.with_suffix(".tmp")
+        with open(tmp_index, "w", encoding="utf-8") as f:
+            json.dump({
+                "sample_rate": SAMPLE_RATE,
+                "dtype": DTYPE.str,
+                "segments": self._segments,
+                "retired": self._retired,
+                "clips": self._clips,
+                "journal": generation,
+            }, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_index, self.index_file)
+        self._generation = generation
+        self._index_mtime = self.index_file.stat().st_mtime_ns
+        self._journal_offset = self._journal_records = 0
+        # Журналы прошлых поколений уже вошли в снимок
+        for stale in self.root.glob("journal-*.jsonl"):
+            if stale != self.journal_file:
+                try:
+                    stale.unlink()
+                except OSError:
+                    pass  # Windows: файл ещё открыт читателем; удалится при следующем снимке
+
+    @staticmethod
+    def _lock_file(lock_file, lock: bool):
+        """Межпроцессная блокировка: flock на POSIX, msvcrt.locking первого байта на Windows"""
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if lock else fcntl.LOCK_UN)
+            return
+        lock_file.seek(0)
+        if not lock:
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+            return
+        while True:
+            try:
+                # LK_LOCK сам повторяет попытку 10 раз по секунде, затем OSError
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                continue
+
+    @contextmanager
+    def _writing(self):
+        """Один писатель: поток внутри процесса и процесс (файл .lock)"""
+        with self._lock:
+            self.root.mkdir(parents=True, exist_ok=True)
+            with open(self.root / ".lock", "w") as lock_file:
+                self._lock_file(lock_file, True)
+                try:
+                    # Индекс мог измениться в другом процессе, пока ждали блокировку
+                    self.reload()
+                    if not self.index_file.exists():
+                        self._save()  # снимок есть всегда: по нему ищут хранилище
+                    elif self.journal_file.exists() and self.journal_file.stat().st_size > self._journal_offset:
+                        # Оборванная строка упавшего писателя: иначе следующая склеится с ней
+                        os.truncate(self.journal_file, self._journal_offset)
+                    yield
+                finally:
+                    self._lock_file(lock_file, False)
+
+    def __len__(self) -> int:
+        return len(self._clips)
+
+    def __contains__(self, clip_id: str) -> bool:
+        return clip_id in self._clips
+
+    def clips(self) -> List[Tuple[str, dict]]:
+        """(ключ, запись индекса) в порядке говорящий, ключ"""
+        return sorted(self._clips.items(), key=lambda item: (item[1]["speaker"], item[0]))
+
+    def entry(self, clip_id: str) -> dict:
+        return self._clips[clip_id]
+
+    def _segment_map(self, segment: str, end: int) -> np.memmap:
+        mapped = self._maps.get(segment)
+        # Сегмент мог вырасти после отображения: отображаем заново
+        if mapped is None or len(mapped) < end:
+            mapped = np.memmap(self.root / segment, dtype=DTYPE, mode="r")
+            self._maps[segment] = mapped
+        return mapped
+
+    def get(self, clip_id: str) -> np.ndarray:
+        """Запись как представление отображённого в память сегмента (только чтение)"""
+        entry = self._clips[clip_id]
+        end = entry["offset"] + entry["length"]
+        return self._segment_map(entry["segment"], end)[entry["offset"]:end]
+
+    def __iter__(self) -> Iterator[Tuple[str, str, np.ndarray]]:
+        for clip_id, entry in self.clips():
+            yield clip_id, entry["speaker"], self.get(clip_id)
+
+    @staticmethod
+    def _next_segment(segments: List[str]) -> str:
+        # Номера только растут: имя удалённого при уплотнении сегмента не повторяется
+        number = int(segments[-1][8:13]) + 1 if segments else 0
+        return f"segment-{number:05d}.f32"
+
+    def _append_data(self, audio: np.ndarray) -> Tuple[str, int]:
+        last = self.root / self._segments[-1] if self._segments else None
+        if last is None or (last.exists() and last.stat().st_size >= self.segment_bytes):
+            self._segments.append(self._next_segment(self._segments or self._retired))
+        segment = self._segments[-1]
+        with open(self.root / segment, "ab") as f:
+            offset = f.tell() // DTYPE.itemsize
+            f.write(audio.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        return segment, offset
+
+    def append(self, clip_id: str, speaker: str, audio: np.ndarray, sha256: Optional[str] = None):
+        """
+        Дописывает запись (моно, 16 кГц); запись с тем же ключом заменяется.
+        sha256 — хэш исходного файла (ключ кэша признаков), по умолчанию —
+        хэш отсчётов.
+        """
+        audio = np.ascontiguousarray(audio, dtype=DTYPE)
+        if audio.ndim != 1:
+            raise ValueError("Ожидается моно-запись")
+        with self._writing():
+            segment, offset = self._append_data(audio)
+            entry = {
+                "speaker": speaker,
+                "segment": segment,
+                "offset": offset,
+                "length": len(audio),
+                "sha256": sha256 or audio_sha256(audio),
+            }
+            self._clips[clip_id] = entry
+            self._log({"clip": clip_id, "entry": entry})
+
+    def append_file(self, clip_id: str, speaker: str, path: Path, sha256: Optional[str] = None):
+        """Дописывает канонический WAV (как его пишут приём образцов и подготовка датасета)"""
+        import soundfile as sf
+
+        audio, sr = sf.read(str(path), dtype="float32")
+        if sr != SAMPLE_RATE or audio.ndim != 1:
+            raise ValueError(f"{path}: ожидается моно {SAMPLE_RATE} Гц, получено {sr} Гц, {audio.ndim} канал(а)")
+        self.append(clip_id, speaker, audio, sha256)
+
+    def remove(self, clip_id: str) -> bool:
+        with self._writing():
+            if self._clips.pop(clip_id, None) is None:
+                return False
+            self._log({"clip": clip_id, "removed": True})
+            return True
+
+    def stats(self) -> dict:
+        """Размеры считаются по текущим сегментам; сегменты "retired" сюда не входят"""
+        total = sum((self.root / segment).stat().st_size for segment in self._segments
+                    if (self.root / segment).exists())
+        live = sum(entry["length"] for entry in self._clips.values()) * DTYPE.itemsize
+        return {
+            "clips": len(self._clips),
+            "speakers": len({entry["speaker"] for entry in self._clips.values()}),
+            "segments": len(self._segments),
+            "seconds": live / DTYPE.itemsize / SAMPLE_RATE,
+            "bytes": total,
+            "dead_bytes": total - live,
+        }
+
+    def compact(self) -> int:
+        """
+        Переписывает живые записи в новые сегменты (по говорящим подряд).
+        Старые сегменты становятся "retired" и удаляются только следующим
+        уплотнением, а сегменты, ставшие "retired" в прошлый раз, — сейчас.
+
+        Returns:
+            Сколько байт занимали сегменты до уплотнения сверх новых
+            (место освобождается на диске при следующем уплотнении)
+        """
+        with self._writing():
+            before = self.stats()["bytes"]
+            old_segments = list(self._segments)
+            clips = self.clips()
+            # Имена новых сегментов не должны совпасть с ещё лежащими на диске
+            on_disk = sorted(path.name for path in self.root.glob("segment-*.f32"))
+            numbered = sorted(set(old_segments) | set(self._retired) | set(on_disk))
+
+            new_segments = []
+            new_clips = {}
+            segment, size, f = None, 0, None
+            try:
+                for clip_id, entry in clips:
+                    audio = self.get(clip_id)
+                    if f is None or size >= self.segment_bytes:
+                        if f is not None:
+                            f.flush()
+                            os.fsync(f.fileno())
+                            f.close()
+                        segment = self._next_segment(new_segments or numbered)
+                        new_segments.append(segment)
+                        f = open(self.root / segment, "wb")
+                        size = 0
+                    new_clips[clip_id] = {**entry, "segment": segment, "offset": size // DTYPE.itemsize}
+                    f.write(audio.tobytes())
+                    size += audio.nbytes
+            finally:
+                if f is not None:
+                    f.flush()
+                    os.fsync(f.fileno())
+                    f.close()
+
+            self._segments = new_segments
+            self._retired = old_segments
+            self._clips = new_clips
+            self._save()
+            self._maps.clear()
+            # Поколение, отложенное прошлым уплотнением, и остатки прерванных уплотнений
+            keep = set(self._segments) | set(self._retired)
+            for stale in self.root.glob("segment-*.f32"):
+                if stale.name not in keep:
+                    try:
+                        stale.unlink()
+                    except OSError:
+                        # Windows не даёт удалить отображённый файл; удалится при следующем уплотнении
+                        pass
+            return before - self.stats()["bytes"]
+
+    def pack_dir(self, audio_dir: Path) -> int:
+        """
+        Переносит audio_dir/<говорящий>/*.wav, которых ещё нет в хранилище
+        (или которые изменились); хэш берётся из manifest.json, если он есть.
+
+        Returns:
+            Число добавленных записей
+        """
+        from feature_cache import file_sha256
+
+        audio_dir = Path(audio_dir)
+        manifest_file = audio_dir / "manifest.json"
+        manifest = json.loads(manifest_file.read_text(encoding="utf-8")) if manifest_file.exists() else {}
+
+        added = 0
+        for speaker_dir in sorted(d for d in audio_dir.iterdir() if d.is_dir()):
+            for audio_file in sorted(speaker_dir.glob("*.wav")):
+                clip_id = f"{speaker_dir.name}/{audio_file.name}"
+                sha256 = manifest.get(clip_id, {}).get("sha256") or file_sha256(audio_file)
+                if self._clips.get(clip_id, {}).get("sha256") == sha256:
+                    continue
+                try:
+                    self.append_file(clip_id, speaker_dir.name, audio_file, sha256)
+                    added += 1
+                except (RuntimeError, ValueError) as e:
+                    print(f"   Пропущен {clip_id}: {e}")
+        return added
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Упакованное хранилище образцов")
+    parser.add_argument("command", choices=["pack", "compact", "stats"])
+    parser.add_argument("--corpus-dir", default="./corpus", help="Каталог хранилища")
+    parser.add_argument("--audio-dir", default="./audio_samples", help="Откуда упаковывать образцы")
+    args = parser.parse_args()
+
+    store = CorpusStore(args.corpus_dir)
+    if args.command == "pack":
+        print(f"Добавлено записей: {store.pack_dir(args.audio_dir)}")
+    elif args.command == "compact":
+        print(f"Уплотнено: {store.compact() / 2**20:.1f} МБ "
+              f"(старые сегменты удалятся при следующем уплотнении)")
+    stats = store.stats()
+    print(f"Записей: {stats['clips']}, говорящих: {stats['speakers']}, сегментов: {stats['segments']}, "
+          f"{stats['seconds'] / 3600:.2f} ч, {stats['bytes'] / 2**20:.1f} МБ "
+          f"(мёртвых {stats['dead_bytes'] / 2**20:.1f} МБ)")
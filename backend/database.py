@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from config import settings
@@ -7,7 +7,7 @@ from config import settings
 engine = create_engine(
     settings.DATABASE_URL,
     pool_pre_ping=True,
-    echo=settings.DEBUG
+    echo=settings.DB_ECHO
 )
 
 # Session maker
@@ -16,6 +16,111 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 # Base class для моделей
 Base = declarative_base()
 
+def _unique_columns(inspector, table_name: str) -> set:
+    """Наборы столбцов, на которых в базе уже есть ограничение или индекс уникальности"""
+    unique = {tuple(c["column_names"]) for c in inspector.get_unique_constraints(table_name)}
+    unique |= {tuple(i["column_names"]) for i in inspector.get_indexes(table_name) if i.get("unique")}
+    return unique
+
+def _deduplicate(connection, table, column) -> int:
+    """
+    Для каждого повторяющегося значения column оставляет последнюю строку
+    (наибольший id); ссылки других таблиц на удаляемые строки переводятся
+    на оставленную.
+    
+    Returns:
+        Число удалённых строк
+    """
+    pk = list(table.primary_key.columns)[0].name
+    duplicates = connection.execute(text(
+        f"SELECT d.{pk}, k.keep FROM {table.name} d JOIN ("
+        f"SELECT {column.name}, MAX({pk}) AS keep FROM {table.name} "
+        f"GROUP BY {column.name} HAVING COUNT(*) > 1"
+        f") k ON d.{column.name} = k.{column.name} WHERE d.{pk} <> k.keep"
+    )).all()
+    if not duplicates:
+        return 0
+    
+    pairs = [{"duplicate": duplicate, "keep": keep} for duplicate, keep in duplicates]
+    for child in Base.metadata.sorted_tables:
+        for foreign_key in child.foreign_keys:
+            if foreign_key.column.table is table:
+                connection.execute(text(
+                    f"UPDATE {child.name} SET {foreign_key.parent.name} = :keep "
+                    f"WHERE {foreign_key.parent.name} = :duplicate"
+                ), pairs)
+    connection.execute(text(f"DELETE FROM {table.name} WHERE {pk} = :duplicate"), pairs)
+    return len(pairs)
+
+def sync_schema() -> dict:
+    """
+    Досоздаёт в уже существующих таблицах то, что добавлено в модели позже:
+    nullable-столбцы, индексы, уникальность столбцов (unique=True) и снятие
+    NOT NULL со столбцов, ставших необязательными.
+    
+    create_all создаёт только отсутствующие таблицы, поэтому без этого
+    такие изменения в рабочей базе сами не появятся. Переименования и
+    смену типов столбцов это не покрывает, таблицы не пересоздаются.
+    Перед созданием уникального индекса повторы сливаются (_deduplicate).
+    
+    Returns:
+        {таблица: удалено повторяющихся строк} — только где они были
+    """
+    merged = {}
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        
+        columns = {column["name"]: column for column in inspector.get_columns(table.name)}
+        relaxed = [
+            column.name for column in table.columns
+            if column.nullable and column.name in columns and not columns[column.name]["nullable"]
+        ]
+        if relaxed and engine.dialect.name == "sqlite":
+            print(f"Таблица {table.name}: в SQLite нельзя снять NOT NULL с {', '.join(relaxed)}")
+        
+        with engine.begin() as connection:
+            for column in table.columns:
+                existing = columns.get(column.name)
+                column_type = column.type.compile(dialect=engine.dialect)
+                if existing is None and column.nullable:
+                    print(f"Добавление столбца {table.name}.{column.name}...")
+                    connection.execute(text(
+                        f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'
+                    ))
+                elif existing is not None and column.nullable and not existing["nullable"] \
+                        and engine.dialect.name != "sqlite":  # SQLite не умеет ALTER COLUMN
+                    print(f"Снятие NOT NULL со столбца {table.name}.{column.name}...")
+                    connection.execute(text(
+                        f'ALTER TABLE {table.name} ALTER COLUMN {column.name} DROP NOT NULL'
+                    ))
+        
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                print(f"Создание индекса {index.name}...")
+                index.create(bind=engine)
+        
+        # unique=True у столбца, добавленный после создания таблицы: на нём
+        # держится защита от гонок при вставке (IntegrityError и повторный запрос)
+        unique = _unique_columns(inspector, table.name)
+        for column in table.columns:
+            if not column.unique or (column.name,) in unique or column.name not in columns:
+                continue
+            with engine.begin() as connection:
+                removed = _deduplicate(connection, table, column)
+                if removed:
+                    print(f"Таблица {table.name}: слито {removed} повторов по {column.name}")
+                    merged[table.name] = merged.get(table.name, 0) + removed
+                print(f"Создание уникального индекса {table.name}.{column.name}...")
+                connection.execute(text(
+                    f"CREATE UNIQUE INDEX IF NOT EXISTS uq_{table.name}_{column.name} "
+                    f"ON {table.name} ({column.name})"
+                ))
+    return merged
+
 # Dependency для получения DB session
 def get_db():
     db = SessionLocal()
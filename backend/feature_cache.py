@@ -0,0 +1,198 @@
+"""
+Постоянное хранилище признаков для переобучения.
+
+Ключ записи — SHA-256 содержимого образца (тот же, что в AudioSample.sha256
+и в индексе упакованного хранилища), поэтому переименование файла не
+требует пересчёта. Векторы каждой версии признаков лежат в своём каталоге
+<версия>/ одной матрицей features.npy, записанной по столбцам, и списком
+ключей keys.npy. Матрица отображается в память и при переобучении читается
+целиком одним выборочным чтением (get_many), а не вектор за вектором.
+
+Рядом с матрицей хранится определение признаков (feature_engine.
+FEATURE_DEFINITION): если параметры извлечения изменились без смены
+версии, старые векторы не используются. Чтобы не перечитывать
+неизменённые файлы, хэш запоминается вместе с размером и временем
+изменения файла (index.json, общий для всех версий).
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+def file_sha256(path: Path, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FeatureCache:
+    """Признаки одной версии: <версия>/features.npy, keys.npy, meta.json + index.json"""
+
+    def __init__(self, cache_dir: Path, feature_version: str, definition: Optional[dict] = None):
+        self.cache_dir = Path(cache_dir)
+        self.feature_version = feature_version
+        self.definition = definition
+        self.hits = 0
+        self.misses = 0
+
+        self._rows = {}             # ключ -> номер строки
+        self._matrix = None         # (записей, признаков), отображена в память
+        self._new = {}              # ключ -> вектор, ещё не сохранённый
+        self._files = {}            # путь -> {"sha256", "size", "mtime_ns"}
+        self._load()
+
+    @property
+    def version_dir(self) -> Path:
+        return self.cache_dir / self.feature_version
+
+    @property
+    def legacy_file(self) -> Path:
+        # Формат до хранилища по столбцам: один npz на версию
+        return self.cache_dir / f"features_{self.feature_version}.npz"
+
+    @property
+    def index_file(self) -> Path:
+        return self.cache_dir / "index.json"
+
+    def _load(self):
+        meta_file = self.version_dir / "meta.json"
+        if meta_file.exists():
+            meta = json.loads(meta_file.read_text(encoding="utf-8"))
+            if self.definition is not None and meta.get("definition") != self.definition:
+                print(f"Хранилище признаков: определение версии {self.feature_version} изменилось, "
+                      f"сохранённые векторы не используются")
+            else:
+                keys = np.load(self.version_dir / "keys.npy").tolist()
+                matrix = self._open_matrix()
+                if len(keys) == len(matrix) == meta.get("rows"):
+                    self._matrix = matrix
+                    self._rows = {key: row for row, key in enumerate(keys)}
+        elif self.legacy_file.exists():
+            with np.load(self.legacy_file) as data:
+                self._new = dict(zip(data["keys"].tolist(), data["matrix"]))
+        if self.index_file.exists():
+            self._files = json.loads(self.index_file.read_text(encoding="utf-8"))
+
+    def _open_matrix(self) -> np.ndarray:
+        matrix_file = self.version_dir / "features.npy"
+        # Пустой массив отобразить в память нельзя
+        mmap_mode = "r" if matrix_file.stat().st_size > 128 else None
+        return np.load(matrix_file, mmap_mode=mmap_mode)
+
+    def __len__(self) -> int:
+        return len(self._rows) + sum(1 for key in self._new if key not in self._rows)
+
+    def file_key(self, path: Path) -> str:
+        """Хэш содержимого файла; файл перечитывается, только если он изменился"""
+        stat = os.stat(path)
+        entry = self._files.get(str(path))
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return entry["sha256"]
+
+        sha256 = file_sha256(path)
+        self._files[str(path)] = {"sha256": sha256, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        return sha256
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        features = self._new.get(key)
+        if features is None and key in self._rows:
+            features = np.array(self._matrix[self._rows[key]])
+        if features is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return features
+
+    def get_many(self, keys: List[str]) -> Tuple[Optional[np.ndarray], np.ndarray]:
+        """
+        Векторы для списка ключей одним чтением матрицы.
+
+        Returns:
+            (матрица len(keys) x признаков или None, если ничего не найдено;
+             маска найденных строк)
+        """
+        rows = np.array([self._rows.get(key, -1) for key in keys], dtype=np.int64)
+        found = rows >= 0
+        new = [i for i, key in enumerate(keys) if key in self._new]
+        found[new] = True
+        self.hits += int(found.sum())
+        self.misses += len(keys) - int(found.sum())
+        if not found.any():
+            return None, found
+
+        width = self._matrix.shape[1] if self._matrix is not None else len(self._new[keys[new[0]]])
+        result = np.zeros((len(keys), width))
+        stored = rows >= 0
+        if stored.any():
+            result[stored] = self._matrix[rows[stored]]
+        for i in new:
+            result[i] = self._new[keys[i]]
+        return result, found
+
+    def put(self, key: str, features: np.ndarray):
+        self._new[key] = np.asarray(features, dtype=np.float64)
+
+    def prune(self, present_paths: Iterable[Path], live_keys: Iterable[str] = ()) -> int:
+        """
+        Удаляет записи файлов, которых больше нет на диске. live_keys —
+        ключи, которые нужно сохранить без файла (записи упакованного хранилища).
+
+        Returns:
+            Количество удалённых векторов признаков
+        """
+        present = {str(path) for path in present_paths}
+        self._files = {path: entry for path, entry in self._files.items() if path in present}
+
+        live_keys = set(live_keys) | {entry["sha256"] for entry in self._files.values()}
+        stale = {key for key in list(self._rows) + list(self._new) if key not in live_keys}
+        for key in stale:
+            self._rows.pop(key, None)
+            self._new.pop(key, None)
+        return len(stale)
+
+    def save(self):
+        """Записывает матрицу версии по столбцам; meta.json заменяется последним"""
+        self.version_dir.mkdir(parents=True, exist_ok=True)
+
+        kept = sorted(((key, row) for key, row in self._rows.items() if key not in self._new),
+                      key=lambda item: item[1])
+        keys = [key for key, _ in kept] + list(self._new)
+        parts = []
+        if kept:
+            parts.append(self._matrix[np.array([row for _, row in kept])])
+        if len(keys) > len(kept):
+            parts.append(np.vstack([self._new[key] for key in keys[len(kept):]]))
+        matrix = np.asfortranarray(np.vstack(parts)) if parts else np.empty((0, 0))
+
+        # Отображение старой матрицы закрывается до замены файла (Windows)
+        self._matrix = None
+        for name, data in (("features.npy", matrix), ("keys.npy", np.array(keys, dtype=str))):
+            tmp_file = self.version_dir / f"{name}.tmp"
+            with open(tmp_file, "wb") as f:
+                np.save(f, data)
+            os.replace(tmp_file, self.version_dir / name)
+
+        meta_file = self.version_dir / "meta.json"
+        tmp_meta = meta_file.with_suffix(".tmp")
+        tmp_meta.write_text(json.dumps({
+            "version": self.feature_version,
+            "definition": self.definition,
+            "rows": len(keys),
+        }, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_meta, meta_file)
+
+        tmp_index = self.index_file.with_suffix(".tmp")
+        tmp_index.write_text(json.dumps(self._files), encoding="utf-8")
+        os.replace(tmp_index, self.index_file)
+        self.legacy_file.unlink(missing_ok=True)
+
+        self._rows = {key: row for row, key in enumerate(keys)}
+        self._matrix = self._open_matrix()
+        self._new = {}
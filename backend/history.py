@@ -0,0 +1,101 @@
+"""
+История идентификаций: постраничная выдача по курсору и выгрузка.
+
+Страницы читаются по ключу (created_at, id), а не через OFFSET: курсор —
+это ключ последней строки предыдущей страницы, и следующий запрос начинает
+сразу с неё по индексу (user_id, created_at, id). Поэтому время ответа не
+зависит ни от глубины страницы, ни от размера таблицы, а новые записи,
+появившиеся между запросами, не сдвигают страницы.
+
+Выгрузка (CSV или NDJSON) идёт теми же страницами и отдаётся потоком —
+в памяти одновременно находится только одна страница.
+"""
+
+import base64
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import tuple_
+
+import models
+
+EXPORT_PAGE_SIZE = 1000
+EXPORT_FIELDS = ["id", "created_at", "identified_speaker", "confidence", "model_used", "processing_time"]
+
+
+def encode_cursor(log: models.IdentificationLog) -> str:
+    raw = f"{log.created_at.isoformat()}|{log.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Ключ (created_at, id) из курсора; ValueError, если курсор испорчен"""
+    try:
+        created_at, log_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(log_id)
+    except Exception:
+        raise ValueError("Некорректный курсор")
+
+
+def filtered(db, user_id: int, speaker: Optional[str] = None,
+             date_from: Optional[datetime] = None, date_to: Optional[datetime] = None):
+    """Запрос истории пользователя с необязательными фильтрами"""
+    Log = models.IdentificationLog
+    query = db.query(Log).filter(Log.user_id == user_id)
+    if speaker:
+        query = query.filter(Log.identified_speaker == speaker)
+    if date_from:
+        query = query.filter(Log.created_at >= date_from)
+    if date_to:
+        query = query.filter(Log.created_at < date_to)
+    return query
+
+
+def page(query, limit: int, cursor: Optional[str] = None) -> Tuple[List[models.IdentificationLog], Optional[str]]:
+    """
+    Одна страница от новых к старым.
+
+    Returns:
+        (записи, курсор следующей страницы или None, если страница последняя)
+    """
+    Log = models.IdentificationLog
+    if cursor:
+        query = query.filter(tuple_(Log.created_at, Log.id) < tuple_(*decode_cursor(cursor)))
+    # Лишняя строка показывает, есть ли следующая страница, без COUNT(*)
+    rows = query.order_by(Log.created_at.desc(), Log.id.desc()).limit(limit + 1).all()
+    if len(rows) > limit:
+        return rows[:limit], encode_cursor(rows[limit - 1])
+    return rows, None
+
+
+def export(session_factory: Callable, fmt: str, user_id: int, **filters) -> Iterator[str]:
+    """Построчная выгрузка истории в CSV или NDJSON"""
+    db = session_factory()
+    try:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if fmt == "csv":
+            writer.writerow(EXPORT_FIELDS)
+
+        cursor = None
+        while True:
+            rows, cursor = page(filtered(db, user_id, **filters), EXPORT_PAGE_SIZE, cursor)
+            for row in rows:
+                values = [getattr(row, field) for field in EXPORT_FIELDS]
+                values[1] = row.created_at.isoformat()
+                if fmt == "csv":
+                    writer.writerow(values)
+                else:
+                    buffer.write(json.dumps(dict(zip(EXPORT_FIELDS, values)), ensure_ascii=False) + "\n")
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            # Страница прочитана — объекты сессии больше не нужны
+            db.expunge_all()
+            if cursor is None:
+                break
+    finally:
+        db.close()
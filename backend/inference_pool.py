@@ -0,0 +1,222 @@
+"""
+Пул исполнителей для CPU-задач идентификации.
+
+Декодирование, ресемплинг и ml_service.identify выполняются вне event loop,
+в пуле процессов или потоков. Очередь ограничена: при переполнении запрос
+сразу отклоняется, а не копится в памяти.
+
+Любое входящее аудио приводится к одному каноническому виду: моно,
+float32, 16 кГц (audio_io).
+"""
+
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+from audio_io import decode_audio
+from config import settings
+from metrics import metrics
+
+
+class InferenceQueueFull(Exception):
+    """Очередь пула заполнена — запрос нужно повторить позже"""
+
+
+def _init_worker():
+    """Загружает модели один раз при старте процесса-воркера"""
+    import ml_service  # noqa: F401
+
+
+def ingest_audio(upload_path: str, target_path: str, min_seconds: float, max_seconds: float) -> dict:
+    """
+    Приём образца для регистрации: декодирование загруженного файла,
+    проверка, запись канонического WAV (float32, 16 кГц) и признаки.
+    Ошибка проверки — ValueError с понятным текстом.
+    """
+    import hashlib
+    import numpy as np
+    import soundfile as sf
+    import feature_engine
+    from ml_service import ml_service
+
+    audio_data, sr = decode_audio(upload_path)
+    duration = len(audio_data) / sr
+    if not np.all(np.isfinite(audio_data)):
+        raise ValueError("Аудио содержит некорректные отсчёты")
+    if duration < min_seconds:
+        raise ValueError(f"Запись слишком короткая: {duration:.1f} сек (минимум {min_seconds:g})")
+    if duration > max_seconds:
+        raise ValueError(f"Запись слишком длинная: {duration:.1f} сек (максимум {max_seconds:g})")
+    if np.max(np.abs(audio_data)) < 1e-4:
+        raise ValueError("Запись пустая (тишина)")
+
+    tmp_path = f"{target_path}.tmp"
+    sf.write(tmp_path, audio_data, sr, subtype="FLOAT", format="WAV")
+    os.replace(tmp_path, target_path)
+    with open(target_path, "rb") as f:
+        sha256 = hashlib.sha256(f.read()).hexdigest()
+
+    return {
+        "features": ml_service.extract_features(audio_data, sr),
+        "duration": duration,
+        "sample_rate": sr,
+        "sha256": sha256,
+        "feature_version": feature_engine.FEATURE_VERSION,
+    }
+
+
+def identify_audio(audio_bytes: bytes, use_ensemble: bool = True) -> dict:
+    """Полный CPU-конвейер идентификации для одного файла"""
+    from ml_service import ml_service
+
+    audio_data, sr = decode_audio(audio_bytes)
+    return ml_service.identify(audio_data, sr, use_ensemble)
+
+
+def identify_samples(audio_data, sr: int, use_ensemble: bool = True) -> dict:
+    """Идентификация по уже декодированным отсчётам (итог потоковой записи)"""
+    from ml_service import ml_service
+
+    return ml_service.identify(audio_data, sr, use_ensemble)
+
+
+def extract_audio_features(clips: list) -> list:
+    """
+    Признаки для пачки файлов. Ошибка в одном файле не прерывает остальные.
+
+    Returns:
+        Список (features или None, текст ошибки или None, время обработки)
+    """
+    from ml_service import ml_service
+
+    results = []
+    for audio_bytes in clips:
+        start_time = time.time()
+        try:
+            audio_data, sr = decode_audio(audio_bytes)
+            features = ml_service.extract_features(audio_data, sr)
+            results.append((features, None, time.time() - start_time))
+        except Exception as e:
+            results.append((None, str(e), time.time() - start_time))
+    return results
+
+
+def score_features(features, use_ensemble: bool = True) -> list:
+    """Классификация готовой матрицы признаков одним вызовом каждой модели"""
+    from ml_service import ml_service
+
+    return ml_service.score_batch(features, use_ensemble)
+
+
+def _run_collected(fn, *args):
+    """Выполняет задачу в воркере и возвращает её результат вместе с замерами этапов"""
+    with metrics.collect() as timings:
+        result = fn(*args)
+    return result, timings
+
+
+class InferencePool:
+    """
+    Пул процессов/потоков с ограниченной очередью для async-эндпоинтов.
+    restart() вызывается и из других потоков (публикация моделей после
+    переобучения), поэтому исполнитель берётся и подменяется под замком.
+    """
+
+    def __init__(self, kind: str = "process", workers: int = 0, queue_size: int = 32):
+        if kind not in ("process", "thread"):
+            raise ValueError(f"Неизвестный тип пула: {kind}")
+
+        self.kind = kind
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.inflight = 0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def capacity(self) -> int:
+        """Максимум задач: выполняющиеся + ожидающие в очереди"""
+        return self.workers + self.queue_size
+
+    def _create_executor(self):
+        if self.kind == "thread":
+            return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker
+        )
+
+    def start(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._create_executor()
+
+    def restart(self, broken=None):
+        """
+        Пересоздаёт воркеры (например, после переобучения моделей).
+        Уже принятые задачи дорабатывают в старом пуле: shutdown(wait=False)
+        их не отменяет. broken — упавший исполнитель: если его уже заменили,
+        второй раз пул не пересоздаётся.
+        """
+        with self._lock:
+            if broken is not None and broken is not self._executor:
+                return
+            old, self._executor = self._executor, self._create_executor()
+        if old is not None:
+            old.shutdown(wait=False)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    async def run(self, fn, *args):
+        """Выполняет fn(*args) в пуле, не блокируя event loop"""
+        if self.inflight >= self.capacity:
+            raise InferenceQueueFull(
+                f"Очередь идентификации заполнена ({self.inflight}/{self.capacity})"
+            )
+
+        self.start()
+        self.inflight += 1
+        executor = self._executor
+        try:
+            with self._lock:
+                # Отправка под замком: restart() не подменит исполнитель между чтением и submit
+                executor = self._executor
+                future = asyncio.get_running_loop().run_in_executor(executor, partial(_run_collected, fn, *args))
+            result, timings = await future
+            metrics.record(timings)
+            return result
+        except BrokenProcessPool:
+            # Упавший воркер ломает весь пул — поднимаем новый для следующих запросов
+            self.restart(broken=executor)
+            raise
+        finally:
+            self.inflight -= 1
+
+    async def map(self, fn, items: list, *args) -> list:
+        """
+        Делит items на непрерывные пачки по числу воркеров, выполняет
+        fn(chunk, *args) параллельно и склеивает результаты в исходном порядке.
+        """
+        n_chunks = max(1, min(self.workers, len(items)))
+        size = -(-len(items) // n_chunks)
+        chunks = [items[i:i + size] for i in range(0, len(items), size)]
+
+        parts = await asyncio.gather(*(self.run(fn, chunk, *args) for chunk in chunks))
+        return [item for part in parts for item in part]
+
+
+inference_pool = InferencePool(
+    kind=settings.INFERENCE_EXECUTOR,
+    workers=settings.INFERENCE_WORKERS,
+    queue_size=settings.INFERENCE_QUEUE_SIZE
+)
@@ -0,0 +1,193 @@
+"""
+Генератор нагрузки: зависимость пропускной способности от задержки.
+
+Замкнутый цикл: на каждом уровне параллельности N клиентов в течение
+--duration секунд отправляют запросы один за другим, выбирая маршрут по
+весам смеси (--mix). Для уровня печатаются пропускная способность, p50/p95/p99
+по маршрутам и доля отказов 503 — по таблице видно, где задержка начинает
+расти быстрее пропускной способности и где включается контроль допуска.
+
+    python loadgen.py --mix identify=8,health=1,monitor=1 --concurrency 1,4,16,64
+    python loadgen.py --url http://localhost:8000 --username admin --password ...
+
+Без --url приложение запускается в этом же процессе через ASGI-клиент
+(аутентификация подменяется служебным пользователем). Запросы identify
+пишут логи идентификации — используйте тестовую базу.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import defaultdict
+from contextlib import AsyncExitStack
+from typing import Dict, List, Optional
+
+from benchmark import in_process_client, parse_list, summarize, wav_bytes
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        if name.strip() not in ROUTES:
+            raise ValueError(f"Неизвестный маршрут в смеси: {name}; доступны {', '.join(ROUTES)}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+async def _identify(client, clips: List[bytes], rng: random.Random):
+    # Младший байт последнего отсчёта случайный: содержимое каждый раз новое,
+    # кэш результатов не срабатывает, а признаки практически не меняются
+    clip = bytearray(rng.choice(clips))
+    clip[-2] = rng.randrange(256)
+    return await client.post(
+        "/api/identify",
+        files={"audio_file": ("sample.wav", bytes(clip), "audio/wav")}
+    )
+
+
+async def _identify_repeat(client, clips: List[bytes], rng: random.Random):
+    # Одна и та же запись — ответы из кэша результатов
+    return await client.post(
+        "/api/identify",
+        files={"audio_file": ("sample.wav", clips[0], "audio/wav")}
+    )
+
+
+async def _health(client, clips, rng):
+    return await client.get("/health")
+
+
+async def _monitor(client, clips, rng):
+    return await client.get("/api/monitor/latest")
+
+
+ROUTES = {
+    "identify": _identify,
+    "identify_cached": _identify_repeat,
+    "health": _health,
+    "monitor": _monitor,
+}
+
+
+async def run_level(client, mix: Dict[str, float], clips: List[bytes],
+                    concurrency: int, duration: float, seed: int) -> Dict:
+    """Один уровень нагрузки: concurrency клиентов в течение duration секунд"""
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    timings = defaultdict(list)
+    statuses = defaultdict(lambda: defaultdict(int))
+    deadline = time.perf_counter() + duration
+
+    async def worker(worker_id: int):
+        rng = random.Random(seed * 1000 + worker_id)
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            start = time.perf_counter()
+            try:
+                response = await ROUTES[name](client, clips, rng)
+                status = response.status_code
+            except Exception as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - start
+            statuses[name][status] += 1
+            if status == 200:
+                timings[name].append(elapsed)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    routes = {}
+    for name in names:
+        total = sum(statuses[name].values())
+        routes[name] = {
+            "requests": total,
+            "statuses": {str(status): count for status, count in statuses[name].items()},
+            "rejected_share": statuses[name][503] / total if total else 0.0,
+        }
+        if timings[name]:
+            routes[name].update(summarize(timings[name]))
+            routes[name]["throughput_per_s"] = len(timings[name]) / elapsed
+    return {
+        "concurrency": concurrency,
+        "elapsed_s": elapsed,
+        "throughput_per_s": sum(len(t) for t in timings.values()) / elapsed,
+        "routes": routes,
+    }
+
+
+def print_level(level: Dict):
+    print(f"\nПараллельность {level['concurrency']}: "
+          f"{level['throughput_per_s']:.1f} успешных запросов/сек")
+    for name, route in level["routes"].items():
+        if "p50_ms" in route:
+            latency = f"p50 {route['p50_ms']:8.1f}  p95 {route['p95_ms']:8.1f}  p99 {route['p99_ms']:8.1f} мс"
+        else:
+            latency = "нет успешных ответов"
+        print(f"   {name:16s} {route['requests']:6d} запр.  {latency}  503: {route['rejected_share']:.1%}")
+
+
+async def _client(stack: AsyncExitStack, url: Optional[str], token: Optional[str],
+                  username: Optional[str], password: Optional[str]):
+    import httpx
+
+    if url is None:
+        return await stack.enter_async_context(in_process_client("loadgen"))
+
+    client = await stack.enter_async_context(httpx.AsyncClient(base_url=url, timeout=60))
+    if token is None and username:
+        response = await client.post("/api/auth/login", data={"username": username, "password": password})
+        response.raise_for_status()
+        token = response.json()["access_token"]
+    if token:
+        client.headers["Authorization"] = f"Bearer {token}"
+    return client
+
+
+async def main_async(args) -> List[Dict]:
+    import feature_engine
+
+    mix = parse_mix(args.mix)
+    clips = [
+        wav_bytes(feature_engine.synthetic_speech(args.clip_seconds, args.sample_rate,
+                                                  f0=90 + 7 * i, seed=i), args.sample_rate)
+        for i in range(args.clips)
+    ]
+
+    levels = []
+    async with AsyncExitStack() as stack:
+        client = await _client(stack, args.url, args.token, args.username, args.password)
+        # Прогрев: воркеры пула, модели, соединения
+        await run_level(client, mix, clips, 1, 1.0, seed=0)
+        for seed, concurrency in enumerate(parse_list(args.concurrency, int), start=1):
+            level = await run_level(client, mix, clips, concurrency, args.duration, seed)
+            print_level(level)
+            levels.append(level)
+    return levels
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон API идентификации")
+    parser.add_argument("--url", help="Адрес сервера (по умолчанию — приложение в этом процессе)")
+    parser.add_argument("--token", help="JWT-токен для запросов")
+    parser.add_argument("--username", help="Пользователь для получения токена")
+    parser.add_argument("--password", help="Пароль для получения токена")
+    parser.add_argument("--mix", default="identify=8,health=1,monitor=1",
+                        help=f"Веса маршрутов: {', '.join(ROUTES)}")
+    parser.add_argument("--concurrency", default="1,4,16,64", help="Уровни параллельности")
+    parser.add_argument("--duration", type=float, default=10.0, help="Секунд на уровень")
+    parser.add_argument("--clips", type=int, default=16, help="Разных записей для identify")
+    parser.add_argument("--clip-seconds", type=float, default=3.0, help="Длительность записи")
+    parser.add_argument("--sample-rate", type=int, default=16000, help="Частота дискретизации записей")
+    parser.add_argument("--output", help="JSON-файл с результатами")
+    args = parser.parse_args()
+
+    levels = asyncio.run(main_async(args))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"mix": parse_mix(args.mix), "levels": levels}, f, ensure_ascii=False, indent=2)
+        print(f"\nРезультаты записаны в {args.output}")
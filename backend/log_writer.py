@@ -0,0 +1,125 @@
+"""
+Буферизованная запись IdentificationLog.
+
+Эндпоинты не делают commit на каждую идентификацию: записи кладутся в
+ограниченную очередь, а фоновая задача вставляет их в базу пачками — как
+только набралось batch_size записей или прошло flush_interval секунд.
+Сама вставка выполняется в потоке, вне event loop. Если база не успевает,
+очередь заполняется и write() ждёт (обратное давление), а не копит записи
+в памяти без предела. При остановке приложения очередь дописывается целиком.
+"""
+
+import asyncio
+from datetime import datetime
+from typing import Callable, List, Optional
+
+from sqlalchemy import insert
+
+import models
+from metrics import metrics
+
+
+class LogWriter:
+    """Асинхронный приёмник логов идентификации с пакетной вставкой"""
+
+    def __init__(self, session_factory: Callable, batch_size: int = 100,
+                 flush_interval: float = 0.5, max_queue: int = 10000):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+
+        self.written = 0
+        self.dropped = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def start(self):
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Дописывает всё, что осталось в очереди, и останавливает задачу"""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    async def write(self, user_id: Optional[int], result: dict):
+        """Ставит запись в очередь; ждёт, если очередь заполнена"""
+        record = {
+            "user_id": user_id,
+            "identified_speaker": result["identified_speaker"],
+            "confidence": result["confidence"],
+            "model_used": result["model_used"],
+            "processing_time": result["processing_time"],
+            # Время фиксируется сейчас, а не в момент вставки пачки
+            "created_at": datetime.utcnow(),
+        }
+        if self._task is None:
+            # Приёмник не запущен (например, вне lifespan) — пишем сразу
+            await asyncio.to_thread(self._insert, [record])
+            return
+        await self._queue.put(record)
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            record = await self._queue.get()
+            if record is None:
+                break
+            batch.append(record)
+
+            # Добираем пачку, пока не истёк интервал или не набрался размер
+            deadline = asyncio.get_running_loop().time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - asyncio.get_running_loop().time()
+                if timeout <= 0:
+                    break
+                try:
+                    record = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if record is None:
+                    stopping = True
+                    break
+                batch.append(record)
+
+            await self._flush(batch)
+
+        # Остановка: всё, что успели положить после маркера
+        rest = []
+        while not self._queue.empty():
+            record = self._queue.get_nowait()
+            if record is not None:
+                rest.append(record)
+        for start in range(0, len(rest), self.batch_size):
+            await self._flush(rest[start:start + self.batch_size])
+
+    async def _flush(self, batch: List[dict]):
+        try:
+            await asyncio.to_thread(self._insert, batch)
+            self.written += len(batch)
+        except Exception as e:
+            self.dropped += len(batch)
+            print(f"Ошибка записи логов идентификации ({len(batch)} записей потеряно): {e}")
+
+    def _insert(self, batch: List[dict]):
+        """Одна вставка executemany и один commit на всю пачку"""
+        db = self.session_factory()
+        try:
+            with metrics.stage("db_log"):
+                db.execute(insert(models.IdentificationLog), batch)
+                db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
@@ -1,40 +1,280 @@
-from fastapi import FastAPI, File, UploadFile, Depends, HTTPException, status, BackgroundTasks
+from fastapi import (
+    FastAPI, File, UploadFile, Depends, HTTPException, status, BackgroundTasks,
+    WebSocket, WebSocketDisconnect, Request, Response, Header, Query
+)
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from fastapi.security import OAuth2PasswordRequestForm
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from sqlalchemy import desc
+from contextlib import asynccontextmanager
+import asyncio
 from datetime import datetime
 import numpy as np
-import soundfile as sf
-import librosa
-import io
-import subprocess
-import sys
 from datetime import timedelta
-from typing import List
+from typing import List, Literal, Optional
+import json
 import shutil
 from pathlib import Path
 import uuid
+import time
+import threading
 
 
 from config import settings
-from database import engine, get_db
+from database import engine, get_db, SessionLocal, sync_schema
 import models
 import schemas
+import history
+import speaker_registry
 from auth import (
     get_password_hash, verify_password, create_access_token,
-    get_current_user, oauth2_scheme
+    get_current_user, get_user_from_token, oauth2_scheme, user_cache
 )
 from ml_service import ml_service
+from retrain_jobs import RetrainJobManager, RetrainInProgress
+from model_store import prune_versions
+from speaker_index import SpeakerIndex
+from corpus_store import CorpusStore
+from online_model import OnlineModel
+from result_cache import ResultCache, audio_key
+from log_writer import LogWriter
+from monitor_hub import BroadcastHub
+from metrics import metrics
+from admission import AdmissionController, AdmissionRejected
+from inference_pool import (
+    inference_pool, identify_audio, identify_samples, extract_audio_features, score_features,
+    ingest_audio, InferenceQueueFull
+)
+from audio_io import TARGET_SR
 
 # Создаём таблицы
 models.Base.metadata.create_all(bind=engine)
+merged_duplicates = sync_schema()
+
+AUDIO_DIR = Path("./audio_samples")
+
+def record_model_speakers():
+    """Отмечает в реестре говорящих, которых знает обслуживаемая версия моделей"""
+    with SessionLocal() as db:
+        speaker_registry.record_model_version(db, ml_service.model_version, ml_service.get_speakers())
+
+with SessionLocal() as db:
+    if merged_duplicates:
+        # Слитые повторы профилей и образцов: счётчики профилей считаются заново
+        speaker_registry.recount_profiles(db)
+    speaker_registry.sync_from_disk(db, AUDIO_DIR)
+record_model_speakers()
+
+def activate_model_version(version: str):
+    """
+    Публикует новую версию моделей и переводит на неё воркеры пула.
+    Вызывается из потока задачи переобучения: restart() пула потокобезопасен.
+    """
+    ml_service.activate_version(version)
+    inference_pool.restart()
+    result_cache.clear()
+    record_model_speakers()
+    removed = prune_versions(settings.MODELS_PATH, settings.MODELS_KEEP_VERSIONS)
+    if removed:
+        print(f"Удалены старые версии моделей: {', '.join(removed)}")
+
+retrain_jobs = RetrainJobManager(
+    settings.MODELS_PATH,
+    on_success=activate_model_version,
+    timeout=settings.RETRAIN_TIMEOUT,
+    corpus_dir=settings.CORPUS_DIR or None
+)
+
+speaker_index = SpeakerIndex(settings.SPEAKER_INDEX_PATH)
+
+# Образцы дописываются и в упакованное хранилище, из которого читает переобучение
+corpus_store = CorpusStore(settings.CORPUS_DIR) if settings.CORPUS_DIR else None
+
+# Онлайн-модель дообучается только здесь; воркеры читают её снимки
+online_model = (OnlineModel.load(settings.ONLINE_MODEL_PATH) or OnlineModel()) \
+    if settings.ONLINE_MODEL_ENABLED else None
+online_model_lock = threading.Lock()
+
+# Говорящие из индекса (в том числе базовые) без онлайн-модели не сравнить
+# с ансамблем: доучиваем её на их образцах
+if online_model is not None:
+    seeded = online_model.seed({name: speaker_index.vectors(name) for name in speaker_index.speakers})
+    if seeded:
+        online_model.save(settings.ONLINE_MODEL_PATH)
+        print(f"Онлайн-модель: добавлено {seeded} говорящих из индекса")
+
+result_cache = ResultCache(
+    settings.RESULT_CACHE_BACKEND,
+    max_entries=settings.RESULT_CACHE_SIZE,
+    ttl=settings.RESULT_CACHE_TTL,
+    redis_url=settings.REDIS_URL
+)
+
+log_writer = LogWriter(
+    SessionLocal,
+    batch_size=settings.LOG_BATCH_SIZE,
+    flush_interval=settings.LOG_FLUSH_INTERVAL,
+    max_queue=settings.LOG_QUEUE_SIZE
+)
+
+monitor_hub = BroadcastHub(replay_size=settings.MONITOR_REPLAY_SIZE)
+
+admission = AdmissionController(
+    max_inflight=settings.ADMISSION_MAX_INFLIGHT or inference_pool.workers,
+    max_queue=settings.ADMISSION_QUEUE_SIZE,
+    queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT
+)
+
+def overloaded(e: Exception) -> HTTPException:
+    """503 с подсказкой клиенту, когда повторить запрос"""
+    retry_after = e.retry_after if isinstance(e, AdmissionRejected) else admission.retry_after()
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(retry_after)})
+
+# Текущее состояние очередей и кэшей снимается в момент запроса /metrics
+metrics.gauge("speaker_inference_inflight", "Задачи в пуле идентификации (выполняются и ждут)",
+              lambda: inference_pool.inflight)
+metrics.gauge("speaker_inference_capacity", "Максимум задач в пуле идентификации",
+              lambda: inference_pool.capacity)
+metrics.gauge("speaker_log_queue_pending", "Записи лога, ожидающие вставки в базу",
+              lambda: log_writer.pending)
+metrics.gauge("speaker_log_written_total", "Записано логов идентификации",
+              lambda: log_writer.written, kind="counter")
+metrics.gauge("speaker_log_dropped_total", "Потеряно логов идентификации",
+              lambda: log_writer.dropped, kind="counter")
+metrics.gauge("speaker_result_cache_hits_total", "Попадания в кэш результатов",
+              lambda: result_cache.hits, kind="counter")
+metrics.gauge("speaker_result_cache_misses_total", "Промахи кэша результатов",
+              lambda: result_cache.misses, kind="counter")
+metrics.gauge("speaker_result_cache_hit_ratio", "Доля попаданий в кэш результатов",
+              lambda: result_cache.hits / max(result_cache.hits + result_cache.misses, 1))
+metrics.gauge("speaker_auth_cache_hits_total", "Попадания в кэш пользователей",
+              lambda: user_cache.hits, kind="counter")
+metrics.gauge("speaker_auth_cache_misses_total", "Промахи кэша пользователей",
+              lambda: user_cache.misses, kind="counter")
+metrics.gauge("speaker_admission_inflight", "Допущенные и выполняющиеся идентификации",
+              lambda: admission.inflight)
+metrics.gauge("speaker_admission_waiting", "Идентификации в очереди допуска",
+              lambda: admission.waiting)
+metrics.gauge("speaker_admission_rejected_total", "Отклонено: очередь допуска заполнена",
+              lambda: admission.rejected, kind="counter")
+metrics.gauge("speaker_admission_timed_out_total", "Отклонено: истёк срок ожидания в очереди",
+              lambda: admission.timed_out, kind="counter")
+metrics.gauge("speaker_monitor_subscribers", "Подключённые панели операторов",
+              lambda: monitor_hub.subscribers)
+
+def access_granted(speaker: Optional[str], confidence: float, model_used: str) -> bool:
+    """
+    Решение о доступе. Индекс отвечает косинусной близостью, а не
+    вероятностью, поэтому для него порог SPEAKER_INDEX_MIN_SCORE
+    """
+    if speaker is None:
+        return False
+    if model_used == INDEX_MODEL:
+        return confidence >= settings.SPEAKER_INDEX_MIN_SCORE
+    return confidence > settings.ACCESS_CONFIDENCE
+
+def monitor_event(result: dict, created_at: datetime) -> dict:
+    """Событие панели оператора (тот же формат, что у /api/monitor/latest)"""
+    return {
+        "status": "success",
+        "speaker": result['identified_speaker'],
+        "confidence": result['confidence'],
+        "model": result['model_used'],
+        "timestamp": created_at.strftime("%H:%M:%S"),
+        "full_date": created_at.date().isoformat(),
+        "is_access_granted": access_granted(result['identified_speaker'], result['confidence'], result['model_used'])
+    }
+
+async def record_identification(user_id: Optional[int], result: dict):
+    """Лог в базу (пачками, в фоне) и мгновенное событие на панели операторов"""
+    await log_writer.write(user_id, result)
+    monitor_hub.publish(monitor_event(result, datetime.utcnow()))
+
+def models_version() -> str:
+    """Версия всего, от чего зависит ответ классификаторов"""
+    online_version = online_model.version if online_model is not None else "-"
+    return f"{ml_service.model_version}/{online_version}"
+
+def learn_online(speaker_name: str, features: np.ndarray, clip_id: str) -> str:
+    """Дообучает онлайн-модель и публикует новый снимок"""
+    with online_model_lock:
+        online_model.learn(speaker_name, features, [clip_id])
+        return online_model.save(settings.ONLINE_MODEL_PATH)
+
+async def extract_single(audio_bytes: bytes):
+    """Признаки одного файла в пуле; ошибка декодирования — исключение"""
+    features, error, processing_time = (await inference_pool.run(extract_audio_features, [audio_bytes]))[0]
+    if error is not None:
+        raise ValueError(error)
+    return features, processing_time
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+def valid_speaker_name(speaker_name: str) -> str:
+    """Имя говорящего — это и имя каталога: без разделителей пути и служебных имён"""
+    name = speaker_name.strip()
+    if not name or len(name) > 100 or name.startswith(".") or any(c in name for c in '/\\\n\0'):
+        raise HTTPException(status_code=400, detail="Недопустимое имя говорящего")
+    return name
+
+async def save_upload(upload: UploadFile, path: Path, max_bytes: int):
+    """Пишет загрузку на диск частями, не держа файл целиком в памяти"""
+    size = 0
+    try:
+        with open(path, "wb") as f:
+            while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"Файл больше {max_bytes // (1024 * 1024)} МБ"
+                    )
+                f.write(chunk)
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+
+INDEX_MODEL = "SpeakerIndex"
+
+async def identify_by_index(audio_bytes: bytes) -> dict:
+    """
+    Идентификация поиском ближайших образцов в индексе говорящих. Если
+    даже лучший образец ближе порога SPEAKER_INDEX_MIN_SCORE, говорящий не
+    узнан (identified_speaker=None), а кандидаты остаются в probabilities.
+    """
+    features, processing_time = await extract_single(audio_bytes)
+    
+    start_time = time.time()
+    matches = await asyncio.to_thread(speaker_index.search, features, settings.SPEAKER_INDEX_TOP_K)
+    if not matches:
+        raise HTTPException(status_code=409, detail="Индекс говорящих пуст")
+    
+    best = matches[0]
+    return {
+        'identified_speaker': best['speaker'] if best['score'] >= settings.SPEAKER_INDEX_MIN_SCORE else None,
+        'confidence': max(best['score'], 0.0),
+        'model_used': INDEX_MODEL,
+        'probabilities': {match['speaker']: match['score'] for match in matches},
+        'processing_time': processing_time + time.time() - start_time,
+        'stages': ["index"]
+    }
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    inference_pool.start()
+    log_writer.start()
+    yield
+    await log_writer.stop()
+    inference_pool.shutdown()
 
 # Инициализация FastAPI
 app = FastAPI(
     title="Speaker Recognition API",
     description="Биометрическая идентификация личности по голосу",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS
@@ -44,8 +284,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # курсор истории идентификаций
 )
 
+@app.middleware("http")
+async def measure_request(request: Request, call_next):
+    """Время запроса по шаблону маршрута (а не по фактическому пути — без лишних серий)"""
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    metrics.requests.observe(route.path if route else "unmatched", time.perf_counter() - start)
+    return response
+
 # ============================================================================
 # ROUTES: Authentication
 # ============================================================================
@@ -59,11 +309,11 @@ async def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
     if db.query(models.User).filter(models.User.username == user.username).first():
         raise HTTPException(status_code=400, detail="Username already taken")
     
-    # Создаём
+    # Создаём; bcrypt считается сотни миллисекунд — не в event loop
     db_user = models.User(
         email=user.email,
         username=user.username,
-        hashed_password=get_password_hash(user.password)
+        hashed_password=await run_in_threadpool(get_password_hash, user.password)
     )
     db.add(db_user)
     db.commit()
@@ -87,7 +337,7 @@ async def login(
             detail="Incorrect username or password"
         )
     
-    if not verify_password(form_data.password, user.hashed_password):
+    if not await run_in_threadpool(verify_password, form_data.password, user.hashed_password):
         print(f"[LOGIN] Неверный пароль для: {form_data.username}")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -116,41 +366,227 @@ async def get_me(current_user: models.User = Depends(get_current_user)):
 async def identify_speaker(
     audio_file: UploadFile = File(...),
     use_ensemble: bool = True,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    mode: Literal["classifier", "index"] = "classifier",
+    current_user: models.User = Depends(get_current_user)
 ):
-    """Идентификация говорящего по аудиофайлу"""
+    """
+    Идентификация говорящего по аудиофайлу: классификаторами (mode=classifier)
+    или поиском по индексу говорящих (mode=index)
+    """
     try:
         # Читаем аудио
-        audio_bytes = await audio_file.read()
-        audio_data, sr = sf.read(io.BytesIO(audio_bytes))
+        with metrics.stage("upload_read"):
+            audio_bytes = await audio_file.read()
         
-        # Ресемплинг если нужно
-        if sr != 16000:
-            audio_data = librosa.resample(audio_data, orig_sr=sr, target_sr=16000)
-            sr = 16000
+        # Повторная отправка той же записи отвечает из кэша
+        version = f"index-{speaker_index.generation}" if mode == "index" else models_version()
+        cache_key = audio_key(audio_bytes, version, mode, use_ensemble)
+        result = result_cache.get(cache_key)
         
-        # Идентификация
-        result = ml_service.identify(audio_data, sr, use_ensemble)
+        if result is None:
+            # Ответы из кэша не занимают места: допуск нужен только для вычислений
+            async with admission.slot():
+                if mode == "index":
+                    result = await identify_by_index(audio_bytes)
+                else:
+                    # Декодирование, ресемплинг и идентификация — в пуле, вне event loop
+                    result = await inference_pool.run(identify_audio, audio_bytes, use_ensemble)
+            result_cache.set(cache_key, dict(result))
         
-        # Сохраняем лог
-        log = models.IdentificationLog(
-            user_id=current_user.id,
-            identified_speaker=result['identified_speaker'],
-            confidence=result['confidence'],
-            model_used=result['model_used'],
-            processing_time=result['processing_time']
-        )
-        db.add(log)
-        db.commit()
-        db.refresh(log) # Добавьте это, чтобы получить ID из базы
+        # Лог пишется в фоне пачками
+        await record_identification(current_user.id, result)
         
         return result
         
+    except (AdmissionRejected, InferenceQueueFull) as e:
+        raise overloaded(e)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/identify/batch", response_model=schemas.BatchIdentificationResponse)
+async def identify_speakers_batch(
+    audio_files: List[UploadFile] = File(...),
+    use_ensemble: bool = True,
+    current_user: models.User = Depends(get_current_user)
+):
+    """Пакетная идентификация: признаки параллельно, модели — один раз на весь пакет"""
+    if len(audio_files) > settings.BATCH_MAX_FILES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Слишком много файлов: максимум {settings.BATCH_MAX_FILES}"
+        )
+    
+    try:
+        with metrics.stage("upload_read"):
+            clips = [await audio_file.read() for audio_file in audio_files]
+        
+        # Извлечение признаков — параллельно, пачками по числу воркеров
+        extracted = await inference_pool.map(extract_audio_features, clips)
+        valid = [i for i, (_, error, _) in enumerate(extracted) if error is None]
+        
+        # Классификация — один вызов scaler/моделей на всю матрицу признаков
+        scored = []
+        if valid:
+            features = np.vstack([extracted[i][0] for i in valid])
+            scored = await inference_pool.run(score_features, features, use_ensemble)
+        
+        results = [
+            schemas.BatchIdentificationItem(filename=audio_file.filename, error=error)
+            for audio_file, (_, error, _) in zip(audio_files, extracted)
+        ]
+        for i, result in zip(valid, scored):
+            result['processing_time'] += extracted[i][2]
+            results[i].result = schemas.IdentificationResponse(**result)
+            await record_identification(current_user.id, result)
+        
+        return {"total": len(results), "identified": len(valid), "results": results}
+        
+    except InferenceQueueFull as e:
+        raise overloaded(e)
     except Exception as e:
-        db.rollback() # Важно откатить транзакцию при ошибке
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.websocket("/ws/identify")
+async def identify_speaker_stream(
+    websocket: WebSocket,
+    token: str,
+    sr: int = TARGET_SR,
+    use_ensemble: bool = True
+):
+    """
+    Потоковая идентификация с микрофона.
+    
+    Клиент присылает бинарные сообщения — PCM float32 (little-endian, моно)
+    с частотой sr (от STREAM_MIN_SR до STREAM_MAX_SR) — и текст "end" в
+    конце записи. Признаки копятся по мере поступления звука; каждые
+    STREAM_UPDATE_SECONDS сервер присылает промежуточную оценку, а как
+    только уверенность достигла STREAM_CONFIDENCE (или запись закончилась) —
+    итоговый результат с final=true и закрывает соединение.
+    
+    Промежуточные оценки дают потоковые признаки; итоговый результат
+    считается пакетным путём (как /api/identify) по всей принятой записи:
+    причинные удаление тишины и шумоподавление потока расходятся с
+    пакетными (см. feature_engine.check_parity). Запись ограничена
+    STREAM_MAX_SECONDS, поэтому буфер невелик.
+    
+    Каждый шаг обработки (фрагмент, оценка, итог) проходит контроль допуска
+    наравне с /api/identify; при перегрузке соединение закрывается с кодом
+    1013 (повторить позже).
+    """
+    db = SessionLocal()
+    try:
+        user = get_user_from_token(token, db)
+    finally:
+        db.close()
+    if user is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    if not settings.STREAM_MIN_SR <= sr <= settings.STREAM_MAX_SR:
+        # Иначе soxr получит нулевую/отрицательную или заведомо нереальную частоту
+        await websocket.close(code=status.WS_1003_UNSUPPORTED_DATA,
+                              reason=f"sr должна быть от {settings.STREAM_MIN_SR} до {settings.STREAM_MAX_SR} Гц")
+        return
+    
+    await websocket.accept()
+    
+    from feature_engine import StreamingFeatureExtractor
+    extractor = StreamingFeatureExtractor(TARGET_SR)
+    resampler = None
+    if sr != TARGET_SR:
+        import soxr
+        resampler = soxr.ResampleStream(sr, TARGET_SR, 1, dtype="float32")
+    
+    received = []  # отсчёты 16 кГц для итогового пакетного расчёта
+    
+    async def score():
+        features = extractor.features()
+        if features is None:
+            return None
+        async with admission.slot():
+            result = (await inference_pool.run(score_features, features.reshape(1, -1), use_ensemble))[0]
+        result["duration"] = extractor.duration
+        result["final"] = False
+        return result
+    
+    async def score_final():
+        async with admission.slot():
+            if resampler is not None:
+                tail = resampler.resample_chunk(np.empty(0, dtype="float32"), last=True)
+                received.append(tail)
+                await asyncio.to_thread(extractor.push, tail)
+            await asyncio.to_thread(extractor.finalize)
+            if extractor.features() is None:
+                return None  # поток не нашёл речи — пакетный путь её тоже не найдёт
+            audio = np.concatenate(received)
+            result = await inference_pool.run(identify_samples, audio, TARGET_SR, use_ensemble)
+        result["duration"] = extractor.duration
+        result["final"] = True
+        return result
+    
+    started = asyncio.get_running_loop().time()
+    scored_at = 0.0
+    result = None
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            
+            if message.get("bytes"):
+                if len(message["bytes"]) % 4:
+                    # Не целое число отсчётов float32 — клиент шлёт не тот формат
+                    await websocket.send_json({
+                        "final": True,
+                        "error": "Ожидается PCM float32: длина сообщения должна быть кратна 4 байтам"
+                    })
+                    await websocket.close(code=status.WS_1003_UNSUPPORTED_DATA)
+                    return
+                chunk = np.frombuffer(message["bytes"], dtype="<f4")
+                if resampler is not None:
+                    chunk = resampler.resample_chunk(chunk)
+                received.append(chunk)
+                # Обработка фрагмента — вне event loop
+                async with admission.slot():
+                    await asyncio.to_thread(extractor.push, chunk)
+                
+                if extractor.duration >= settings.STREAM_MAX_SECONDS:
+                    break
+                if (extractor.duration < settings.STREAM_MIN_SECONDS
+                        or extractor.duration - scored_at < settings.STREAM_UPDATE_SECONDS):
+                    continue
+                
+                scored_at = extractor.duration
+                result = await score()
+                if result is None:
+                    continue
+                if result["confidence"] >= settings.STREAM_CONFIDENCE:
+                    break
+                await websocket.send_json(result)
+            elif message.get("text") == "end":
+                break
+        
+        result = await score_final()
+        
+        if result is None:
+            await websocket.send_json({"final": True, "error": "Речь не обнаружена"})
+            await websocket.close()
+            return
+        
+        result["processing_time"] = asyncio.get_running_loop().time() - started
+        
+        # Сохраняем лог только для итогового результата
+        await record_identification(user.id, result)
+        
+        await websocket.send_json(result)
+        await websocket.close()
+        
+    except WebSocketDisconnect:
+        pass
+    except (AdmissionRejected, InferenceQueueFull) as e:
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason=str(e))
+
 @app.get("/api/speakers")
 async def get_speakers():
     """Получить список всех зарегистрированных говорящих"""
@@ -159,17 +595,51 @@ async def get_speakers():
 
 @app.get("/api/identifications", response_model=List[schemas.IdentificationLogResponse])
 async def get_identification_history(
-    limit: int = 50,
+    response: Response,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    speaker: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """История идентификаций пользователя"""
-    logs = db.query(models.IdentificationLog)\
-        .filter(models.IdentificationLog.user_id == current_user.id)\
-        .order_by(models.IdentificationLog.created_at.desc())\
-        .limit(limit)\
-        .all()
-    return logs
+    """
+    История идентификаций пользователя, от новых к старым.
+    
+    Ответ — список записей, как и раньше; курсор следующей страницы
+    приходит в заголовке X-Next-Cursor (его нет на последней странице) и
+    передаётся в параметре cursor следующего запроса.
+    """
+    query = history.filtered(db, current_user.id, speaker, date_from, date_to)
+    try:
+        items, next_cursor = history.page(query, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return items
+
+@app.get("/api/identifications/export")
+async def export_identification_history(
+    format: Literal["csv", "ndjson"] = "csv",
+    speaker: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    current_user: models.User = Depends(get_current_user)
+):
+    """Выгрузка истории идентификаций для аудита (потоком, без ограничения объёма)"""
+    rows = history.export(
+        SessionLocal, format, current_user.id,
+        speaker=speaker, date_from=date_from, date_to=date_to
+    )
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = f"identifications.{format}"
+    return StreamingResponse(
+        rows,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
 # ============================================================================
 # ROUTES: Health & Info
@@ -183,11 +653,17 @@ async def root():
         "docs": "/docs"
     }
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Метрики в текстовом формате Prometheus"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 async def health_check():
     return {
         "status": "healthy",
         "models_loaded": True,
+        "model_version": ml_service.model_version,
         "num_speakers": len(ml_service.get_speakers())
     }
 
@@ -197,7 +673,11 @@ async def health_check():
 @app.get("/api/monitor/latest")
 async def get_latest_identification(db: Session = Depends(get_db)):
     """Получить самую последнюю попытку идентификации для панели оператора"""
-    # Запрос последней записи по дате создания
+    # Последнее событие этого процесса — без запроса к базе
+    if monitor_hub.latest is not None:
+        return monitor_hub.latest
+    
+    # После перезапуска событий ещё нет — берём последнюю запись из базы
     latest_log = db.query(models.IdentificationLog)\
         .order_by(desc(models.IdentificationLog.created_at))\
         .first()
@@ -213,9 +693,50 @@ async def get_latest_identification(db: Session = Depends(get_db)):
         "model": latest_log.model_used,
         "timestamp": latest_log.created_at.strftime("%H:%M:%S"),
         "full_date": latest_log.created_at.date(),
-        "is_access_granted": latest_log.confidence > 0.8  # Порог доступа changable
+        "is_access_granted": access_granted(latest_log.identified_speaker, latest_log.confidence,
+                                            latest_log.model_used)
     }
 
+@app.get("/api/monitor/stream")
+async def stream_identifications(
+    request: Request,
+    replay: int = 1,
+    last_event_id: Optional[str] = Header(None)
+):
+    """
+    Поток результатов идентификации (Server-Sent Events) для панели оператора.
+    
+    При подключении отдаются последние replay событий, при переподключении
+    браузер сам присылает Last-Event-ID и получает всё пропущенное.
+    """
+    try:
+        last_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_id = None
+    queue = monitor_hub.subscribe(last_id, replay)
+    
+    async def events():
+        try:
+            while True:
+                try:
+                    event_id, event = await asyncio.wait_for(queue.get(), settings.MONITOR_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    # Комментарий не даёт прокси закрыть простаивающее соединение
+                    yield ": heartbeat\n\n"
+                    continue
+                data = json.dumps({**event, "id": event_id}, ensure_ascii=False)
+                yield f"id: {event_id}\nevent: identification\ndata: {data}\n\n"
+        finally:
+            monitor_hub.unsubscribe(queue)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 #============================================================================
 # ROUTES: Voice Registration & Retraining
 # ============================================================================
@@ -223,81 +744,132 @@ async def get_latest_identification(db: Session = Depends(get_db)):
 @app.post("/api/register/audio")
 async def register_audio_sample(
     speaker_name: str,
-    sample_number: int,
+    sample_number: int = Query(..., ge=1),
     audio_file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
 ):
-    """Сохранение аудиообразца для регистрации нового говорящего"""
+    """
+    Сохранение аудиообразца для регистрации нового говорящего.
+    
+    Файл принимается потоком, один раз декодируется и сохраняется в
+    каноническом виде (моно, float32, 16 кГц); признаки считаются сразу, в
+    воркере пула, и записываются в базу (VoiceProfile/AudioSample).
+    """
+    speaker_name = valid_speaker_name(speaker_name)
+    user_dir = AUDIO_DIR / speaker_name
+    user_dir.mkdir(parents=True, exist_ok=True)
+    file_path = user_dir / f"sample_{sample_number}.wav"
+    upload_path = user_dir / f".upload-{uuid.uuid4().hex}"
+    
+    try:
+        await save_upload(audio_file, upload_path, settings.ENROLL_MAX_BYTES)
+        ingested = await inference_pool.run(
+            ingest_audio, str(upload_path), str(file_path),
+            settings.ENROLL_MIN_SECONDS, settings.ENROLL_MAX_SECONDS
+        )
+    except (ValueError, InferenceQueueFull, HTTPException) as e:
+        # Каталог, созданный только ради отклонённой загрузки, не оставляем
+        upload_path.unlink(missing_ok=True)
+        try:
+            user_dir.rmdir()
+        except OSError:
+            pass
+        if isinstance(e, ValueError):
+            raise HTTPException(status_code=400, detail=str(e))
+        if isinstance(e, InferenceQueueFull):
+            raise overloaded(e)
+        raise
+    finally:
+        upload_path.unlink(missing_ok=True)
+    
     try:
-        # Создаём директорию для нового пользователя
-        user_dir = Path("./audio_samples") / speaker_name
-        user_dir.mkdir(parents=True, exist_ok=True)
+        features = ingested["features"]
+        # Ключ образца: повторная загрузка того же номера заменяет его везде
+        clip_id = f"{speaker_name}/{file_path.name}"
+        speaker_registry.record_sample(db, speaker_name, file_path, ingested)
+        if corpus_store is not None:
+            await asyncio.to_thread(
+                corpus_store.append_file, clip_id, speaker_name, file_path, ingested["sha256"]
+            )
         
-        # Сохраняем файл
-        file_path = user_dir / f"sample_{sample_number}.wav"
-        audio_bytes = await audio_file.read()
-
-        with open(file_path, "wb") as f:
-            f.write(audio_bytes)
+        # Образец сразу доступен для поиска по индексу и онлайн-модели, без переобучения
+        await asyncio.to_thread(speaker_index.add, speaker_name, features, clip_id)
+        online_version = None
+        if online_model is not None:
+            online_version = await asyncio.to_thread(learn_online, speaker_name, features, clip_id)
         
         return {
             "status": "success",
             "speaker_name": speaker_name,
             "sample_number": sample_number,
-            "file_path": str(file_path)
+            "file_path": str(file_path),
+            "duration": ingested["duration"],
+            "indexed": True,
+            "online_model_version": online_version
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/speakers/registered")
-async def get_registered_speakers():
-    """Получить список зарегистрированных говорящих"""
-    try:
-        audio_dir = Path("./audio_samples")
-        if not audio_dir.exists():
-            return {"speakers": [], "count": 0}
-        
-        speakers = []
-        for speaker_dir in audio_dir.iterdir():
-            if speaker_dir.is_dir():
-                sample_count = len(list(speaker_dir.glob("*.wav")))
-                speakers.append({
-                    "name": speaker_dir.name,
-                    "samples": sample_count
-                })
-        
-        return {"speakers": speakers, "count": len(speakers)}
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+async def get_registered_speakers(db: Session = Depends(get_db)):
+    """
+    Зарегистрированные говорящие из реестра: число образцов, их суммарная
+    длительность и вошёл ли говорящий в обслуживаемую версию моделей
+    """
+    version = ml_service.model_version
+    speakers = speaker_registry.list_speakers(db, version)
+    return {
+        "speakers": speakers,
+        "count": len(speakers),
+        "model_version": version,
+        "pending_retrain": sum(1 for speaker in speakers if not speaker["in_model"])
+    }
 
-@app.post("/api/models/retrain")
+@app.get("/api/speakers/index")
+async def get_speaker_index():
+    """Состав индекса говорящих: число образцов по каждому"""
+    counts = speaker_index.counts()
+    return {"total": len(counts), "samples": len(speaker_index), "speakers": counts}
+
+@app.post("/api/models/retrain", status_code=202)
 async def retrain_models():
-    """Переобучение моделей с новыми данными"""
+    """Запуск переобучения моделей в фоне; прогресс — по job_id"""
     try:
-        # Запускаем скрипт переобучения
-        result = subprocess.run(
-            [sys.executable, "retrain_model.py"],
-            capture_output=True,
-            text=True,
-            timeout=600  # 10 минут максимум
+        job = retrain_jobs.submit()
+    except RetrainInProgress as e:
+        raise HTTPException(
+            status_code=409,
+            detail={"message": str(e), "job_id": e.job.id}
         )
-        
-        if result.returncode != 0:
-            raise Exception(f"Ошибка переобучения: {result.stderr}")
-        
-        # ПЕРЕЗАГРУЖАЕМ модели в память
-        ml_service.reload_models()
-        
-        return {
-            "status": "success",
-            "message": "Модели успешно переобучены и перезагружены!",
-            "num_speakers": len(ml_service.get_speakers()),
-            "speakers": ml_service.get_speakers()
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return job.to_dict()
+
+@app.get("/api/models/retrain/{job_id}")
+async def get_retrain_status(job_id: str):
+    """Статус и прогресс задачи переобучения"""
+    job = retrain_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задача переобучения не найдена")
+    
+    status_info = job.to_dict()
+    if job.status == "succeeded":
+        status_info["num_speakers"] = len(ml_service.get_speakers())
+        status_info["speakers"] = ml_service.get_speakers()
+    return status_info
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """Статистика кэша результатов идентификации"""
+    return result_cache.stats()
+
+@app.get("/api/models/version")
+async def get_model_version():
+    """Текущая обслуживаемая версия моделей"""
+    return {
+        "version": ml_service.model_version,
+        "num_speakers": len(ml_service.get_speakers())
+    }
 
 # ============================================================================
 # ЗАПУСК
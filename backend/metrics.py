@@ -0,0 +1,123 @@
+"""
+Метрики задержек по этапам обработки в текстовом формате Prometheus.
+
+Этапы размечаются контекстным менеджером stage("decode") и т.п.; замер —
+два вызова perf_counter и одна запись в гистограмму под блокировкой, так что
+накладные расходы пренебрежимо малы по сравнению с самими этапами.
+
+Этапы, выполняемые в пуле процессов, не могут писать в гистограммы
+основного процесса. Поэтому задача пула выполняется внутри collect():
+замеры копятся в списке, возвращаются вместе с результатом и записываются
+уже в основном процессе (record).
+
+Очереди и кэши не дублируются счётчиками: их текущие значения снимаются
+в момент запроса /metrics через зарегистрированные функции (gauge).
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Границы корзин гистограмм, секунды
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами, по одной на значение метки"""
+
+    def __init__(self, name: str, help_text: str, label: str, buckets=BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = buckets
+        self._series = {}  # значение метки -> [счётчики корзин..., сумма, число]
+        self._lock = threading.Lock()
+
+    def observe(self, label_value: str, seconds: float):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [0] * (len(self.buckets) + 3)
+            series[index] += 1
+            series[-2] += seconds
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {key: list(series) for key, series in self._series.items()}
+        for label_value, series in sorted(snapshot.items()):
+            labels = f'{self.label}="{label_value}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {series[-1]}')
+            lines.append(f"{self.name}_sum{{{labels}}} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{{{labels}}} {series[-1]}")
+        return lines
+
+
+class Metrics:
+    """Реестр метрик процесса"""
+
+    def __init__(self):
+        self.stages = Histogram("speaker_stage_seconds", "Длительность этапа обработки", "stage")
+        self.requests = Histogram("speaker_request_seconds", "Длительность HTTP-запроса", "route")
+        self._gauges: Dict[str, Tuple[str, Callable[[], float], str]] = {}
+        self._local = threading.local()
+
+    @contextmanager
+    def stage(self, name: str):
+        """Замер этапа: в активный collect() или сразу в гистограмму"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            collected = getattr(self._local, "collected", None)
+            if collected is not None:
+                collected.append((name, elapsed))
+            else:
+                self.stages.observe(name, elapsed)
+
+    @contextmanager
+    def collect(self):
+        """Копит замеры этапов этого потока в список вместо гистограммы"""
+        previous = getattr(self._local, "collected", None)
+        self._local.collected = collected = []
+        try:
+            yield collected
+        finally:
+            self._local.collected = previous
+
+    def record(self, timings: List[Tuple[str, float]]):
+        """Записывает замеры, собранные в другом процессе"""
+        for name, elapsed in timings:
+            self.stages.observe(name, elapsed)
+
+    def gauge(self, name: str, help_text: str, fn: Callable[[], Optional[float]], kind: str = "gauge"):
+        """
+        Регистрирует значение, снимаемое в момент запроса метрик
+        (kind="counter" — для монотонно растущих счётчиков)
+        """
+        self._gauges[name] = (help_text, fn, kind)
+
+    def render(self) -> str:
+        lines = self.stages.render() + self.requests.render()
+        for name, (help_text, fn, kind) in sorted(self._gauges.items()):
+            try:
+                value = fn()
+            except Exception:
+                value = None
+            if value is None:
+                continue
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+# Глобальный экземпляр
+metrics = Metrics()
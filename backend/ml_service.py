@@ -1,118 +1,126 @@
 import numpy as np
-import librosa
-import joblib
-import tensorflow as tf
 from pathlib import Path
-from typing import Tuple, Dict
+from typing import Tuple, Dict, List, Optional
+import os
 import time
 from config import settings
+from model_store import ModelBundle, publish_version
+from online_model import OnlineModel, latest_version
+from metrics import metrics
+from cascade import MODEL_WEIGHTS, cascade_vote
+
+MODEL_NAMES = {"rf": "RF", "svm": "SVM", "lr": "LR", "online": "Online"}
+
+def memory_usage() -> str:
+    """
+    Память процесса: RSS и его анонимная часть. Всё, что сверх неё, —
+    страницы файлов (в том числе отображённых моделей), общие для воркеров.
+    Пустая строка, если узнать нельзя.
+    """
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            stats = {line.split(":")[0]: int(line.split()[1]) for line in f if line.rstrip().endswith("kB")}
+        return f"RSS {stats['Rss'] / 1024:.0f} МБ, из них собственных {stats['Anonymous'] / 1024:.0f} МБ"
+    except (OSError, KeyError, ValueError):
+        pass
+    try:
+        import psutil
+        return f"RSS {psutil.Process(os.getpid()).memory_info().rss / 2**20:.0f} МБ"
+    except ImportError:
+        return ""
 
 class MLService:
     """Сервис для работы с ML моделями с улучшенной обработкой акцентов"""
     
     def __init__(self):
         self.models_path = Path(settings.MODELS_PATH)
+        self.bundle = None
+        
+        self.cascade_stages = [name.strip() for name in settings.CASCADE_STAGES.split(",") if name.strip()]
+        unknown = set(self.cascade_stages) - set(MODEL_WEIGHTS)
+        if unknown or not self.cascade_stages:
+            raise ValueError(f"Неверный CASCADE_STAGES: {settings.CASCADE_STAGES}")
+        
+        self.online_model = None
+        self._online_version = None
+        
         self._load_models()
+        self.refresh_online_model()
+    
+    @property
+    def model_version(self) -> str:
+        return self.bundle.version
     
-    def reload_models(self):
+    def reload_models(self, version: Optional[str] = None):
         """Перезагрузка моделей (после переобучения)"""
         print("Перезагрузка моделей...")
-        self._load_models()
+        self._load_models(version)
         print("Модели успешно перезагружены!")
     
-    def _load_models(self):
-        """Загружает все ML модели"""
+    def activate_version(self, version: str):
+        """
+        Загружает новую версию, проверяет её и только потом публикует
+        (models/CURRENT) и подменяет обслуживаемый набор моделей.
+        """
+        bundle = ModelBundle(self.models_path, version)
+        publish_version(self.models_path, version)
+        self.bundle = bundle
+        print(f"Активна версия моделей {version}: {len(bundle.speakers)} говорящих")
+    
+    def _load_models(self, version: Optional[str] = None):
+        """
+        Загружает полный набор моделей версии (по умолчанию — опубликованной)
+        и подменяет текущий одной операцией присваивания: запросы, которые
+        уже взяли self.bundle, дорабатывают на старой версии.
+        """
         print("Загрузка моделей...")
         
         try:
-            # Random Forest
-            self.rf_model = joblib.load(self.models_path / "model_randomforest.pkl")
-            self.scaler = joblib.load(self.models_path / "scaler.pkl")
-            self.label_encoder = joblib.load(self.models_path / "label_encoder.pkl")
-            
-            # SVM
-            self.svm_model = joblib.load(self.models_path / "model_svm.pkl")
-
-            # Logistic Regression
-            self.lr_model = joblib.load(self.models_path / "model_logisreg.pkl")
+            start_time = time.time()
+            bundle = ModelBundle(self.models_path, version)
+            self.bundle = bundle
             
-            print(f"Модели загружены. Доступно {len(self.label_encoder.classes_)} говорящих")
-            print(f"Говорящие: {', '.join(map(str, self.label_encoder.classes_))}")
+            print(f"Модели версии {bundle.version} загружены за {time.time() - start_time:.2f} сек "
+                  f"({memory_usage()}). Доступно {len(bundle.speakers)} говорящих")
+            print(f"Говорящие: {', '.join(map(str, bundle.speakers))}")
             
         except Exception as e:
             print(f"Ошибка при загрузке моделей: {e}")
             raise
     
+    def refresh_online_model(self):
+        """
+        Подхватывает последний снимок онлайн-модели, если он сменился.
+        Проверка — чтение одного маленького файла, поэтому вызывается
+        перед каждой классификацией.
+        """
+        if not settings.ONLINE_MODEL_ENABLED:
+            return
+        version = latest_version(settings.ONLINE_MODEL_PATH)
+        if version == self._online_version:
+            return
+        try:
+            self.online_model = OnlineModel.load(settings.ONLINE_MODEL_PATH, version)
+            self._online_version = version
+            print(f"Онлайн-модель {version}: {len(self.online_model.speakers)} говорящих")
+        except Exception as e:
+            print(f"Ошибка при загрузке онлайн-модели {version}: {e}")
+    
     def preprocess_audio(self, audio_data: np.ndarray, sr: int = 16000) -> np.ndarray:
         """
         Улучшенная предобработка для работы с акцентами
+        (нормализация, удаление тишины, предусиление, спектральное вычитание)
         """
-        # 1. Нормализация громкости
-        audio_data = librosa.util.normalize(audio_data)
-        
-        # 2. Удаление тишины (более агрессивное для шумных записей)
-        audio_data, _ = librosa.effects.trim(audio_data, top_db=20, frame_length=512, hop_length=128)
-        
-        # 3. Предусиление высоких частот (компенсация акцента)
-        audio_data = librosa.effects.preemphasis(audio_data, coef=0.97)
-        
-        # 4. Шумоподавление через спектральное вычитание
-        if len(audio_data) > sr:  # Если запись длиннее 1 секунды
-            # Берем первые 0.5 сек как шум
-            noise_sample = audio_data[:int(sr * 0.5)]
-            noise_profile = np.abs(librosa.stft(noise_sample))
-            noise_mean = np.mean(noise_profile, axis=1, keepdims=True)
-            
-            # Вычитаем шум из полного сигнала
-            audio_stft = librosa.stft(audio_data)
-            audio_magnitude = np.abs(audio_stft)
-            audio_phase = np.angle(audio_stft)
-            
-            # Спектральное вычитание
-            cleaned_magnitude = np.maximum(audio_magnitude - 1.5 * noise_mean, 0)
-            audio_data = librosa.istft(cleaned_magnitude * np.exp(1j * audio_phase))
-        
-        return audio_data
+        import feature_engine  # librosa грузится только там, где считаются признаки
+        return feature_engine.preprocess_audio(audio_data, sr)
     
     def extract_features(self, audio_data: np.ndarray, sr: int = 16000) -> np.ndarray:
         """
-        Извлекает 54 признака из аудио с улучшенной обработкой
-        """
-        # Предобработка
-        audio_data = self.preprocess_audio(audio_data, sr)
-        
-        # MFCC с дельтами (лучше для акцентов)
-        mfcc = librosa.feature.mfcc(y=audio_data, sr=sr, n_mfcc=13, 
-                                     n_fft=512, hop_length=256)
-        mfcc_delta = librosa.feature.delta(mfcc)
-        mfcc_mean = np.mean(mfcc, axis=1)
-        mfcc_std = np.std(mfcc, axis=1)
-        
-        # Chroma
-        chroma = librosa.feature.chroma_stft(y=audio_data, sr=sr, n_fft=512, hop_length=256)
-        chroma_mean = np.mean(chroma, axis=1)
-        chroma_std = np.std(chroma, axis=1)
-        
-        # ZCR
-        zcr = librosa.feature.zero_crossing_rate(audio_data, frame_length=512, hop_length=256)
-        zcr_mean = np.mean(zcr)
-        zcr_std = np.std(zcr)
-        
-        # Spectral Centroid (с нормализацией)
-        spectral_centroid = librosa.feature.spectral_centroid(y=audio_data, sr=sr, 
-                                                               n_fft=512, hop_length=256)
-        sc_mean = np.mean(spectral_centroid) / sr  # Нормализуем к частоте дискретизации
-        sc_std = np.std(spectral_centroid) / sr
-        
-        # Объединяем
-        features = np.concatenate([
-            mfcc_mean, mfcc_std,
-            chroma_mean, chroma_std,
-            [zcr_mean, zcr_std],
-            [sc_mean, sc_std]
-        ])
-        
-        return features
+        Извлекает 54 признака из аудио с улучшенной обработкой.
+        Все спектральные признаки считаются по одной общей спектрограмме.
+        """
+        import feature_engine
+        return feature_engine.extract_features(audio_data, sr)
     
     def identify(self, audio_data: np.ndarray, sr: int = 16000, 
                 use_ensemble: bool = True) -> Dict:
@@ -126,69 +134,134 @@ class MLService:
         
         # Извлекаем признаки
         features = self.extract_features(audio_data, sr)
-        features_scaled = self.scaler.transform(features.reshape(1, -1))
+        result = self.score_batch(features.reshape(1, -1), use_ensemble)[0]
         
-        # Random Forest предсказание
-        rf_proba = self.rf_model.predict_proba(features_scaled)[0]
-        rf_pred = np.argmax(rf_proba)
-        rf_confidence = rf_proba[rf_pred]
+        result['processing_time'] = time.time() - start_time
+        return result
+    
+    def score_batch(self, features: np.ndarray, use_ensemble: bool = True) -> List[Dict]:
+        """
+        Классифицирует сразу все строки матрицы признаков (n_clips, 54):
+        scaler и каждая модель вызываются один раз на весь пакет.
         
-        # Если уверенность высокая и не нужен ансамбль
-        if rf_confidence > 0.9 and not use_ensemble:
-            speaker_id = self.label_encoder.inverse_transform([rf_pred])[0]
-            processing_time = time.time() - start_time
-            
-            # Top-5 вероятности
-            top_5_idx = np.argsort(rf_proba)[-5:][::-1]
-            probabilities = {
-                self.label_encoder.inverse_transform([idx])[0]: float(rf_proba[idx])
-                for idx in top_5_idx
-            }
-            
-            return {
-                'identified_speaker': speaker_id,
-                'confidence': float(rf_confidence),
-                'model_used': 'RandomForest',
-                'probabilities': probabilities,
-                'processing_time': processing_time
+        Returns:
+            Список Dict с результатами (processing_time — доля времени пакета)
+        """
+        start_time = time.time()
+        bundle = self.bundle  # одна версия моделей на весь пакет
+        with metrics.stage("scaler"):
+            features_scaled = bundle.scaler.transform(features)
+        
+        if not use_ensemble:
+            # Без ансамбля ответ всегда даёт Random Forest
+            with metrics.stage("rf"):
+                ensemble_proba = bundle.rf_model.predict_proba(features_scaled)
+            stages = [["rf"]] * len(features)
+        elif settings.CASCADE_ENABLED:
+            ensemble_proba, stages = self._cascade(bundle, features_scaled)
+        else:
+            # Ансамбль: RF + SVM + Logistic Regression
+            # Взвешенное голосование (больше веса SVM для акцентов)
+            ensemble_proba = sum(
+                weight * self._predict_proba(bundle, name, features_scaled)
+                for name, weight in MODEL_WEIGHTS.items()
+            )
+            stages = [list(MODEL_WEIGHTS)] * len(features)
+        
+        classes = bundle.label_encoder.classes_
+        
+        self.refresh_online_model()
+        online_model = self.online_model
+        if use_ensemble and online_model is not None and len(online_model.speakers) >= 2:
+            with metrics.stage("online"):
+                ensemble_proba, classes = self._blend_online(online_model, features, ensemble_proba, classes)
+            stages = [row_stages + ["online"] for row_stages in stages]
+        
+        predictions = np.argmax(ensemble_proba, axis=1)
+        
+        # Top-5 для каждой записи
+        top_5 = np.argsort(ensemble_proba, axis=1)[:, -5:][:, ::-1]
+        processing_time = (time.time() - start_time) / len(features)
+        
+        return [
+            {
+                'identified_speaker': classes[pred],
+                'confidence': float(proba[pred]),
+                'model_used': self._model_used(row_stages),
+                'probabilities': {classes[idx]: float(proba[idx]) for idx in top_idx},
+                'processing_time': processing_time,
+                'stages': row_stages
             }
+            for proba, pred, top_idx, row_stages in zip(ensemble_proba, predictions, top_5, stages)
+        ]
+    
+    @staticmethod
+    def _predict_proba(bundle: ModelBundle, name: str, features_scaled: np.ndarray) -> np.ndarray:
+        with metrics.stage(name):
+            return getattr(bundle, f"{name}_model").predict_proba(features_scaled)
+    
+    def _cascade(self, bundle: ModelBundle, features_scaled: np.ndarray):
+        """
+        Каскад ансамбля: модели из CASCADE_STAGES запускаются по очереди,
+        и каждая следующая получает только записи, где разрыв между двумя
+        лучшими классами текущего голосования меньше CASCADE_MARGIN.
+        Если дошло до всех трёх моделей, результат совпадает с полным ансамблем.
         
-        # Ансамбль: RF + SVM + Logistic Regression
-        svm_proba = self.svm_model.predict_proba(features_scaled)[0]
-        lr_proba = self.lr_model.predict_proba(features_scaled)[0]
+        Returns:
+            (вероятности формы (n, n_classes), список запущенных моделей для каждой записи)
+        """
+        return cascade_vote(
+            lambda name, rows: self._predict_proba(bundle, name, features_scaled[rows]),
+            len(features_scaled), self.cascade_stages, settings.CASCADE_MARGIN
+        )
+    
+    @staticmethod
+    def _blend_online(online_model: OnlineModel, features: np.ndarray,
+                      ensemble_proba: np.ndarray, classes: np.ndarray):
+        """
+        Добавляет онлайн-модель в голосование с весом ONLINE_MODEL_WEIGHT.
+        Говорящих, зарегистрированных после последнего переобучения, знает
+        только она. Если её лучший кандидат — такой говорящий, основные
+        модели не уверены (максимум ниже ONLINE_OVERRIDE_CONFIDENCE), а сама
+        онлайн-модель уверена (разрыв двух лучших не меньше
+        ONLINE_OVERRIDE_MARGIN), её вес поднимается до ONLINE_OVERRIDE_WEIGHT.
         
-        # Взвешенное голосование (больше веса SVM для акцентов)
-        if use_ensemble:
-            ensemble_proba = 0.5 * rf_proba + 0.3 * svm_proba + 0.2 * lr_proba
-        else:
-            ensemble_proba = rf_proba
-        
-        ensemble_pred = np.argmax(ensemble_proba)
-        ensemble_confidence = ensemble_proba[ensemble_pred]
-        
-        speaker_id = self.label_encoder.inverse_transform([ensemble_pred])[0]
-        processing_time = time.time() - start_time
-        
-        # Top-5
-        top_5_idx = np.argsort(ensemble_proba)[-5:][::-1]
-        probabilities = {
-            self.label_encoder.inverse_transform([idx])[0]: float(ensemble_proba[idx])
-            for idx in top_5_idx
-        }
-        
-        model_used = "Ensemble (RF+SVM+LR)" if use_ensemble else "RandomForest"
-        
-        return {
-            'identified_speaker': speaker_id,
-            'confidence': float(ensemble_confidence),
-            'model_used': model_used,
-            'probabilities': probabilities,
-            'processing_time': processing_time
-        }
+        Returns:
+            (вероятности по объединённому списку говорящих, этот список)
+        """
+        known = set(classes.tolist())
+        new_speakers = [name for name in online_model.speakers if name not in known]
+        names = np.array(classes.tolist() + new_speakers, dtype=object)
+        position = {name: i for i, name in enumerate(names)}
+        
+        n = len(features)
+        batch_proba = np.zeros((n, len(names)))
+        batch_proba[:, :len(classes)] = ensemble_proba
+        online_proba = np.zeros((n, len(names)))
+        online_proba[:, [position[name] for name in online_model.speakers]] = online_model.predict_proba(features)
+        
+        weight = np.full(n, settings.ONLINE_MODEL_WEIGHT)
+        top_online = names[np.argmax(online_proba, axis=1)]
+        top_2 = np.sort(online_proba, axis=1)[:, -2:]
+        online_sure = top_2[:, 1] - top_2[:, 0] >= settings.ONLINE_OVERRIDE_MARGIN
+        unsure = ensemble_proba.max(axis=1) < settings.ONLINE_OVERRIDE_CONFIDENCE
+        override = np.array([name not in known for name in top_online]) & unsure & online_sure
+        weight[override] = max(settings.ONLINE_OVERRIDE_WEIGHT, settings.ONLINE_MODEL_WEIGHT)
+        
+        return (1 - weight)[:, None] * batch_proba + weight[:, None] * online_proba, names
+    
+    @staticmethod
+    def _model_used(stages: List[str]) -> str:
+        if stages == ["rf"]:
+            return "RandomForest"
+        if set(MODEL_WEIGHTS) <= set(stages):
+            extra = [MODEL_NAMES[name] for name in stages if name not in MODEL_WEIGHTS]
+            return f"Ensemble ({'+'.join(['RF', 'SVM', 'LR'] + extra)})"
+        return f"Cascade ({'+'.join(MODEL_NAMES[name] for name in stages)})"
     
     def get_speakers(self) -> list:
         """Возвращает список всех зарегистрированных говорящих"""
-        return self.label_encoder.classes_.tolist()
+        return self.bundle.speakers
 
 # Глобальный экземпляр
 ml_service = MLService()
\ No newline at end of file
@@ -0,0 +1,169 @@
+"""
+Версионированное хранилище моделей.
+
+Каждое переобучение пишет полный набор моделей в models/versions/<версия>/,
+а файл models/CURRENT указывает на опубликованную версию. Публикация —
+атомарная замена этого файла, поэтому читатель всегда видит либо старый,
+либо новый набор целиком.
+
+Набор хранится одним несжатым файлом bundle.joblib и загружается через
+отображение в память: массивы деревьев RF и опорных векторов SVM не
+копируются в память процесса, а читаются из общего страничного кэша,
+так что несколько воркеров uvicorn делят одни и те же страницы.
+Каталоги со старыми отдельными .pkl файлами по-прежнему читаются;
+`python model_store.py` собирает их в bundle.joblib.
+
+Каждое переобучение добавляет версию, поэтому после публикации старые
+удаляются (prune_versions): остаются несколько последних и опубликованная.
+"""
+
+import argparse
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+import joblib
+
+CURRENT_FILE = "CURRENT"
+VERSIONS_DIR = "versions"
+BUNDLE_FILE = "bundle.joblib"
+
+# Версия для моделей, лежащих прямо в MODELS_PATH (до появления версий)
+LEGACY_VERSION = "base"
+
+# Отдельные файлы моделей (формат до появления bundle.joblib)
+MODEL_FILES = {
+    "rf_model": "model_randomforest.pkl",
+    "svm_model": "model_svm.pkl",
+    "lr_model": "model_logisreg.pkl",
+    "scaler": "scaler.pkl",
+    "label_encoder": "label_encoder.pkl",
+}
+
+
+def new_version_name() -> str:
+    """Имя новой версии: время создания, сортируется лексикографически"""
+    return datetime.now().strftime("v%Y%m%d-%H%M%S")
+
+
+def version_path(models_path: Path, version: str) -> Path:
+    if version == LEGACY_VERSION:
+        return Path(models_path)
+    return Path(models_path) / VERSIONS_DIR / version
+
+
+def current_version(models_path: Path) -> str:
+    """Опубликованная версия (или LEGACY_VERSION, если версий ещё нет)"""
+    current_file = Path(models_path) / CURRENT_FILE
+    if current_file.exists():
+        version = current_file.read_text(encoding="utf-8").strip()
+        if version:
+            return version
+    return LEGACY_VERSION
+
+
+def publish_version(models_path: Path, version: str):
+    """Атомарно переключает CURRENT на новую версию"""
+    if not version_path(models_path, version).is_dir():
+        raise FileNotFoundError(f"Версия моделей {version} не найдена")
+
+    current_file = Path(models_path) / CURRENT_FILE
+    tmp_file = current_file.with_suffix(".tmp")
+    tmp_file.write_text(version, encoding="utf-8")
+    os.replace(tmp_file, current_file)
+
+
+def save_models(models_path: Path, version: str, **models) -> Path:
+    """Сохраняет полный набор моделей в каталог версии одним файлом"""
+    missing = set(MODEL_FILES) - set(models)
+    if missing:
+        raise ValueError(f"Неполный набор моделей, нет: {', '.join(sorted(missing))}")
+
+    target = version_path(models_path, version)
+    target.mkdir(parents=True, exist_ok=True)
+
+    # Без сжатия: иначе joblib не сможет отобразить массивы в память
+    tmp_file = target / (BUNDLE_FILE + ".tmp")
+    joblib.dump({name: models[name] for name in MODEL_FILES}, tmp_file)
+    os.replace(tmp_file, target / BUNDLE_FILE)
+    return target
+
+
+def load_models(path: Path) -> dict:
+    """Набор моделей из каталога версии: bundle.joblib или отдельные .pkl"""
+    bundle_file = Path(path) / BUNDLE_FILE
+    if bundle_file.exists():
+        # "c" (копирование при записи), а не "r": libsvm требует записываемые
+        # буферы, хотя и не пишет в них, так что страницы остаются общими
+        return joblib.load(bundle_file, mmap_mode="c")
+    return {name: joblib.load(Path(path) / filename) for name, filename in MODEL_FILES.items()}
+
+
+def list_versions(models_path: Path) -> list:
+    """Версии из models/versions/, от старых к новым (по времени сохранения)"""
+    versions_dir = Path(models_path) / VERSIONS_DIR
+    if not versions_dir.is_dir():
+        return []
+    paths = [path for path in versions_dir.iterdir() if path.is_dir()]
+    return [path.name for path in sorted(paths, key=lambda path: (path.stat().st_mtime, path.name))]
+
+
+def prune_versions(models_path: Path, keep: int) -> list:
+    """
+    Удаляет старые версии, оставляя keep последних; опубликованная версия
+    не удаляется никогда. keep=0 — ничего не удалять.
+
+    Returns: удалённые версии. Версию, файлы которой ещё заняты (в Windows —
+    отображение в память у дорабатывающих воркеров), удалит следующий вызов.
+    """
+    if keep <= 0:
+        return []
+    current = current_version(models_path)
+    removed = []
+    for version in list_versions(models_path)[:-keep]:
+        if version == current:
+            continue
+        try:
+            shutil.rmtree(version_path(models_path, version))
+            removed.append(version)
+        except OSError as e:
+            print(f"Версия моделей {version} не удалена: {e}")
+    return removed
+
+
+def consolidate(models_path: Path, version: str) -> Path:
+    """Пересохраняет отдельные .pkl файлы версии в bundle.joblib"""
+    path = version_path(models_path, version)
+    models = {name: joblib.load(path / filename) for name, filename in MODEL_FILES.items()}
+    return save_models(models_path, version, **models)
+
+
+class ModelBundle:
+    """Согласованный набор моделей одной версии; после загрузки не изменяется"""
+
+    def __init__(self, models_path: Path, version: Optional[str] = None):
+        self.version = version or current_version(models_path)
+        self.path = version_path(models_path, self.version)
+
+        models = load_models(self.path)
+        self.rf_model = models["rf_model"]
+        self.svm_model = models["svm_model"]
+        self.lr_model = models["lr_model"]
+        self.scaler = models["scaler"]
+        self.label_encoder = models["label_encoder"]
+
+    @property
+    def speakers(self) -> list:
+        return self.label_encoder.classes_.tolist()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сборка моделей версии в один bundle.joblib")
+    parser.add_argument("--models-dir", default="./models", help="Каталог хранилища моделей")
+    parser.add_argument("--version", default=None, help="Версия (по умолчанию — опубликованная)")
+    args = parser.parse_args()
+
+    version = args.version or current_version(args.models_dir)
+    print(f"Модели версии {version} сохранены в {consolidate(args.models_dir, version) / BUNDLE_FILE}")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ForeignKey, Text, Index, LargeBinary
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
@@ -21,9 +21,10 @@ class VoiceProfile(Base):
     __tablename__ = "voice_profiles"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    speaker_name = Column(String, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)  # регистрация образцов идёт без входа
+    speaker_name = Column(String, nullable=False, unique=True)
     num_samples = Column(Integer, default=0)
+    total_duration = Column(Float, default=0.0)  # секунд по всем образцам
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -36,11 +37,16 @@ class AudioSample(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     voice_profile_id = Column(Integer, ForeignKey("voice_profiles.id"), nullable=False)
-    file_path = Column(String, nullable=False)
+    file_path = Column(String, nullable=False, unique=True)
     duration = Column(Float)
     sample_rate = Column(Integer)
     created_at = Column(DateTime, default=datetime.utcnow)
     
+    # Признаки считаются при загрузке: переобучению и индексу не нужно декодировать аудио
+    sha256 = Column(String)            # хэш сохранённого канонического файла
+    features = Column(LargeBinary)     # float64, feature_engine.NUM_FEATURES значений
+    feature_version = Column(String)
+    
     # Relationships
     voice_profile = relationship("VoiceProfile", back_populates="audio_samples")
 
@@ -56,4 +62,18 @@ class IdentificationLog(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
-    user = relationship("User", back_populates="identifications")
\ No newline at end of file
+    user = relationship("User", back_populates="identifications")
+    
+    # История пользователя читается по (user_id, created_at desc, id desc) —
+    # индекс покрывает и фильтр, и сортировку, и курсор постраничной выдачи
+    __table_args__ = (
+        Index("ix_identification_logs_user_created_id", "user_id", "created_at", "id"),
+    )
+
+class ModelSpeaker(Base):
+    """Говорящие, которых знает версия моделей"""
+    __tablename__ = "model_speakers"
+    
+    model_version = Column(String, primary_key=True)
+    speaker_name = Column(String, primary_key=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
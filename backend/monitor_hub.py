@@ -0,0 +1,65 @@
+"""
+Рассылка результатов идентификации на панели операторов.
+
+Путь идентификации публикует каждый результат в хаб, а подписчики (потоки
+Server-Sent Events) получают его сразу, без запросов к базе. Последние
+replay_size событий хранятся в памяти: переподключившийся экран получает
+пропущенное по Last-Event-ID. Медленный подписчик не задерживает остальных —
+при переполнении его очереди отбрасываются самые старые события.
+"""
+
+import asyncio
+from collections import deque
+from typing import Optional
+
+
+class BroadcastHub:
+    """Рассылка событий внутри процесса; вызывается из event loop"""
+
+    def __init__(self, replay_size: int = 50, subscriber_queue: int = 100):
+        self.subscriber_queue = subscriber_queue
+        self._events = deque(maxlen=replay_size)  # (id, событие)
+        self._subscribers = set()
+        self._last_id = 0
+
+    @property
+    def latest(self) -> Optional[dict]:
+        """Последнее событие вместе с его номером (поле id)"""
+        if not self._events:
+            return None
+        event_id, event = self._events[-1]
+        return {**event, "id": event_id}
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, event: dict) -> int:
+        self._last_id += 1
+        self._events.append((self._last_id, event))
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait((self._last_id, event))
+        return self._last_id
+
+    def subscribe(self, last_event_id: Optional[int] = None, replay: Optional[int] = None) -> asyncio.Queue:
+        """
+        Новая очередь подписчика, уже содержащая пропущенные события:
+        после last_event_id, а без него — последние replay событий.
+        """
+        queue = asyncio.Queue(maxsize=self.subscriber_queue)
+        if last_event_id is not None and last_event_id > self._last_id:
+            # Сервер перезапускался — нумерация началась заново
+            last_event_id = 0
+        if last_event_id is not None:
+            missed = [item for item in self._events if item[0] > last_event_id]
+        else:
+            missed = list(self._events)[-replay:] if replay else []
+        for item in missed[-self.subscriber_queue:]:
+            queue.put_nowait(item)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
@@ -0,0 +1,184 @@
+"""
+Онлайн-дообучаемая модель для регистрации говорящих без переобучения.
+
+Линейный классификатор (SGDClassifier, log loss) и StandardScaler обновляются
+через partial_fit сразу после каждой записи образца. Классы заводятся
+слотами с запасом: новый говорящий занимает свободный слот, а при нехватке
+матрица коэффициентов расширяется без потери выученного.
+
+Чтобы один образец не «перетягивал» модель на себя, вместе с ним повторно
+прогоняется небольшая выборка ранее виденных образцов (не более
+replay_per_speaker на говорящего) — стоимость обновления ограничена и не
+зависит от объёма всего набора данных. Образцы в буфере помечены ключом
+("<говорящий>/<файл>"): повторная загрузка того же образца заменяет его
+там, а не добавляет копию.
+
+Снимки пишутся в online-<номер>.joblib, а файл LATEST указывает на последний,
+так же как models/CURRENT в model_store. Процессы-воркеры подхватывают новый
+снимок при следующей идентификации.
+"""
+
+import os
+import random
+from collections import deque
+from pathlib import Path
+from typing import List, Optional
+
+import joblib
+import numpy as np
+from scipy.special import expit
+from sklearn.linear_model import SGDClassifier
+from sklearn.preprocessing import StandardScaler
+
+LATEST_FILE = "LATEST"
+KEEP_SNAPSHOTS = 3
+
+
+def latest_version(path: Path) -> Optional[str]:
+    """Имя последнего снимка или None, если снимков ещё нет"""
+    latest_file = Path(path) / LATEST_FILE
+    if latest_file.exists():
+        return latest_file.read_text(encoding="utf-8").strip() or None
+    return None
+
+
+class OnlineModel:
+    """SGD-классификатор с накопительной нормализацией и буфером повторов"""
+
+    def __init__(self, capacity: int = 64, replay_per_speaker: int = 20,
+                 replay_batch: int = 256, epochs: int = 5, random_state: int = 42):
+        self.capacity = max(capacity, 3)  # не меньше трёх: всегда схема один-против-всех
+        self.replay_per_speaker = replay_per_speaker
+        self.replay_batch = replay_batch
+        self.epochs = epochs
+        self.updates = 0
+
+        self.speakers = []
+        self._speaker_ids = {}
+        self._replay = {}  # номер говорящего -> последние (ключ образца, вектор)
+        self._rng = random.Random(random_state)
+
+        self.scaler = StandardScaler()
+        self.classifier = SGDClassifier(loss="log_loss", alpha=1e-4, random_state=random_state)
+
+    @property
+    def version(self) -> str:
+        return f"online-{self.updates:06d}"
+
+    def _speaker_id(self, name: str) -> int:
+        speaker_id = self._speaker_ids.get(name)
+        if speaker_id is None:
+            speaker_id = len(self.speakers)
+            if speaker_id == self.capacity:
+                self._grow()
+            self._speaker_ids[name] = speaker_id
+            self.speakers.append(name)
+            self._replay[speaker_id] = deque(maxlen=self.replay_per_speaker)
+        return speaker_id
+
+    def _grow(self):
+        """Удваивает число слотов классов, сохраняя выученные коэффициенты"""
+        new_capacity = self.capacity * 2
+        if hasattr(self.classifier, "coef_"):
+            extra = new_capacity - self.capacity
+            self.classifier.coef_ = np.vstack([self.classifier.coef_, np.zeros((extra, self.classifier.coef_.shape[1]))])
+            self.classifier.intercept_ = np.concatenate([self.classifier.intercept_, np.zeros(extra)])
+            self.classifier.classes_ = np.arange(new_capacity)
+        self.capacity = new_capacity
+
+    def learn(self, name: str, vectors: np.ndarray, clip_ids: Optional[List[str]] = None):
+        """
+        Дообучает модель на новых образцах одного говорящего. clip_ids —
+        ключи образцов (по одному на строку vectors); прежние образцы с
+        теми же ключами убираются из буфера повторов.
+        """
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float64))
+        clip_ids = list(clip_ids) if clip_ids is not None else [None] * len(vectors)
+        if len(clip_ids) != len(vectors):
+            raise ValueError("Число ключей не совпадает с числом образцов")
+        speaker_id = self._speaker_id(name)
+
+        replaced = {clip_id for clip_id in clip_ids if clip_id is not None}
+        if replaced:
+            for label, samples in self._replay.items():
+                kept = [sample for sample in samples if sample[0] not in replaced]
+                if len(kept) != len(samples):
+                    self._replay[label] = deque(kept, maxlen=self.replay_per_speaker)
+
+        self.scaler.partial_fit(vectors)
+
+        # Новые образцы + случайная выборка старых из буфера повторов
+        replay = [(vector, label) for label, samples in self._replay.items() for _, vector in samples]
+        replay = self._rng.sample(replay, min(len(replay), self.replay_batch))
+        X = np.vstack([vectors] + [vector for vector, _ in replay])
+        y = np.concatenate([np.full(len(vectors), speaker_id), [label for _, label in replay]]).astype(int)
+        X = self.scaler.transform(X)
+
+        for _ in range(self.epochs):
+            if hasattr(self.classifier, "coef_"):
+                self.classifier.partial_fit(X, y)
+            else:
+                self.classifier.partial_fit(X, y, classes=np.arange(self.capacity))
+
+        self._replay[speaker_id].extend(zip(clip_ids, vectors))
+        self.updates += 1
+
+    def seed(self, samples: dict) -> int:
+        """
+        Обучает модель на образцах говорящих, которых она ещё не знает (имя ->
+        векторы), — прежде всего на базовых говорящих основных моделей, чтобы
+        её вероятности были сопоставимы с ансамблем.
+
+        Returns:
+            Число добавленных говорящих
+        """
+        added = 0
+        for name, vectors in samples.items():
+            if name in self._speaker_ids or len(vectors) == 0:
+                continue
+            self.learn(name, np.asarray(vectors)[-self.replay_per_speaker:])
+            added += 1
+        return added
+
+    def predict_proba(self, features: np.ndarray) -> np.ndarray:
+        """
+        Вероятности по зарегистрированным говорящим (столбцы — self.speakers).
+        Пустые слоты в нормировку не входят.
+        """
+        features = np.atleast_2d(features)
+        if not self.speakers:
+            return np.empty((len(features), 0))
+        if len(self.speakers) == 1:
+            return np.ones((len(features), 1))
+
+        decision = self.classifier.decision_function(self.scaler.transform(features))
+        proba = expit(decision[:, :len(self.speakers)])
+        total = proba.sum(axis=1, keepdims=True)
+        return np.divide(proba, total, out=np.full_like(proba, 1 / len(self.speakers)), where=total > 0)
+
+    def save(self, path: Path) -> str:
+        """Пишет снимок и атомарно делает его последним; старые снимки удаляет"""
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+
+        snapshot = path / f"{self.version}.joblib"
+        tmp_snapshot = snapshot.with_suffix(".tmp")
+        joblib.dump(self, tmp_snapshot)
+        os.replace(tmp_snapshot, snapshot)
+
+        latest_file = path / LATEST_FILE
+        tmp_latest = latest_file.with_suffix(".tmp")
+        tmp_latest.write_text(self.version, encoding="utf-8")
+        os.replace(tmp_latest, latest_file)
+
+        for old in sorted(path.glob("online-*.joblib"))[:-KEEP_SNAPSHOTS]:
+            old.unlink(missing_ok=True)
+        return self.version
+
+    @classmethod
+    def load(cls, path: Path, version: Optional[str] = None) -> Optional["OnlineModel"]:
+        """Снимок версии (по умолчанию — последний) или None, если его нет"""
+        version = version or latest_version(path)
+        if version is None:
+            return None
+        return joblib.load(Path(path) / f"{version}.joblib")
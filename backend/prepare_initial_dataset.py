@@ -1,42 +1,180 @@
 """
 Скрипт для подготовки изначального датасета (50 Speakers Audio Data)
-Копирует файлы из исходного датасета в audio_samples/
+
+Переносит файлы исходного датасета (<источник>/<говорящий>/*.wav) в
+audio_samples/ сразу в каноническом виде — моно, float32, 16 кГц, — тем же
+декодированием, что и при регистрации образцов через API. Файлы, которые
+уже канонические, не копируются, а связываются жёсткой ссылкой (если
+источник на другом диске — копируются). Остальные декодируются один раз,
+параллельно в нескольких процессах.
+
+Рядом пишется manifest.json: для каждого файла длительность, SHA-256 и
+источник. Повторный запуск пропускает файлы, источник которых не менялся.
+После этого переобучению и замерам не нужен ресемплинг.
+
+    python prepare_initial_dataset.py --source /data/50_speakers_audio_data
 """
 
+import argparse
+import hashlib
+import json
+import os
 import shutil
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
-# Путь к вашему исходному датасету Kaggle
-SOURCE_DATASET = Path(r"C:\Users\ancol\.cache\kagglehub\datasets\vjcalling\speaker-recognition-audio-dataset\versions\1\50_speakers_audio_data")  
+from audio_io import TARGET_SR, decode_audio
+
+# Путь к вашему исходному датасету Kaggle (можно задать DATASET_SOURCE или --source)
+SOURCE_DATASET = Path(os.environ.get(
+    "DATASET_SOURCE",
+    r"C:\Users\ancol\.cache\kagglehub\datasets\vjcalling\speaker-recognition-audio-dataset\versions\1\50_speakers_audio_data"
+))
 TARGET_DIR = Path("./audio_samples")
+MANIFEST_FILE = "manifest.json"
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_canonical(info) -> bool:
+    return info.format == "WAV" and info.subtype == "FLOAT" and info.channels == 1 \
+        and info.samplerate == TARGET_SR
+
+
+def ingest_file(task):
+    """
+    Один файл в процессе-воркере: ссылка, если он уже канонический, иначе
+    декодирование и запись канонического WAV.
+
+    Returns:
+        (запись манифеста, текст ошибки или None)
+    """
+    source, target = task
+    try:
+        import soundfile as sf
+
+        info = sf.info(str(source))
+        target.unlink(missing_ok=True)
+        if is_canonical(info):
+            try:
+                os.link(source, target)
+                mode = "link"
+            except OSError:
+                # Другой диск или файловая система без жёстких ссылок
+                shutil.copy2(source, target)
+                mode = "copy"
+            duration, sample_rate = info.duration, info.samplerate
+        else:
+            audio_data, sample_rate = decode_audio(str(source))
+            tmp_target = target.with_suffix(".tmp")
+            sf.write(tmp_target, audio_data, sample_rate, subtype="FLOAT", format="WAV")
+            os.replace(tmp_target, target)
+            duration = len(audio_data) / sample_rate
+            mode = "convert"
+
+        stat = source.stat()
+        return {
+            "source": str(source),
+            "source_size": stat.st_size,
+            "source_mtime_ns": stat.st_mtime_ns,
+            "duration": round(duration, 4),
+            "sample_rate": sample_rate,
+            "sha256": file_sha256(target),
+            "mode": mode,
+        }, None
+    except Exception as e:
+        return None, str(e)
 
-def prepare_dataset():
-    """Копирует исходный датасет в рабочую папку"""
-    
-    if not SOURCE_DATASET.exists():
-        print(f"Ошибка: датасет не найден по пути {SOURCE_DATASET}")
-        return
-    
-    TARGET_DIR.mkdir(exist_ok=True)
-    
-    copied_speakers = 0
-    copied_files = 0
-    
-    for speaker_dir in SOURCE_DATASET.iterdir():
-        if speaker_dir.is_dir():
-            target_speaker_dir = TARGET_DIR / speaker_dir.name
-            target_speaker_dir.mkdir(exist_ok=True)
-            
-            # Копируем только WAV файлы
-            for audio_file in speaker_dir.glob("*.wav"):
-                shutil.copy2(audio_file, target_speaker_dir / audio_file.name)
-                copied_files += 1
-            
-            copied_speakers += 1
-            print(f"Скопирован говорящий: {speaker_dir.name}")
-    
-    print(f"\nГотово! Скопировано {copied_speakers} говорящих, {copied_files} файлов")
+
+def load_manifest(target_dir: Path) -> dict:
+    manifest_file = target_dir / MANIFEST_FILE
+    if manifest_file.exists():
+        return json.loads(manifest_file.read_text(encoding="utf-8"))
+    return {}
+
+
+def save_manifest(target_dir: Path, manifest: dict):
+    manifest_file = target_dir / MANIFEST_FILE
+    tmp_file = manifest_file.with_suffix(".tmp")
+    tmp_file.write_text(json.dumps(manifest, ensure_ascii=False, indent=1, sort_keys=True), encoding="utf-8")
+    os.replace(tmp_file, manifest_file)
+
+
+def prepare_dataset(source_dir: Path = SOURCE_DATASET, target_dir: Path = TARGET_DIR, workers: int = 1):
+    """Переносит исходный датасет в рабочую папку в каноническом виде"""
+    source_dir, target_dir = Path(source_dir), Path(target_dir)
+    if not source_dir.exists():
+        print(f"Ошибка: датасет не найден по пути {source_dir}")
+        return None
+
+    target_dir.mkdir(exist_ok=True)
+    manifest = load_manifest(target_dir)
+
+    tasks = []
+    skipped = 0
+    speakers = sorted(d for d in source_dir.iterdir() if d.is_dir())
+    for speaker_dir in speakers:
+        target_speaker_dir = target_dir / speaker_dir.name
+        target_speaker_dir.mkdir(exist_ok=True)
+        for audio_file in sorted(speaker_dir.glob("*.wav")):
+            target = target_speaker_dir / audio_file.name
+            key = f"{speaker_dir.name}/{audio_file.name}"
+            entry = manifest.get(key)
+            stat = audio_file.stat()
+            if entry and target.exists() and entry["source_size"] == stat.st_size \
+                    and entry["source_mtime_ns"] == stat.st_mtime_ns:
+                skipped += 1
+                continue
+            tasks.append((key, audio_file, target))
+
+    print(f"Говорящих: {len(speakers)}, файлов к обработке: {len(tasks)}, без изменений: {skipped}")
+
+    if workers > 1 and len(tasks) > 1:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        results = executor.map(ingest_file, [(source, target) for _, source, target in tasks],
+                               chunksize=max(1, len(tasks) // (workers * 4)))
+    else:
+        executor = None
+        results = map(ingest_file, [(source, target) for _, source, target in tasks])
+
+    modes = {"link": 0, "copy": 0, "convert": 0}
+    errors = 0
+    try:
+        for done, ((key, source, _), (entry, error)) in enumerate(zip(tasks, results), 1):
+            if error is not None:
+                errors += 1
+                manifest.pop(key, None)
+                print(f"   Ошибка при обработке {key}: {error}")
+                continue
+            manifest[key] = entry
+            modes[entry["mode"]] += 1
+            if done % 100 == 0:
+                print(f"   Обработано {done} из {len(tasks)}")
+                save_manifest(target_dir, manifest)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        save_manifest(target_dir, manifest)
+
+    total_duration = sum(entry["duration"] for entry in manifest.values())
+    print(f"\nГотово! Ссылок: {modes['link']}, скопировано: {modes['copy']}, "
+          f"преобразовано: {modes['convert']}, ошибок: {errors}")
+    print(f"В манифесте {len(manifest)} файлов, {total_duration / 3600:.2f} ч аудио")
     print("Теперь запустите: python retrain_model.py")
+    return manifest
+
 
 if __name__ == "__main__":
-    prepare_dataset()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Подготовка датасета в каноническом виде (16 кГц, моно, float32)")
+    parser.add_argument("--source", default=str(SOURCE_DATASET), help="Каталог исходного датасета")
+    parser.add_argument("--target", default=str(TARGET_DIR), help="Каталог образцов")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Число процессов")
+    args = parser.parse_args()
+
+    prepare_dataset(Path(args.source), Path(args.target), args.workers)
@@ -0,0 +1,152 @@
+"""
+Кэш результатов идентификации по содержимому аудио.
+
+Ключ — SHA-256 файла, версия моделей и параметры запроса, поэтому повторная
+отправка той же записи (например, после сетевого сбоя) отвечает без
+декодирования и классификации, а смена версии моделей делает старые записи
+недостижимыми. Записи ограничены по числу (LRU) и по времени жизни (TTL).
+
+Хранилище — память процесса или, при RESULT_CACHE_BACKEND=redis, Redis
+по REDIS_URL: тогда попадания общие для всех воркеров uvicorn.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+def audio_key(audio_bytes: bytes, *parts) -> str:
+    """Ключ кэша: хэш содержимого плюс всё, от чего зависит результат"""
+    return ":".join([hashlib.sha256(audio_bytes).hexdigest(), *map(str, parts)])
+
+
+class _MemoryBackend:
+    """LRU в памяти процесса"""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # ключ -> (момент истечения, результат)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: dict):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class _RedisBackend:
+    """Общий для воркеров кэш в Redis; вытеснение — по TTL и политике сервера"""
+
+    PREFIX = "identify:"
+
+    def __init__(self, url: str, ttl: float):
+        import redis  # нужен только для этого режима
+
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5)
+        self.ttl = ttl
+
+    def get(self, key: str) -> Optional[dict]:
+        value = self.client.get(self.PREFIX + key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key: str, value: dict):
+        self.client.setex(self.PREFIX + key, int(self.ttl), json.dumps(value))
+
+    def clear(self):
+        # Ключи старой версии моделей и так недостижимы — удаляем их, чтобы не ждать TTL
+        for key in self.client.scan_iter(self.PREFIX + "*"):
+            self.client.delete(key)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self.client.scan_iter(self.PREFIX + "*"))
+
+
+class ResultCache:
+    """Кэш результатов с подсчётом попаданий; ошибки Redis не ломают запрос"""
+
+    def __init__(self, backend: str = "memory", max_entries: int = 1024, ttl: float = 300,
+                 redis_url: Optional[str] = None):
+        self.enabled = max_entries > 0 and ttl > 0
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+        if backend == "redis":
+            self.backend = _RedisBackend(redis_url, ttl)
+        elif backend == "memory":
+            self.backend = _MemoryBackend(max_entries, ttl)
+        else:
+            raise ValueError(f"Неизвестное хранилище кэша: {backend}")
+        self.backend_name = backend
+
+    def get(self, key: str) -> Optional[dict]:
+        if not self.enabled:
+            return None
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            self.errors += 1
+            print(f"Ошибка кэша результатов: {e}")
+            value = None
+
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: dict):
+        if not self.enabled:
+            return
+        try:
+            self.backend.set(key, value)
+        except Exception as e:
+            self.errors += 1
+            print(f"Ошибка кэша результатов: {e}")
+
+    def clear(self):
+        try:
+            self.backend.clear()
+        except Exception as e:
+            self.errors += 1
+            print(f"Ошибка кэша результатов: {e}")
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        try:
+            entries = len(self.backend)
+        except Exception:
+            entries = None
+        return {
+            "backend": self.backend_name,
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
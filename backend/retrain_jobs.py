@@ -0,0 +1,159 @@
+"""
+Фоновые задачи переобучения моделей.
+
+retrain_model.py запускается отдельным процессом из фонового потока, так что
+event loop не блокируется. Прогресс читается из строк "[progress] <доля> <этап>"
+в выводе скрипта. После успешного обучения новая версия публикуется колбэком
+on_success — целиком и одной операцией.
+"""
+
+import os
+import subprocess
+import sys
+import threading
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Callable, Optional
+
+from model_store import new_version_name
+
+PROGRESS_PREFIX = "[progress]"
+
+
+class RetrainInProgress(Exception):
+    """Переобучение уже выполняется"""
+
+    def __init__(self, job):
+        super().__init__(f"Переобучение уже выполняется (задача {job.id})")
+        self.job = job
+
+
+class RetrainJob:
+    """Состояние одной задачи переобучения"""
+
+    def __init__(self, version: str):
+        self.id = uuid.uuid4().hex
+        self.version = version
+        self.status = "queued"  # queued, running, publishing, succeeded, failed
+        self.progress = 0.0
+        self.stage = "В очереди"
+        self.error = None
+        self.created_at = datetime.utcnow()
+        self.started_at = None
+        self.finished_at = None
+        self.log = deque(maxlen=50)
+
+    @property
+    def active(self) -> bool:
+        return self.status in ("queued", "running", "publishing")
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "progress": round(self.progress, 2),
+            "stage": self.stage,
+            "version": self.version,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "log": list(self.log),
+        }
+
+
+class RetrainJobManager:
+    """Запускает не более одного переобучения одновременно и хранит историю задач"""
+
+    def __init__(self, models_path: str, on_success: Callable[[str], None],
+                 timeout: int = 600, history_size: int = 20, corpus_dir: Optional[str] = None):
+        self.models_path = str(models_path)
+        self.corpus_dir = corpus_dir
+        self.on_success = on_success
+        self.timeout = timeout
+        self.history_size = history_size
+
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self) -> RetrainJob:
+        """Создаёт задачу и запускает её в фоне"""
+        with self._lock:
+            for job in self._jobs.values():
+                if job.active:
+                    raise RetrainInProgress(job)
+
+            job = RetrainJob(new_version_name())
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.history_size:
+                self._jobs.popitem(last=False)
+
+        threading.Thread(target=self._run, args=(job,), name=f"retrain-{job.id[:8]}", daemon=True).start()
+        return job
+
+    def get(self, job_id: str) -> Optional[RetrainJob]:
+        return self._jobs.get(job_id)
+
+    def _run(self, job: RetrainJob):
+        job.status = "running"
+        job.started_at = datetime.utcnow()
+        try:
+            self._train(job)
+
+            job.status = "publishing"
+            job.stage = f"Публикация версии {job.version}"
+            self.on_success(job.version)
+
+            job.status = "succeeded"
+            job.progress = 1.0
+            job.stage = f"Версия {job.version} загружена"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = datetime.utcnow()
+
+    def _train(self, job: RetrainJob):
+        """Запускает retrain_model.py и разбирает его вывод"""
+        command = [sys.executable, "retrain_model.py",
+                   "--models-dir", self.models_path,
+                   "--version", job.version,
+                   "--no-publish"]
+        if self.corpus_dir:
+            command += ["--corpus-dir", self.corpus_dir]
+        process = subprocess.Popen(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            encoding="utf-8",
+            errors="replace",
+            env={**os.environ, "PYTHONIOENCODING": "utf-8"}
+        )
+        timed_out = threading.Event()
+
+        def kill():
+            timed_out.set()
+            process.kill()
+
+        timer = threading.Timer(self.timeout, kill)
+        timer.start()
+        try:
+            for line in process.stdout:
+                line = line.rstrip()
+                if line.startswith(PROGRESS_PREFIX):
+                    fraction, _, stage = line[len(PROGRESS_PREFIX):].strip().partition(" ")
+                    job.progress = float(fraction)
+                    job.stage = stage
+                elif line:
+                    job.log.append(line)
+            returncode = process.wait()
+        finally:
+            timer.cancel()
+
+        if returncode != 0:
+            if timed_out.is_set():
+                raise Exception(f"Переобучение прервано по таймауту ({self.timeout} сек)")
+            tail = "\n".join(list(job.log)[-5:])
+            raise Exception(f"Ошибка переобучения (код {returncode}): {tail}")
@@ -1,86 +1,456 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 import librosa
 import numpy as np
+import soundfile as sf
 from pathlib import Path
-import joblib
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.svm import SVC
 from sklearn.linear_model import LogisticRegression
 from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.model_selection import train_test_split
 import warnings
+from model_store import new_version_name, save_models, publish_version, prune_versions
+from feature_cache import FeatureCache
+from cascade import MODEL_WEIGHTS, cascade_vote
+from corpus_store import CorpusStore
+import feature_engine
+from feature_engine import FEATURE_VERSION, FEATURE_DEFINITION
 warnings.filterwarnings('ignore')
 
+def report_progress(fraction, message):
+    """Строка прогресса, которую разбирает фоновая задача переобучения"""
+    print(f"[progress] {fraction:.2f} {message}", flush=True)
+
 def extract_features(audio_path, sr=16000):
-    """Извлечение 54 признаков из аудио"""
-    y, _ = librosa.load(audio_path, sr=sr)
-    
-    # Предобработка
-    y = librosa.util.normalize(y)
-    y, _ = librosa.effects.trim(y, top_db=20)
-    y = librosa.effects.preemphasis(y, coef=0.97)
-    
-    # MFCC
-    mfcc = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13)
-    mfcc_mean = np.mean(mfcc, axis=1)
-    mfcc_std = np.std(mfcc, axis=1)
-    
-    # Chroma
-    chroma = librosa.feature.chroma_stft(y=y, sr=sr)
-    chroma_mean = np.mean(chroma, axis=1)
-    chroma_std = np.std(chroma, axis=1)
-    
-    # ZCR
-    zcr = librosa.feature.zero_crossing_rate(y)
-    zcr_mean = np.mean(zcr)
-    zcr_std = np.std(zcr)
-    
-    # Spectral Centroid
-    sc = librosa.feature.spectral_centroid(y=y, sr=sr)
-    sc_mean = np.mean(sc) / sr
-    sc_std = np.std(sc) / sr
-    
-    features = np.concatenate([
-        mfcc_mean, mfcc_std,
-        chroma_mean, chroma_std,
-        [zcr_mean, zcr_std],
-        [sc_mean, sc_std]
-    ])
-    
-    return features
-
-def retrain_models():
-    """Переобучение всех моделей с новыми данными"""
+    """
+    Извлечение 54 признаков из аудио — тем же feature_engine, что и при
+    идентификации и при приёме образцов. Канонические файлы (моно, sr)
+    читаются как есть; остальные приводятся librosa.
+    """
+    y, file_sr = sf.read(str(audio_path), dtype='float32')
+    if y.ndim != 1 or file_sr != sr:
+        y, _ = librosa.load(audio_path, sr=sr)
+    return feature_engine.extract_features(y, sr)
+
+def load_ingested_features(cache):
+    """
+    Кладёт в кэш признаки, посчитанные при загрузке образцов (таблица
+    audio_samples): такие файлы при переобучении не декодируются.
+    
+    Returns:
+        Число добавленных векторов
+    """
+    try:
+        from database import SessionLocal
+        import models
+        
+        db = SessionLocal()
+        try:
+            rows = db.query(models.AudioSample.sha256, models.AudioSample.features).filter(
+                models.AudioSample.feature_version == FEATURE_VERSION,
+                models.AudioSample.features.isnot(None)
+            ).all()
+        finally:
+            db.close()
+    except Exception as e:
+        print(f"   Признаки из базы недоступны: {e}")
+        return 0
+    
+    for sha256, features in rows:
+        cache.put(sha256, np.frombuffer(features, dtype=np.float64))
+    return len(rows)
+
+_corpus_stores = {}
+
+def _corpus(root):
+    """Хранилище образцов, открытое один раз на процесс (отображения сегментов переиспользуются)"""
+    store = _corpus_stores.get(root)
+    if store is None:
+        store = _corpus_stores[root] = CorpusStore(root)
+    return store
+
+def _extract_file(source):
+    """
+    Признаки одного образца в процессе-воркере: source — путь к файлу или
+    (каталог хранилища, ключ записи). Ошибка возвращается, а не выбрасывается.
+    """
+    try:
+        if isinstance(source, tuple):
+            corpus_dir, clip_id = source
+            return feature_engine.extract_features(_corpus(corpus_dir).get(clip_id), 16000), None
+        return extract_features(source), None
+    except Exception as e:
+        return None, str(e)
+
+def iter_extracted(sources, workers=1, chunk_size=1):
+    """
+    Потоково извлекает признаки в пуле процессов, раздавая образцы пачками
+    по chunk_size. Результаты приходят строго в порядке sources.
+    """
+    if workers <= 1:
+        for source in sources:
+            yield _extract_file(source)
+        return
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(_extract_file, sources, chunksize=chunk_size)
+
+def collect_sources(audio_dir, corpus=None):
+    """
+    Образцы для обучения: (говорящий, имя, источник), упорядоченные по
+    говорящему и имени. Записи упакованного хранилища читаются из него,
+    файлы audio_dir/<говорящий>/*.wav — только если их там нет.
+    """
+    sources = {}
+    if audio_dir.exists():
+        for speaker_dir in sorted(d for d in audio_dir.iterdir() if d.is_dir()):
+            for audio_file in sorted(speaker_dir.glob("*.wav")):
+                sources[f"{speaker_dir.name}/{audio_file.name}"] = (speaker_dir.name, audio_file.name, audio_file)
+    if corpus is not None:
+        for clip_id, entry in corpus.clips():
+            sources[clip_id] = (entry["speaker"], clip_id.rsplit("/", 1)[-1], (str(corpus.root), clip_id))
+    return [sources[key] for key in sorted(sources, key=lambda key: (sources[key][0], sources[key][1]))]
+
+def load_dataset(audio_dir, cache=None, workers=1, chunk_size=None, corpus=None):
+    """
+    Собирает матрицу признаков по audio_dir/<говорящий>/*.wav и упакованному
+    хранилищу corpus.
+    
+    Говорящие и образцы обходятся в отсортированном порядке, поэтому
+    результат не зависит ни от файловой системы, ни от числа воркеров.
+    """
+    workers = max(1, workers)
+    entries = collect_sources(audio_dir, corpus)
+    for speaker_name in sorted({speaker_name for speaker_name, _, _ in entries}):
+        count = sum(1 for entry in entries if entry[0] == speaker_name)
+        print(f"   👤 {speaker_name}: {count} файлов")
+    if corpus is not None:
+        packed = sum(1 for _, _, source in entries if isinstance(source, tuple))
+        print(f"   Из упакованного хранилища: {packed} из {len(entries)}")
+    
+    X = np.zeros((len(entries), feature_engine.NUM_FEATURES))
+    loaded = np.zeros(len(entries), dtype=bool)
+    keys = {}
+    if cache is not None:
+        for i, (speaker_name, name, source) in enumerate(entries):
+            try:
+                # У записей хранилища хэш исходного файла уже в индексе
+                keys[i] = corpus.entry(source[1])["sha256"] if isinstance(source, tuple) \
+                    else cache.file_key(source)
+            except OSError as e:
+                print(f"   Ошибка при чтении {speaker_name}/{name}: {e}")
+        # Все сохранённые векторы — одним чтением матрицы хранилища
+        rows = list(keys)
+        cached, found = cache.get_many([keys[i] for i in rows])
+        if cached is not None:
+            X[np.array(rows)[found]] = cached[found]
+            loaded[np.array(rows)[found]] = True
+        pending = [i for i, hit in zip(rows, found) if not hit]
+    else:
+        pending = list(range(len(entries)))
+    
+    if pending:
+        print(f"\n Извлечение признаков: {len(pending)} файлов, воркеров: {workers}")
+    chunk_size = chunk_size or max(1, len(pending) // (workers * 4))
+    results = iter_extracted([entries[i][2] for i in pending], workers, chunk_size)
+    
+    for done, (i, (vector, error)) in enumerate(zip(pending, results), 1):
+        speaker_name, name, _ = entries[i]
+        if error is not None:
+            print(f"   Ошибка при обработке {speaker_name}/{name}: {error}")
+        else:
+            X[i] = vector
+            loaded[i] = True
+            if cache is not None:
+                cache.put(keys[i], vector)
+        report_progress(0.6 * done / len(pending), f"Признаки: {speaker_name}/{name}")
+    
+    if cache is not None:
+        evicted = cache.prune(
+            (source for _, _, source in entries if not isinstance(source, tuple)),
+            live_keys=keys.values()
+        )
+        cache.save()
+        print(f"\nКэш признаков: {cache.hits} из кэша, {cache.misses} извлечено, {evicted} удалено")
+    
+    y = [speaker_name for (speaker_name, _, _), ok in zip(entries, loaded) if ok]
+    return X[loaded], y
+
+def backfill_features(cache_dir="./feature_cache", workers=1, chunk_size=None, corpus_dir="./corpus"):
+    """
+    Заполняет хранилище признаков текущей версии без обучения (параллельно,
+    в workers процессах) и обновляет признаки образцов в базе, посчитанные
+    предыдущей версией.
+    
+    Returns:
+        Число векторов в хранилище
+    """
+    corpus = CorpusStore(corpus_dir) if corpus_dir and (Path(corpus_dir) / "index.json").exists() else None
+    cache = FeatureCache(cache_dir, FEATURE_VERSION, FEATURE_DEFINITION)
+    print(f"Заполнение признаков версии {FEATURE_VERSION}")
+    print(f"   Признаков из базы образцов: {load_ingested_features(cache)}")
+    load_dataset(Path("./audio_samples"), cache, workers, chunk_size, corpus)
+    
+    from database import SessionLocal
+    import models
+    
+    db = SessionLocal()
+    try:
+        samples = db.query(models.AudioSample).filter(
+            models.AudioSample.sha256.isnot(None),
+            (models.AudioSample.feature_version != FEATURE_VERSION) | models.AudioSample.feature_version.is_(None)
+        ).all()
+        vectors, found = cache.get_many([sample.sha256 for sample in samples])
+        for sample, vector, ok in zip(samples, vectors if vectors is not None else [None] * len(samples), found):
+            if ok:
+                sample.features = np.asarray(vector, dtype=np.float64).tobytes()
+                sample.feature_version = FEATURE_VERSION
+        db.commit()
+        print(f"Образцов в базе обновлено: {int(found.sum())} из {len(samples)}")
+    finally:
+        db.close()
+    return len(cache)
+
+MODEL_TITLES = {"rf": "Random Forest", "svm": "SVM", "lr": "Logistic Regression"}
+
+def default_fit_cores():
+    """Ядро SVM (libsvm однопоточный), одно — LR, остальные — деревьям RF"""
+    return {"rf": max(1, (os.cpu_count() or 1) - 2), "lr": 1}
+
+def positive_int(value):
+    """Число процессов: 0 и отрицательные значения означают один процесс"""
+    return max(1, int(value))
+
+def parse_fit_cores(value):
+    """'rf=6,lr=1' -> {"rf": 6, "lr": 1}; неуказанные — по умолчанию"""
+    cores = default_fit_cores()
+    for item in value.split(","):
+        name, _, count = item.partition("=")
+        if name.strip() not in cores:
+            raise argparse.ArgumentTypeError(f"Неизвестная модель: {name} (доступны rf, lr)")
+        cores[name.strip()] = max(1, int(count))
+    return cores
+
+def fit_random_forest(X_train, y_train, n_jobs):
+    rf_model = RandomForestClassifier(
+        n_estimators=200,
+        max_depth=30,
+        min_samples_split=2,
+        random_state=42,
+        n_jobs=n_jobs
+    )
+    return rf_model.fit(X_train, y_train)
+
+def fit_logistic_regression(X_train, y_train):
+    return LogisticRegression(max_iter=1000, random_state=42).fit(X_train, y_train)
+
+def temperature_calibration_available():
+    """Масштабирование температурой в CalibratedClassifierCV — с sklearn 1.8"""
+    import sklearn
+    return tuple(int(part) for part in sklearn.__version__.split(".")[:2]) >= (1, 8)
+
+def resolve_svm_calibration(calibration):
+    """
+    "auto" — "holdout", только если доступна температура: посигмоидная
+    калибровка по классам на маленькой отложенной выборке меняет argmax
+    и заметно снижает точность SVM
+    """
+    if calibration == "auto":
+        return "holdout" if temperature_calibration_available() else "cv"
+    return calibration
+
+def holdout_split(y, fraction=0.2, random_state=42):
+    """
+    Индексы (обучение, калибровка): от каждого говорящего в калибровку идёт
+    доля fraction его записей, но не меньше одной и не все. stratify в
+    train_test_split этого не гарантирует: говорящий с двумя записями мог
+    целиком остаться в обучающей части, и калибровка падала на нехватке класса.
+    
+    Raises:
+        ValueError: у кого-то из говорящих меньше двух записей
+    """
+    rng = np.random.RandomState(random_state)
+    fit_idx, calibration_idx = [], []
+    for label in np.unique(y):
+        rows = rng.permutation(np.flatnonzero(y == label))
+        if len(rows) < 2:
+            raise ValueError(f"у говорящего {label} меньше двух записей")
+        n_calibration = min(max(1, int(round(fraction * len(rows)))), len(rows) - 1)
+        calibration_idx.extend(rows[:n_calibration])
+        fit_idx.extend(rows[n_calibration:])
+    return np.sort(fit_idx), np.sort(calibration_idx)
+
+def fit_svm(X_train, y_train, calibration="cv"):
+    """
+    SVM с вероятностями. "cv" — SVC(probability=True): внутренняя
+    5-кратная кросс-валидация для Platt scaling, самая долгая часть
+    обучения. "holdout" — одна калибровка (calibrate_prefit) на отложенной
+    части обучающей выборки (holdout_split: 20% записей каждого говорящего,
+    не меньше одной); если у кого-то меньше двух записей, используется "cv".
+    """
+    if calibration == "holdout":
+        try:
+            fit_idx, calibration_idx = holdout_split(y_train)
+        except ValueError as e:
+            print(f"   SVM: калибровка на отложенной выборке невозможна ({e}), кросс-валидация")
+        else:
+            svm_model = SVC(kernel='rbf', C=10, gamma='scale', random_state=42)
+            svm_model.fit(X_train[fit_idx], y_train[fit_idx])
+            return calibrate_prefit(svm_model, X_train[calibration_idx], y_train[calibration_idx])
+    
+    svm_model = SVC(kernel='rbf', C=10, gamma='scale', probability=True, random_state=42)
+    return svm_model.fit(X_train, y_train)
+
+def calibrate_prefit(model, X_calibration, y_calibration):
+    """
+    Калибровка уже обученной модели на отложенной выборке. В sklearn >= 1.8 —
+    масштабирование температурой: одна температура на все классы не меняет
+    argmax, поэтому точность SVM сохраняется. Раньше — сигмоида по каждому
+    классу (FrozenEstimator с 1.6, до него cv="prefit").
+    """
+    from sklearn.calibration import CalibratedClassifierCV
+    try:
+        from sklearn.frozen import FrozenEstimator
+    except ImportError:
+        calibrated = CalibratedClassifierCV(model, method='sigmoid', cv='prefit')
+        return calibrated.fit(X_calibration, y_calibration)
+    
+    method = 'temperature' if temperature_calibration_available() else 'sigmoid'
+    # Одно «разбиение» на всю калибровочную выборку: модель заморожена, а
+    # K-кратная проверка требовала бы не меньше K записей на говорящего
+    indices = np.arange(len(y_calibration))
+    calibrated = CalibratedClassifierCV(FrozenEstimator(model), method=method, cv=[(indices, indices)])
+    return calibrated.fit(X_calibration, y_calibration)
+
+def svm_accuracy(svm_model, X_test, y_test):
+    """
+    Точность SVM по argmax вероятностей (как её использует ансамбль) и
+    исходного SVC без калибровки — расхождение видно в журнале переобучения
+    
+    Returns:
+        (точность по вероятностям, точность SVC)
+    """
+    proba = svm_model.predict_proba(X_test)
+    calibrated = float(np.mean(svm_model.classes_[np.argmax(proba, axis=1)] == y_test))
+    raw_model = getattr(svm_model, "estimator", None) or svm_model
+    raw_model = getattr(raw_model, "estimator", raw_model)  # FrozenEstimator
+    return calibrated, raw_model.score(X_test, y_test)
+
+CASCADE_MARGINS = (0.1, 0.2, 0.3, 0.4, 0.5)
+
+def evaluate_cascade(models, X_test, y_test, stages=("lr", "svm", "rf"), margins=CASCADE_MARGINS):
+    """
+    Каскад ансамбля (CASCADE_ENABLED) на тестовой выборке: для каждого порога
+    CASCADE_MARGIN — доля записей, где ответ совпал с полным ансамблем,
+    точность и среднее число запущенных моделей.
+    
+    Returns:
+        {"ensemble_accuracy": ..., "margins": {порог: {...}}}
+    """
+    # Эталон — полный ансамбль всех обученных моделей, даже если каскад
+    # запускает только часть из них (CASCADE_STAGES=lr,svm)
+    probas = {name: models[name].predict_proba(X_test) for name in MODEL_WEIGHTS}
+    full = sum(MODEL_WEIGHTS[name] * probas[name] for name in MODEL_WEIGHTS)
+    full_prediction = np.argmax(full, axis=1)
+    report = {"ensemble_accuracy": float(np.mean(full_prediction == y_test)), "margins": {}}
+    
+    print(f"\nКаскад {','.join(stages)} на тестовой выборке "
+          f"(полный ансамбль: accuracy {report['ensemble_accuracy']:.4f}):")
+    for margin in margins:
+        proba, ran = cascade_vote(lambda name, rows: probas[name][rows], len(X_test), list(stages), margin)
+        prediction = np.argmax(proba, axis=1)
+        result = {
+            "agreement": float(np.mean(prediction == full_prediction)),
+            "accuracy": float(np.mean(prediction == y_test)),
+            "mean_models": float(np.mean([len(row) for row in ran])),
+        }
+        report["margins"][margin] = result
+        print(f"   порог {margin:.2f}: совпадение с ансамблем {result['agreement']:.4f}, "
+              f"accuracy {result['accuracy']:.4f}, моделей в среднем {result['mean_models']:.2f}")
+    return report
+
+def fit_concurrently(fitters, blas_threads=1, sequential=False):
+    """
+    Обучает модели в отдельных потоках (деревья RF, libsvm и BLAS
+    отпускают GIL). Потоки BLAS ограничиваются blas_threads, чтобы
+    LR не отнимал ядра у RF.
+    
+    Returns:
+        (модели по имени, время обучения каждой в секундах)
+    """
+    from threadpoolctl import threadpool_limits
+    
+    fit_times = {}
+    
+    def timed(name):
+        start = time.perf_counter()
+        model = fitters[name]()
+        fit_times[name] = time.perf_counter() - start
+        return model
+    
+    trained = {}
+    start = time.perf_counter()
+    with threadpool_limits(limits=blas_threads, user_api='blas'):
+        if sequential:
+            for name in fitters:
+                trained[name] = timed(name)
+                report_progress(0.6 + 0.3 * len(trained) / len(fitters), f"Обучена модель {MODEL_TITLES[name]}")
+        else:
+            with ThreadPoolExecutor(max_workers=len(fitters)) as executor:
+                futures = {executor.submit(timed, name): name for name in fitters}
+                for future in as_completed(futures):
+                    name = futures[future]
+                    trained[name] = future.result()
+                    report_progress(0.6 + 0.3 * len(trained) / len(fitters), f"Обучена модель {MODEL_TITLES[name]}")
+    fit_times["total"] = time.perf_counter() - start
+    print(f"   Обучение заняло {fit_times['total']:.1f} сек "
+          f"(сумма по моделям {sum(fit_times[name] for name in fitters):.1f} сек)")
+    return trained, fit_times
+
+def retrain_models(models_dir="./models", version=None, publish=True, cache_dir="./feature_cache",
+                   workers=1, chunk_size=None, corpus_dir="./corpus",
+                   fit_cores=None, svm_calibration="auto", sequential=False,
+                   cascade_stages=("lr", "svm", "rf"), keep_versions=5):
+    """
+    Переобучение всех моделей с новыми данными.
+    
+    Модели сохраняются в models_dir/versions/<version>/; при publish=True
+    версия сразу становится текущей, а из старых остаются keep_versions
+    последних (без публикации чистит сервер при активации). Признаки уже обработанных файлов
+    берутся из кэша в cache_dir (None — без кэша), остальные извлекаются
+    в workers процессах. Образцы, упакованные в corpus_dir, читаются оттуда.
+    RF, SVM и LR обучаются одновременно (fit_cores — ядра RF и LR, см.
+    parse_fit_cores), вероятности SVM калибруются по svm_calibration.
+    
+    Returns:
+        Имя сохранённой версии или None при ошибке
+    """
+    version = version or new_version_name()
     print("="*60)
     print("НАЧАЛО ПЕРЕОБУЧЕНИЯ МОДЕЛЕЙ")
     print("="*60)
     
     # Загрузка данных
     audio_dir = Path("./audio_samples")
-    if not audio_dir.exists():
+    corpus = CorpusStore(corpus_dir) if corpus_dir and (Path(corpus_dir) / "index.json").exists() else None
+    if not audio_dir.exists() and corpus is None:
         print("Папка с аудио не найдена!")
-        return False
+        return None
     
-    X = []
-    y = []
+    cache = FeatureCache(cache_dir, FEATURE_VERSION, FEATURE_DEFINITION) if cache_dir else None
+    if cache is not None:
+        print(f"\n Признаков из базы образцов: {load_ingested_features(cache)}")
     
     print("\n Загрузка аудиофайлов...")
-    for speaker_dir in audio_dir.iterdir():
-        if speaker_dir.is_dir():
-            speaker_name = speaker_dir.name
-            audio_files = list(speaker_dir.glob("*.wav"))
-            print(f"   👤 {speaker_name}: {len(audio_files)} файлов")
-            
-            for audio_file in audio_files:
-                try:
-                    features = extract_features(audio_file)
-                    X.append(features)
-                    y.append(speaker_name)
-                except Exception as e:
-                    print(f"   Ошибка при обработке {audio_file.name}: {e}")
+    report_progress(0.0, "Загрузка аудиофайлов")
+    X, y = load_dataset(audio_dir, cache, workers, chunk_size, corpus)
     
     if len(X) == 0:
         print("\nНет данных для обучения!")
-        return False
+        return None
     
     X = np.array(X)
     y = np.array(y)
@@ -114,43 +484,52 @@ def retrain_models():
     print(f"   Обучающая выборка: {len(X_train)} записей")
     print(f"   Тестовая выборка: {len(X_test)} записей")
     
-    # Обучение Random Forest
-    print("\nОбучение Random Forest...")
-    rf_model = RandomForestClassifier(
-        n_estimators=200,
-        max_depth=30,
-        min_samples_split=2,
-        random_state=42,
-        n_jobs=-1
-    )
-    rf_model.fit(X_train, y_train)
-    rf_score = rf_model.score(X_test, y_test)
-    print(f"   Accuracy: {rf_score:.4f} ({rf_score*100:.2f}%)")
-    
-    # Обучение SVM
-    print("\nОбучение SVM...")
-    svm_model = SVC(kernel='rbf', C=10, gamma='scale', probability=True, random_state=42)
-    svm_model.fit(X_train, y_train)
-    svm_score = svm_model.score(X_test, y_test)
-    print(f"   Accuracy: {svm_score:.4f} ({svm_score*100:.2f}%)")
+    # Три модели обучаются одновременно, ядра делятся по fit_cores
+    fit_cores = fit_cores or default_fit_cores()
+    svm_calibration = resolve_svm_calibration(svm_calibration)
+    print(f"\nОбучение моделей ({'по очереди' if sequential else 'одновременно'}): "
+          f"RF — {fit_cores['rf']} ядер, SVM — 1, LR — {fit_cores['lr']}; "
+          f"калибровка SVM: {svm_calibration}")
+    report_progress(0.6, "Обучение моделей")
+    fitters = {
+        "rf": lambda: fit_random_forest(X_train, y_train, fit_cores["rf"]),
+        "svm": lambda: fit_svm(X_train, y_train, svm_calibration),
+        "lr": lambda: fit_logistic_regression(X_train, y_train),
+    }
+    trained, fit_times = fit_concurrently(fitters, fit_cores["lr"], sequential)
+    rf_model, svm_model, lr_model = trained["rf"], trained["svm"], trained["lr"]
     
-    # Обучение Logistic Regression
-    print("\nОбучение Logistic Regression...")
-    lr_model = LogisticRegression(max_iter=1000, random_state=42)
-    lr_model.fit(X_train, y_train)
-    lr_score = lr_model.score(X_test, y_test)
-    print(f"   Accuracy: {lr_score:.4f} ({lr_score*100:.2f}%)")
+    scores = {name: model.score(X_test, y_test) for name, model in trained.items()}
+    rf_score, svm_score, lr_score = scores["rf"], scores["svm"], scores["lr"]
+    for name, title in MODEL_TITLES.items():
+        print(f"   {title}: accuracy {scores[name]:.4f} ({scores[name]*100:.2f}%), "
+              f"обучение {fit_times[name]:.1f} сек")
+    calibrated_score, raw_score = svm_accuracy(svm_model, X_test, y_test)
+    print(f"   SVM: accuracy по вероятностям {calibrated_score:.4f}, без калибровки {raw_score:.4f}"
+          f"{'  СНИЖЕНИЕ ПОСЛЕ КАЛИБРОВКИ' if calibrated_score < raw_score - 0.01 else ''}")
     
     # Сохранение моделей
-    print("\nСохранение моделей...")
-    models_dir = Path("./models")
-    models_dir.mkdir(exist_ok=True)
+    print(f"\nСохранение моделей (версия {version})...")
+    report_progress(0.95, "Сохранение моделей")
+    save_models(
+        Path(models_dir), version,
+        rf_model=rf_model,
+        svm_model=svm_model,
+        lr_model=lr_model,
+        scaler=scaler,
+        label_encoder=label_encoder
+    )
+    if publish:
+        publish_version(Path(models_dir), version)
+        removed = prune_versions(Path(models_dir), keep_versions)
+        if removed:
+            print(f"Удалены старые версии моделей: {', '.join(removed)}")
     
-    joblib.dump(rf_model, models_dir / "model_randomforest.pkl")
-    joblib.dump(svm_model, models_dir / "model_svm.pkl")
-    joblib.dump(lr_model, models_dir / "model_logisreg.pkl")
-    joblib.dump(scaler, models_dir / "scaler.pkl")
-    joblib.dump(label_encoder, models_dir / "label_encoder.pkl")
+    # Отчёт только для сведения: его ошибка не должна стоить обученных моделей
+    try:
+        evaluate_cascade(trained, X_test, y_test, cascade_stages)
+    except Exception as e:
+        print(f"\nОтчёт каскада не построен: {e}")
     
     print("\n" + "="*60)
     print("ПЕРЕОБУЧЕНИЕ ЗАВЕРШЕНО УСПЕШНО!")
@@ -159,9 +538,52 @@ def retrain_models():
     print(f"   Зарегистрировано говорящих: {len(label_encoder.classes_)}")
     print(f"   Лучшая модель: {'Random Forest' if rf_score >= max(svm_score, lr_score) else 'SVM' if svm_score >= lr_score else 'Logistic Regression'}")
     print(f"   Средняя точность: {np.mean([rf_score, svm_score, lr_score]):.4f}")
+    report_progress(1.0, f"Готово: версия {version}")
     
-    return True
+    return version
 
 if __name__ == "__main__":
-    success = retrain_models()
-    exit(0 if success else 1)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Переобучение моделей идентификации")
+    parser.add_argument("--models-dir", default="./models", help="Каталог хранилища моделей")
+    parser.add_argument("--version", default=None, help="Имя новой версии (по умолчанию — время запуска)")
+    parser.add_argument("--no-publish", action="store_true",
+                        help="Не делать версию текущей (публикует вызывающая сторона)")
+    parser.add_argument("--keep-versions", type=int, default=5,
+                        help="Сколько последних версий моделей хранить после публикации (0 — все)")
+    parser.add_argument("--cache-dir", default="./feature_cache", help="Каталог кэша признаков")
+    parser.add_argument("--no-cache", action="store_true", help="Извлечь признаки заново без кэша")
+    parser.add_argument("--workers", type=positive_int, default=os.cpu_count() or 1,
+                        help="Число процессов для извлечения признаков")
+    parser.add_argument("--chunk-size", type=int, default=None,
+                        help="Файлов на одну отправку воркеру (по умолчанию — автоматически)")
+    parser.add_argument("--corpus-dir", default="./corpus", help="Упакованное хранилище образцов")
+    parser.add_argument("--fit-cores", type=parse_fit_cores, default=None,
+                        help="Ядра для обучения, например rf=6,lr=1 (SVM всегда одно ядро)")
+    parser.add_argument("--svm-calibration", choices=["auto", "holdout", "cv"], default="auto",
+                        help="Вероятности SVM: калибровка на отложенной выборке или кросс-валидация SVC "
+                             "(auto — отложенная выборка, если sklearn поддерживает температуру)")
+    parser.add_argument("--sequential", action="store_true", help="Обучать модели по очереди")
+    parser.add_argument("--cascade-stages", default="lr,svm,rf",
+                        help="Порядок моделей каскада для отчёта (как CASCADE_STAGES)")
+    parser.add_argument("--backfill", action="store_true",
+                        help="Только посчитать признаки текущей версии для всех образцов, без обучения")
+    args = parser.parse_args()
+    
+    if args.backfill:
+        print(f"Векторов в хранилище признаков: {backfill_features(args.cache_dir, args.workers, args.chunk_size, args.corpus_dir)}")
+        exit(0)
+    
+    version = retrain_models(
+        args.models_dir, args.version,
+        publish=not args.no_publish,
+        cache_dir=None if args.no_cache else args.cache_dir,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        corpus_dir=args.corpus_dir,
+        fit_cores=args.fit_cores,
+        svm_calibration=args.svm_calibration,
+        sequential=args.sequential,
+        cascade_stages=tuple(name.strip() for name in args.cascade_stages.split(",") if name.strip()),
+        keep_versions=args.keep_versions
+    )
+    exit(0 if version else 1)
\ No newline at end of file
@@ -40,15 +40,26 @@ class VoiceProfileResponse(BaseModel):
 
 # Identification Schemas
 class IdentificationResponse(BaseModel):
-    identified_speaker: str
+    identified_speaker: Optional[str]  # None — голос не узнан (режим index)
     confidence: float
     model_used: str
     probabilities: Dict[str, float]
     processing_time: float
+    stages: List[str] = []  # модели, которые действительно запускались
+
+class BatchIdentificationItem(BaseModel):
+    filename: Optional[str] = None
+    result: Optional[IdentificationResponse] = None
+    error: Optional[str] = None
+
+class BatchIdentificationResponse(BaseModel):
+    total: int
+    identified: int
+    results: List[BatchIdentificationItem]
 
 class IdentificationLogResponse(BaseModel):
     id: int
-    identified_speaker: str
+    identified_speaker: Optional[str]
     confidence: float
     model_used: str
     created_at: datetime
@@ -0,0 +1,283 @@
+"""
+Индекс ближайших соседей для идентификации 1:N без переобучения.
+
+Хранит векторы признаков (те же 54 признака, что и у MLService) для каждого
+образца каждого говорящего. Регистрация нового образца — дозапись одной
+строки в память и в файлы индекса, без переобучения классификаторов.
+
+Поиск — косинусная близость к стандартизованным векторам одним матричным
+умножением. Средние и дисперсии признаков ведутся накопленными суммами,
+поэтому для стандартизации не нужен ни отдельный scaler, ни проход по данным.
+Для больших индексов поиск двухступенчатый: сначала ближайшие центроиды
+говорящих, затем точное сравнение только с их образцами.
+
+На диске: vectors.f32 (строки float32 подряд), labels.txt (имя на строку) и
+clips.txt (ключ образца "<говорящий>/<файл>" на строку); файлы только
+дописываются. Повторная загрузка образца с тем же ключом заменяет его
+строку в памяти, а на диске дописывается новой строкой — при чтении
+индекса побеждает последняя. Запись образца — три дозаписи подряд; если
+процесс прервался между ними, при загрузке все три файла обрезаются до
+последней записи, попавшей в каждый из них.
+"""
+
+import argparse
+import os
+import threading
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+VECTORS_FILE = "vectors.f32"
+LABELS_FILE = "labels.txt"
+CLIPS_FILE = "clips.txt"
+
+
+class SpeakerIndex:
+    """Векторы образцов говорящих с поиском top-k по косинусной близости"""
+
+    def __init__(self, index_path: Path, dim: int = 54, probe_speakers: int = 50):
+        self.index_path = Path(index_path)
+        self.dim = dim
+        # Сколько ближайших центроидов проверять точно (0 — всегда все образцы)
+        self.probe_speakers = probe_speakers
+
+        self._vectors = np.empty((1024, dim), dtype=np.float32)  # запас под дозапись
+        self._size = 0
+        self._labels = []          # номер говорящего для каждой строки
+        self._clip_rows = {}       # ключ образца -> строка
+        self._speakers = []        # номер -> имя
+        self._speaker_ids = {}     # имя -> номер
+        self._sum = np.zeros(dim)
+        self._sum_sq = np.zeros(dim)
+        self._centroid_sums = np.empty((64, dim))
+        self._counts = np.empty(64, dtype=np.int64)
+
+        self._normalized = None    # кэш стандартизованной матрицы для поиска
+        self._generation = 0       # растёт при каждом изменении (ключ кэша результатов)
+        self._lock = threading.Lock()
+        self._load()
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def speakers(self) -> List[str]:
+        return list(self._speakers)
+
+    @property
+    def generation(self) -> int:
+        """
+        Номер состояния индекса: меняется при каждом добавлении или замене
+        образца (в отличие от len(), который при замене остаётся прежним)
+        """
+        return self._generation
+
+    def _load(self):
+        vectors_file = self.index_path / VECTORS_FILE
+        labels_file = self.index_path / LABELS_FILE
+        clips_file = self.index_path / CLIPS_FILE
+        if not (vectors_file.exists() and labels_file.exists()):
+            return
+
+        row_bytes = self.dim * np.dtype(np.float32).itemsize
+        labels = _complete_lines(labels_file)
+        clips = _complete_lines(clips_file) if clips_file.exists() else []
+        # Записи, целиком попавшие во все три файла
+        n = min(vectors_file.stat().st_size // row_bytes, len(labels))
+        if clips_file.exists():
+            n = min(n, len(clips))
+        else:
+            # Индекс без ключей (старый формат): заводим clips.txt из пустых строк
+            clips = [b"\n"] * n
+            clips_file.write_bytes(b"".join(clips))
+
+        # Прерванная дозапись: отрезаем хвосты, иначе следующие записи
+        # сдвинутся относительно друг друга
+        truncated = _truncate(vectors_file, n * row_bytes)
+        truncated |= _truncate(labels_file, sum(map(len, labels[:n])))
+        truncated |= _truncate(clips_file, sum(map(len, clips[:n])))
+        if truncated:
+            print(f"Индекс говорящих: отброшена незавершённая запись, файлы обрезаны до {n} образцов")
+
+        vectors = np.fromfile(vectors_file, dtype=np.float32, count=n * self.dim).reshape(n, self.dim)
+        for vector, name, clip_id in zip(vectors, labels, clips):
+            self._append(_line_text(name), vector, _line_text(clip_id) or None)
+        print(f"Индекс говорящих: {self._size} образцов, {len(self._speakers)} говорящих")
+
+    def _speaker_id(self, name: str) -> int:
+        speaker_id = self._speaker_ids.get(name)
+        if speaker_id is None:
+            speaker_id = len(self._speakers)
+            if speaker_id == len(self._counts):
+                self._centroid_sums = np.concatenate([self._centroid_sums, np.empty_like(self._centroid_sums)])
+                self._counts = np.concatenate([self._counts, np.empty_like(self._counts)])
+            self._speaker_ids[name] = speaker_id
+            self._speakers.append(name)
+            self._centroid_sums[speaker_id] = 0
+            self._counts[speaker_id] = 0
+        return speaker_id
+
+    def _account(self, speaker_id: int, vector: np.ndarray, sign: int):
+        """Учитывает строку в накопленных суммах (sign=-1 — вычитает)"""
+        self._sum += sign * vector
+        self._sum_sq += sign * vector.astype(np.float64) ** 2
+        self._centroid_sums[speaker_id] += sign * vector
+        self._counts[speaker_id] += sign
+
+    def _append(self, name: str, vector: np.ndarray, clip_id: Optional[str] = None):
+        """
+        Добавляет строку в память за амортизированное O(1); строка с тем же
+        ключом образца заменяется на месте
+        """
+        self._generation += 1
+        row = self._clip_rows.get(clip_id) if clip_id else None
+        if row is not None:
+            self._account(self._labels[row], self._vectors[row], -1)
+            speaker_id = self._speaker_id(name)
+            self._vectors[row] = vector
+            self._labels[row] = speaker_id
+            self._account(speaker_id, vector, 1)
+            self._normalized = None
+            return
+
+        if self._size == len(self._vectors):
+            self._vectors = np.concatenate([self._vectors, np.empty_like(self._vectors)])
+
+        speaker_id = self._speaker_id(name)
+        if clip_id:
+            self._clip_rows[clip_id] = self._size
+        self._vectors[self._size] = vector
+        self._size += 1
+        self._labels.append(speaker_id)
+        self._account(speaker_id, vector, 1)
+        self._normalized = None
+
+    def add(self, name: str, vector: np.ndarray, clip_id: Optional[str] = None):
+        """
+        Регистрирует образец говорящего (в памяти и на диске). clip_id —
+        ключ образца: повторная загрузка с тем же ключом заменяет прежний
+        вектор, а не добавляет ещё один.
+        """
+        vector = np.asarray(vector, dtype=np.float32).reshape(self.dim)
+        if not np.all(np.isfinite(vector)):
+            raise ValueError("Вектор признаков содержит NaN или бесконечность")
+        if "\n" in name or (clip_id and "\n" in clip_id):
+            raise ValueError("Недопустимое имя говорящего")
+
+        with self._lock:
+            self.index_path.mkdir(parents=True, exist_ok=True)
+            with open(self.index_path / VECTORS_FILE, "ab") as f:
+                f.write(vector.tobytes())
+            with open(self.index_path / CLIPS_FILE, "a", encoding="utf-8") as f:
+                f.write((clip_id or "") + "\n")
+            with open(self.index_path / LABELS_FILE, "a", encoding="utf-8") as f:
+                f.write(name + "\n")
+            self._append(name, vector, clip_id)
+
+    def _standardize(self, vectors: np.ndarray) -> np.ndarray:
+        """Стандартизация по накопленной статистике и нормировка строк"""
+        mean = self._sum / self._size
+        std = np.sqrt(np.maximum(self._sum_sq / self._size - mean ** 2, 0))
+        scaled = (vectors - mean) / np.where(std > 1e-12, std, 1.0)
+        norms = np.linalg.norm(scaled, axis=-1, keepdims=True)
+        return scaled / np.maximum(norms, 1e-12)
+
+    def search(self, vector: np.ndarray, k: int = 5) -> List[dict]:
+        """
+        Ближайшие говорящие к вектору признаков.
+
+        Returns:
+            До k словарей {"speaker", "score"} по убыванию score; score —
+            наибольшая косинусная близость к образцам говорящего
+        """
+        with self._lock:
+            if self._size == 0:
+                return []
+            if self._normalized is None:
+                self._normalized = self._standardize(self._vectors[:self._size]).astype(np.float32)
+            normalized = self._normalized
+            labels = np.asarray(self._labels)
+            n_speakers = len(self._speakers)
+            query = self._standardize(np.asarray(vector, dtype=np.float64).reshape(self.dim))
+
+            rows = np.arange(self._size)
+            if self.probe_speakers and n_speakers > self.probe_speakers:
+                # Грубый этап: ближайшие центроиды, затем только их образцы
+                centroids = self._standardize(
+                    self._centroid_sums[:n_speakers] / np.maximum(self._counts[:n_speakers, None], 1)
+                )
+                probe = np.argpartition(-(centroids @ query), self.probe_speakers - 1)[:self.probe_speakers]
+                rows = rows[np.isin(labels, probe)]
+
+        similarity = normalized[rows] @ query.astype(np.float32)
+
+        # Лучший образец каждого говорящего
+        best = np.full(n_speakers, -np.inf)
+        np.maximum.at(best, labels[rows], similarity)
+        candidates = np.flatnonzero(np.isfinite(best))
+        top = candidates[np.argsort(-best[candidates])[:k]]
+        return [{"speaker": self._speakers[i], "score": float(best[i])} for i in top]
+
+    def vectors(self, name: str) -> np.ndarray:
+        """Векторы образцов одного говорящего (пустая матрица, если его нет)"""
+        with self._lock:
+            speaker_id = self._speaker_ids.get(name)
+            if speaker_id is None:
+                return np.empty((0, self.dim), dtype=np.float32)
+            return self._vectors[:self._size][np.asarray(self._labels) == speaker_id].copy()
+
+    def counts(self) -> dict:
+        """Число образцов по говорящим"""
+        with self._lock:
+            return {name: int(self._counts[i]) for i, name in enumerate(self._speakers) if self._counts[i]}
+
+
+def _complete_lines(path: Path) -> List[bytes]:
+    """Строки файла вместе с переводом строки, без оборванного хвоста"""
+    return [line + b"\n" for line in path.read_bytes().split(b"\n")[:-1]]
+
+
+def _line_text(line: bytes) -> str:
+    """Текст строки без перевода строки (в Windows файлы пишутся с \\r\\n)"""
+    return line.decode("utf-8").rstrip("\r\n")
+
+
+def _truncate(path: Path, size: int) -> bool:
+    """Обрезает файл до size байт; True, если было что отрезать"""
+    if path.stat().st_size <= size:
+        return False
+    os.truncate(path, size)
+    return True
+
+
+def build_index(audio_dir: Path, index_path: Path) -> Optional[SpeakerIndex]:
+    """Строит индекс заново по audio_dir/<говорящий>/*.wav"""
+    import librosa
+    import feature_engine
+
+    for filename in (VECTORS_FILE, LABELS_FILE, CLIPS_FILE):
+        (Path(index_path) / filename).unlink(missing_ok=True)
+    index = SpeakerIndex(index_path)
+
+    for speaker_dir in sorted(d for d in Path(audio_dir).iterdir() if d.is_dir()):
+        audio_files = sorted(speaker_dir.glob("*.wav"))
+        print(f"   👤 {speaker_dir.name}: {len(audio_files)} файлов")
+        for audio_file in audio_files:
+            try:
+                audio_data, sr = librosa.load(audio_file, sr=16000)
+                index.add(speaker_dir.name, feature_engine.extract_features(audio_data, sr),
+                          f"{speaker_dir.name}/{audio_file.name}")
+            except Exception as e:
+                print(f"   Ошибка при обработке {speaker_dir.name}/{audio_file.name}: {e}")
+    return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Построение индекса говорящих по аудиофайлам")
+    parser.add_argument("--audio-dir", default="./audio_samples", help="Каталог с образцами")
+    parser.add_argument("--index-dir", default="./speaker_index", help="Каталог индекса")
+    args = parser.parse_args()
+
+    index = build_index(args.audio_dir, args.index_dir)
+    print(f"\nИндекс построен: {len(index)} образцов, {len(index.speakers)} говорящих")
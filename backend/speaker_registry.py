@@ -0,0 +1,181 @@
+"""
+Реестр говорящих в базе: профили (VoiceProfile), их образцы (AudioSample)
+и покрытие версий моделей (ModelSpeaker).
+
+Число образцов и суммарная длительность хранятся в профиле и обновляются
+при каждой регистрации образца (приращением в самом UPDATE, поэтому
+одновременные загрузки не теряют друг друга), поэтому список говорящих —
+один запрос по индексам, без обхода каталогов и без агрегации по образцам. Какие
+говорящие вошли в версию моделей, записывается при её загрузке: видно,
+кто зарегистрирован, но ещё не попал в обслуживаемые модели.
+
+Образцы, лежащие в audio_samples/ с тех времён, когда реестра не было,
+однократно переносятся в базу при запуске (sync_from_disk).
+"""
+
+from datetime import datetime
+from pathlib import Path
+from typing import List
+
+import numpy as np
+from sqlalchemy import and_, func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import models
+
+
+def _profile(db: Session, speaker_name: str) -> models.VoiceProfile:
+    query = db.query(models.VoiceProfile).filter(models.VoiceProfile.speaker_name == speaker_name)
+    profile = query.first()
+    if profile is None:
+        try:
+            # Точка сохранения: при конфликте откатывается только эта вставка
+            with db.begin_nested():
+                profile = models.VoiceProfile(speaker_name=speaker_name, num_samples=0, total_duration=0.0)
+                db.add(profile)
+        except IntegrityError:
+            # Профиль одновременно создал другой запрос
+            profile = query.one()
+    return profile
+
+
+def _add_totals(db: Session, profile_id: int, samples: int, duration: float):
+    """Приращение счётчиков профиля одним UPDATE, без чтения старых значений"""
+    db.query(models.VoiceProfile).filter(models.VoiceProfile.id == profile_id).update({
+        models.VoiceProfile.num_samples: func.coalesce(models.VoiceProfile.num_samples, 0) + samples,
+        models.VoiceProfile.total_duration: func.coalesce(models.VoiceProfile.total_duration, 0.0) + duration,
+        models.VoiceProfile.updated_at: datetime.utcnow(),
+    }, synchronize_session=False)
+
+
+def record_sample(db: Session, speaker_name: str, file_path: Path, ingested: dict):
+    """Профиль говорящего и образец с признаками; повторная загрузка того же номера обновляет запись"""
+    profile = _profile(db, speaker_name)
+
+    sample = db.query(models.AudioSample).filter(models.AudioSample.file_path == str(file_path)).first()
+    added = sample is None
+    if added:
+        sample = models.AudioSample(voice_profile_id=profile.id, file_path=str(file_path), duration=0.0)
+        db.add(sample)
+    _add_totals(db, profile.id, int(added), ingested["duration"] - (sample.duration or 0.0))
+
+    sample.duration = ingested["duration"]
+    sample.sample_rate = ingested["sample_rate"]
+    sample.sha256 = ingested["sha256"]
+    sample.features = np.asarray(ingested["features"], dtype=np.float64).tobytes()
+    sample.feature_version = ingested["feature_version"]
+    db.commit()
+
+
+def record_model_version(db: Session, version: str, speakers: List[str]):
+    """Запоминает, каких говорящих знает версия моделей (повторный вызов ничего не меняет)"""
+    known = {
+        name for (name,) in db.query(models.ModelSpeaker.speaker_name)
+        .filter(models.ModelSpeaker.model_version == version)
+    }
+    missing = [str(name) for name in speakers if str(name) not in known]
+    if not missing:
+        return
+    db.add_all(models.ModelSpeaker(model_version=version, speaker_name=name) for name in missing)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Ту же версию одновременно записал другой процесс
+        db.rollback()
+
+
+def recount_profiles(db: Session):
+    """Пересчитывает num_samples и total_duration всех профилей по их образцам"""
+    Sample = models.AudioSample
+    owned = Sample.voice_profile_id == models.VoiceProfile.id
+    db.query(models.VoiceProfile).update({
+        models.VoiceProfile.num_samples: select(func.count(Sample.id)).where(owned).scalar_subquery(),
+        models.VoiceProfile.total_duration:
+            select(func.coalesce(func.sum(Sample.duration), 0.0)).where(owned).scalar_subquery(),
+    }, synchronize_session=False)
+    db.commit()
+
+
+def list_speakers(db: Session, model_version: str) -> List[dict]:
+    """Все говорящие с числом образцов, длительностью и признаком покрытия версией моделей"""
+    rows = db.query(
+        models.VoiceProfile.speaker_name,
+        models.VoiceProfile.num_samples,
+        models.VoiceProfile.total_duration,
+        models.VoiceProfile.updated_at,
+        models.ModelSpeaker.speaker_name.isnot(None),
+    ).outerjoin(
+        models.ModelSpeaker,
+        and_(
+            models.ModelSpeaker.model_version == model_version,
+            models.ModelSpeaker.speaker_name == models.VoiceProfile.speaker_name,
+        )
+    ).order_by(models.VoiceProfile.speaker_name).all()
+
+    return [
+        {
+            "name": name,
+            "samples": num_samples or 0,
+            "duration": round(total_duration or 0.0, 2),
+            "in_model": bool(in_model),
+            "updated_at": updated_at,
+        }
+        for name, num_samples, total_duration, updated_at, in_model in rows
+    ]
+
+
+def sync_from_disk(db: Session, audio_dir: Path) -> int:
+    """
+    Переносит в реестр образцы из audio_dir/<говорящий>/*.wav, которых в нём нет.
+    Длительность читается из заголовка файла; признаки не считаются.
+    Заодно досчитывает total_duration профилей, где он ещё не заполнен.
+
+    Returns:
+        Число добавленных образцов
+    """
+    import soundfile as sf
+
+    # Профили, созданные до появления столбца total_duration
+    totals = db.query(models.AudioSample.voice_profile_id, func.sum(models.AudioSample.duration)) \
+        .join(models.VoiceProfile).filter(models.VoiceProfile.total_duration.is_(None)) \
+        .group_by(models.AudioSample.voice_profile_id).all()
+    for profile_id, total in totals:
+        db.query(models.VoiceProfile).filter(models.VoiceProfile.id == profile_id) \
+            .update({models.VoiceProfile.total_duration: total or 0.0})
+    db.commit()
+
+    audio_dir = Path(audio_dir)
+    if not audio_dir.exists():
+        return 0
+
+    known = {path for (path,) in db.query(models.AudioSample.file_path)}
+    added = 0
+    for speaker_dir in sorted(d for d in audio_dir.iterdir() if d.is_dir()):
+        for audio_file in sorted(speaker_dir.glob("*.wav")):
+            if str(audio_file) in known:
+                continue
+            try:
+                info = sf.info(str(audio_file))
+            except RuntimeError as e:
+                print(f"   Реестр: пропущен {audio_file}: {e}")
+                continue
+            profile = _profile(db, speaker_dir.name)
+            db.add(models.AudioSample(
+                voice_profile_id=profile.id,
+                file_path=str(audio_file),
+                duration=info.duration,
+                sample_rate=info.samplerate,
+            ))
+            _add_totals(db, profile.id, 1, info.duration)
+            added += 1
+
+    try:
+        db.commit()
+    except IntegrityError:
+        # Тот же перенос одновременно выполнил другой процесс
+        db.rollback()
+        return 0
+    if added:
+        print(f"Реестр говорящих: перенесено {added} образцов из {audio_dir}")
+    return added
@@ -0,0 +1,93 @@
+import importlib
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Модули backend импортируются по имени (import feature_engine), как при запуске из backend/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Настройки сервера для тестов, которым нужна база (config читается при импорте).
+# Все каталоги сервера — во временной папке, а не в рабочей
+_root = Path(tempfile.mkdtemp())
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_root / 'test.sqlite'}")
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("MODELS_PATH", str(_root / "models"))
+os.environ.setdefault("CORPUS_DIR", str(_root / "corpus"))
+os.environ.setdefault("SPEAKER_INDEX_PATH", str(_root / "speaker_index"))
+os.environ.setdefault("ONLINE_MODEL_PATH", str(_root / "online_model"))
+os.environ.setdefault("INFERENCE_EXECUTOR", "thread")
+os.environ.setdefault("INFERENCE_WORKERS", "2")
+
+
+def train_tiny_models(models_path: Path, speakers=("alice", "bob", "carol"), seed: int = 0) -> str:
+    """Публикует набор маленьких моделей, обученных на случайных признаках"""
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.preprocessing import LabelEncoder, StandardScaler
+    from sklearn.svm import SVC
+
+    from feature_engine import NUM_FEATURES
+    from model_store import new_version_name, publish_version, save_models
+
+    rng = np.random.default_rng(seed)
+    X = np.concatenate([rng.normal(3 * i, 1.0, (12, NUM_FEATURES)) for i in range(len(speakers))])
+    labels = np.repeat(speakers, 12)
+    encoder = LabelEncoder().fit(labels)
+    y = encoder.transform(labels)
+    scaler = StandardScaler().fit(X)
+    X = scaler.transform(X)
+
+    version = new_version_name()
+    save_models(
+        models_path, version,
+        rf_model=RandomForestClassifier(n_estimators=5, random_state=seed).fit(X, y),
+        svm_model=SVC(probability=True, random_state=seed).fit(X, y),
+        lr_model=LogisticRegression(max_iter=200).fit(X, y),
+        scaler=scaler, label_encoder=encoder
+    )
+    publish_version(models_path, version)
+    return version
+
+
+@pytest.fixture(scope="session")
+def app_main():
+    """Модуль main, поднятый на маленьких моделях во временных каталогах"""
+    models_path = Path(os.environ["MODELS_PATH"])
+    if not (models_path / "CURRENT").exists():
+        train_tiny_models(models_path)
+
+    cwd = os.getcwd()
+    os.chdir(_root)  # audio_samples и прочие относительные пути сервера
+    try:
+        yield importlib.import_module("main")
+    finally:
+        os.chdir(cwd)
+
+
+@pytest.fixture
+def client(app_main):
+    from fastapi.testclient import TestClient
+
+    with TestClient(app_main.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def token(app_main):
+    """JWT пользователя, заведённого в тестовой базе"""
+    import models
+    from auth import create_access_token
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        if db.query(models.User).filter(models.User.username == "tester").first() is None:
+            db.add(models.User(email="tester@example.com", username="tester", hashed_password="-"))
+            db.commit()
+    finally:
+        db.close()
+    return create_access_token({"sub": "tester"})
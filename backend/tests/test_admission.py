@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected
+
+
+async def hold(controller, started, release):
+    async with controller.slot():
+        started.set()
+        await release.wait()
+
+
+def test_requests_wait_for_a_free_slot():
+    async def scenario():
+        controller = AdmissionController(max_inflight=1, max_queue=1, queue_timeout=1.0)
+        started, release = asyncio.Event(), asyncio.Event()
+        holder = asyncio.create_task(hold(controller, started, release))
+        await started.wait()
+
+        waiter = asyncio.create_task(hold(controller, asyncio.Event(), asyncio.Event()))
+        await asyncio.sleep(0.01)
+        assert (controller.inflight, controller.waiting) == (1, 1)
+
+        release.set()
+        await holder
+        await asyncio.sleep(0.01)
+        assert (controller.inflight, controller.waiting) == (1, 0)
+        waiter.cancel()
+        return controller
+
+    controller = asyncio.run(scenario())
+    assert controller.admitted == 2 and controller.rejected == 0
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    async def scenario():
+        controller = AdmissionController(max_inflight=1, max_queue=0, queue_timeout=1.0)
+        started, release = asyncio.Event(), asyncio.Event()
+        holder = asyncio.create_task(hold(controller, started, release))
+        await started.wait()
+        with pytest.raises(AdmissionRejected) as rejected:
+            async with controller.slot():
+                pass
+        release.set()
+        await holder
+        return controller, rejected.value
+
+    controller, rejected = asyncio.run(scenario())
+    assert rejected.retry_after >= 1
+    assert controller.rejected == 1 and controller.inflight == 0
+
+
+def test_waiting_too_long_is_rejected():
+    async def scenario():
+        controller = AdmissionController(max_inflight=1, max_queue=5, queue_timeout=0.05)
+        started, release = asyncio.Event(), asyncio.Event()
+        holder = asyncio.create_task(hold(controller, started, release))
+        await started.wait()
+        with pytest.raises(AdmissionRejected):
+            async with controller.slot():
+                pass
+        release.set()
+        await holder
+        return controller
+
+    controller = asyncio.run(scenario())
+    assert controller.timed_out == 1 and controller.waiting == 0
+
+    # Место, которого не дождались, не потеряно: следующий запрос проходит сразу
+    async def next_request():
+        async with controller.slot():
+            return controller.inflight
+
+    assert asyncio.run(next_request()) == 1
+
+
+def test_slot_is_released_when_the_request_fails():
+    async def scenario():
+        controller = AdmissionController(max_inflight=1)
+        with pytest.raises(RuntimeError):
+            async with controller.slot():
+                raise RuntimeError("ошибка идентификации")
+        async with controller.slot():
+            pass
+        return controller
+
+    controller = asyncio.run(scenario())
+    assert controller.inflight == 0 and controller.admitted == 2
@@ -0,0 +1,111 @@
+import json
+
+import numpy as np
+
+import corpus_store
+from corpus_store import CorpusStore
+
+
+def tone(n, value):
+    return np.full(n, value, dtype=np.float32)
+
+
+def test_append_get_remove_and_reopen(tmp_path):
+    store = CorpusStore(tmp_path)
+    store.append("a/1.wav", "a", tone(100, 0.1))
+    store.append("b/1.wav", "b", tone(50, 0.2))
+    store.append("a/1.wav", "a", tone(80, 0.3))  # замена
+    assert store.remove("b/1.wav") and not store.remove("b/1.wav")
+
+    reopened = CorpusStore(tmp_path)
+    assert len(reopened) == 1
+    np.testing.assert_array_equal(reopened.get("a/1.wav"), tone(80, 0.3))
+    assert reopened.stats()["dead_bytes"] == (100 + 50) * 4
+
+
+def test_append_writes_journal_not_the_whole_index(tmp_path):
+    store = CorpusStore(tmp_path)
+    store.append("a/1.wav", "a", tone(10, 0.1))
+    snapshot = store.index_file.read_bytes()
+
+    for i in range(2, 20):
+        store.append(f"a/{i}.wav", "a", tone(10, i / 100))
+
+    assert store.index_file.read_bytes() == snapshot
+    assert len(store.journal_file.read_text(encoding="utf-8").splitlines()) == 19
+    assert len(CorpusStore(tmp_path)) == 19
+
+
+def test_journal_is_folded_into_snapshot(tmp_path, monkeypatch):
+    monkeypatch.setattr(corpus_store, "JOURNAL_MIN_RECORDS", 4)
+    store = CorpusStore(tmp_path)
+    for i in range(10):
+        store.append(f"a/{i}.wav", "a", tone(10, i / 10))
+
+    index = json.loads(store.index_file.read_text(encoding="utf-8"))
+    # Снимок после 4 строк журнала; порог дальше растёт с размером индекса
+    assert len(index["clips"]) == 4 and store._journal_records == 6
+    # Журналы прошлых поколений удалены
+    assert [path.name for path in tmp_path.glob("journal-*.jsonl")] == [store.journal_file.name]
+    reopened = CorpusStore(tmp_path)
+    assert len(reopened) == 10
+    np.testing.assert_array_equal(reopened.get("a/9.wav"), tone(10, 0.9))
+
+
+def test_other_process_sees_appends_and_snapshots(tmp_path, monkeypatch):
+    monkeypatch.setattr(corpus_store, "JOURNAL_MIN_RECORDS", 3)
+    writer = CorpusStore(tmp_path)
+    writer.append("a/0.wav", "a", tone(10, 0.0))
+    reader = CorpusStore(tmp_path)
+
+    writer.append("a/1.wav", "a", tone(10, 0.1))
+    assert reader.reload() and "a/1.wav" in reader
+
+    for i in range(2, 6):
+        writer.append(f"a/{i}.wav", "a", tone(10, i / 10))
+    reader.reload()
+    assert len(reader) == 6
+
+
+def test_torn_journal_line_is_dropped(tmp_path):
+    store = CorpusStore(tmp_path)
+    store.append("a/1.wav", "a", tone(10, 0.1))
+    with open(store.journal_file, "ab") as f:
+        f.write(b'{"clip": "a/2.wav", "entry": {"spea')
+
+    recovered = CorpusStore(tmp_path)
+    assert len(recovered) == 1
+    recovered.append("a/3.wav", "a", tone(10, 0.3))
+
+    reopened = CorpusStore(tmp_path)
+    assert sorted(clip_id for clip_id, _ in reopened.clips()) == ["a/1.wav", "a/3.wav"]
+    np.testing.assert_array_equal(reopened.get("a/3.wav"), tone(10, 0.3))
+
+
+def test_index_without_journal_is_still_read(tmp_path):
+    (tmp_path / "segment-00000.f32").write_bytes(tone(10, 0.5).tobytes())
+    (tmp_path / "index.json").write_text(json.dumps({
+        "segments": ["segment-00000.f32"],
+        "clips": {"a/1.wav": {"speaker": "a", "segment": "segment-00000.f32", "offset": 0, "length": 10, "sha256": "x"}}
+    }), encoding="utf-8")
+
+    store = CorpusStore(tmp_path)
+    store.append("a/2.wav", "a", tone(5, 0.2))
+
+    reopened = CorpusStore(tmp_path)
+    np.testing.assert_array_equal(reopened.get("a/1.wav"), tone(10, 0.5))
+    np.testing.assert_array_equal(reopened.get("a/2.wav"), tone(5, 0.2))
+
+
+def test_compact_keeps_live_records(tmp_path):
+    store = CorpusStore(tmp_path)
+    store.append("b/1.wav", "b", tone(30, 0.2))
+    store.append("a/1.wav", "a", tone(20, 0.1))
+    store.append("b/1.wav", "b", tone(40, 0.4))
+
+    store.compact()
+
+    reopened = CorpusStore(tmp_path)
+    assert reopened.stats()["dead_bytes"] == 0
+    np.testing.assert_array_equal(reopened.get("b/1.wav"), tone(40, 0.4))
+    np.testing.assert_array_equal(reopened.get("a/1.wav"), tone(20, 0.1))
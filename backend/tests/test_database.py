@@ -0,0 +1,39 @@
+from sqlalchemy import inspect, text
+
+import models
+import speaker_registry
+from database import SessionLocal, engine, sync_schema
+
+
+def test_sync_schema_merges_duplicates_and_adds_unique_index():
+    models.Base.metadata.drop_all(bind=engine)
+    with engine.begin() as connection:
+        # Таблицы, созданные до unique=True: повторы допускаются
+        connection.execute(text(
+            "CREATE TABLE voice_profiles (id INTEGER PRIMARY KEY, user_id INTEGER, speaker_name VARCHAR NOT NULL, "
+            "num_samples INTEGER, total_duration FLOAT, created_at DATETIME, updated_at DATETIME)"
+        ))
+        connection.execute(text(
+            "CREATE TABLE audio_samples (id INTEGER PRIMARY KEY, voice_profile_id INTEGER NOT NULL, "
+            "file_path VARCHAR NOT NULL, duration FLOAT, sample_rate INTEGER, created_at DATETIME)"
+        ))
+        connection.execute(text("INSERT INTO voice_profiles (id, speaker_name, num_samples) VALUES "
+                                "(1, 'anna', 1), (2, 'anna', 1), (3, 'boris', 1)"))
+        connection.execute(text("INSERT INTO audio_samples (id, voice_profile_id, file_path, duration) VALUES "
+                                "(1, 1, 'anna/1.wav', 1.0), (2, 2, 'anna/2.wav', 2.0), "
+                                "(3, 3, 'boris/1.wav', 3.0), (4, 3, 'boris/1.wav', 4.0)"))
+    models.Base.metadata.create_all(bind=engine)
+
+    merged = sync_schema()
+    assert merged == {"voice_profiles": 1, "audio_samples": 1}
+
+    unique = {tuple(index["column_names"]) for index in inspect(engine).get_indexes("voice_profiles")
+              if index["unique"]}
+    assert ("speaker_name",) in unique
+    assert sync_schema() == {}
+
+    with SessionLocal() as db:
+        speaker_registry.recount_profiles(db)
+        profiles = {p.speaker_name: (p.num_samples, p.total_duration) for p in db.query(models.VoiceProfile)}
+        assert profiles == {"anna": (2, 3.0), "boris": (1, 4.0)}
+    models.Base.metadata.drop_all(bind=engine)
@@ -0,0 +1,67 @@
+import os
+
+import numpy as np
+
+from feature_cache import FeatureCache, file_sha256
+
+DEFINITION = {"n_mfcc": 13}
+
+
+def test_vectors_survive_save_and_reload(tmp_path):
+    cache = FeatureCache(tmp_path, "v1", DEFINITION)
+    cache.put("k1", np.arange(4.0))
+    cache.save()
+    cache.put("k2", np.arange(4.0) + 10)  # вторая запись — дописывается к отображённой матрице
+    cache.save()
+
+    reloaded = FeatureCache(tmp_path, "v1", DEFINITION)
+    matrix, found = reloaded.get_many(["k2", "missing", "k1"])
+
+    assert len(reloaded) == 2
+    assert found.tolist() == [True, False, True]
+    np.testing.assert_array_equal(matrix[[0, 2]], [np.arange(4.0) + 10, np.arange(4.0)])
+    assert (reloaded.hits, reloaded.misses) == (2, 1)
+    assert reloaded.get_many(["missing"])[0] is None
+
+
+def test_changed_definition_or_version_is_not_reused(tmp_path):
+    cache = FeatureCache(tmp_path, "v1", DEFINITION)
+    cache.put("k1", np.ones(4))
+    cache.save()
+
+    assert FeatureCache(tmp_path, "v1", {"n_mfcc": 20}).get("k1") is None
+    assert FeatureCache(tmp_path, "v2", DEFINITION).get("k1") is None
+    assert FeatureCache(tmp_path, "v1", DEFINITION).get("k1") is not None
+
+
+def test_file_key_rehashes_only_changed_files(tmp_path):
+    path = tmp_path / "a.wav"
+    path.write_bytes(b"first")
+    cache = FeatureCache(tmp_path / "cache", "v1")
+    assert cache.file_key(path) == file_sha256(path)
+
+    # Тот же размер и время изменения — хэш из индекса, файл не читается
+    stat = path.stat()
+    path.write_bytes(b"other")
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert cache.file_key(path) != file_sha256(path)
+
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert cache.file_key(path) == file_sha256(path)
+
+
+def test_prune_keeps_present_files_and_live_keys(tmp_path):
+    kept_file = tmp_path / "kept.wav"
+    kept_file.write_bytes(b"kept")
+    gone_file = tmp_path / "gone.wav"
+    gone_file.write_bytes(b"gone")
+    cache = FeatureCache(tmp_path / "cache", "v1")
+    for path in (kept_file, gone_file):
+        cache.put(cache.file_key(path), np.ones(3))
+    cache.put("corpus-clip", np.zeros(3))
+
+    removed = cache.prune([kept_file], live_keys=["corpus-clip"])
+
+    assert removed == 1
+    assert cache.get(file_sha256(kept_file)) is not None and cache.get("corpus-clip") is not None
+    assert cache.get(file_sha256(gone_file)) is None
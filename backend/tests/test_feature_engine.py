@@ -0,0 +1,47 @@
+import numpy as np
+
+import feature_engine
+from feature_engine import (
+    NUM_FEATURES, check_parity, extract_features, parity_tolerance,
+    reference_features, synthetic_speech
+)
+
+
+def test_check_parity():
+    assert check_parity()
+
+
+def test_batch_matches_reference():
+    sr = 16000
+    rng = np.random.default_rng(0)
+    audio = np.concatenate([
+        0.1 * rng.standard_normal(sr // 2),
+        synthetic_speech(2.0, sr, seed=1) + 0.05 * rng.standard_normal(2 * sr)
+    ]).astype(np.float32)
+
+    fast = extract_features(audio, sr)
+    reference = reference_features(audio, sr)
+
+    assert fast.shape == (NUM_FEATURES,) == (len(feature_engine.FEATURE_NAMES),)
+    assert np.all(np.abs(fast - reference) <= parity_tolerance() + 0.01 * np.abs(reference))
+
+
+def test_stream_analysis_matches_batch_per_group():
+    # Кадры, спектры и пересчёт в finalize() не должны зависеть от нарезки
+    sr = 16000
+    rng = np.random.default_rng(3)
+    audio = (synthetic_speech(2.5, sr, f0=130, seed=3) + 0.1 * rng.standard_normal(int(2.5 * sr))).astype(np.float32)
+    cleaned = feature_engine.denoise(feature_engine.normalize_signal(audio), sr)
+    expected = reference_features(audio, sr)
+    tolerance = parity_tolerance() + 0.01 * np.abs(expected)
+
+    groups = {
+        "mfcc": slice(0, 2 * feature_engine.N_MFCC),
+        "chroma": slice(2 * feature_engine.N_MFCC, 2 * feature_engine.N_MFCC + 24),
+        "zcr": slice(NUM_FEATURES - 4, NUM_FEATURES - 2),
+        "centroid": slice(NUM_FEATURES - 2, NUM_FEATURES),
+    }
+    for chunk in (7, 333, 4096, len(cleaned)):
+        streamed = feature_engine._stream_analysis(cleaned, sr, chunk)
+        for name, group in groups.items():
+            assert np.all(np.abs(streamed[group] - expected[group]) <= tolerance[group]), (name, chunk)
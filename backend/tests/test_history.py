@@ -0,0 +1,87 @@
+import csv
+import io
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import history
+import models
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    models.Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    with factory() as db:
+        start = datetime(2024, 1, 1)
+        for i in range(10):
+            # По две записи на одно время: порядок внутри — по id
+            db.add(models.IdentificationLog(
+                user_id=1, identified_speaker="anna" if i % 3 else "boris", confidence=0.9,
+                model_used="Ensemble", processing_time=0.1, created_at=start + timedelta(minutes=i // 2)
+            ))
+        db.add(models.IdentificationLog(user_id=2, identified_speaker="anna", confidence=0.9,
+                                        model_used="Ensemble", processing_time=0.1, created_at=start))
+        db.commit()
+    yield factory
+    engine.dispose()
+
+
+def all_pages(db, limit, **filters):
+    ids, cursor = [], None
+    while True:
+        rows, cursor = history.page(history.filtered(db, 1, **filters), limit, cursor)
+        ids.append([row.id for row in rows])
+        if cursor is None:
+            return ids
+
+
+def test_pages_cover_history_newest_first_without_gaps(session_factory):
+    with session_factory() as db:
+        pages = all_pages(db, 3)
+        expected = [log.id for log in db.query(models.IdentificationLog).filter_by(user_id=1)
+                    .order_by(models.IdentificationLog.created_at.desc(), models.IdentificationLog.id.desc())]
+
+    assert [len(ids) for ids in pages] == [3, 3, 3, 1]
+    assert sum(pages, []) == expected
+
+
+def test_new_rows_do_not_shift_following_pages(session_factory):
+    with session_factory() as db:
+        first, cursor = history.page(history.filtered(db, 1), 4)
+        last_id = first[-1].id
+        db.add(models.IdentificationLog(user_id=1, identified_speaker="anna", confidence=0.5,
+                                        model_used="Ensemble", created_at=datetime(2030, 1, 1)))
+        db.commit()
+        second, _ = history.page(history.filtered(db, 1), 4, cursor)
+
+    assert second[0].id == last_id - 1
+
+
+def test_filters_and_exact_last_page(session_factory):
+    with session_factory() as db:
+        boris = all_pages(db, 10, speaker="boris")
+        window = all_pages(db, 10, date_from=datetime(2024, 1, 1, 0, 1), date_to=datetime(2024, 1, 1, 0, 3))
+        rows, cursor = history.page(history.filtered(db, 1), 10)
+
+    assert len(boris) == 1 and len(boris[0]) == 4
+    assert len(window[0]) == 4
+    assert len(rows) == 10 and cursor is None
+
+
+def test_bad_cursor_is_rejected():
+    with pytest.raises(ValueError):
+        history.decode_cursor("not-a-cursor")
+
+
+def test_export_streams_all_pages(session_factory, monkeypatch):
+    monkeypatch.setattr(history, "EXPORT_PAGE_SIZE", 4)
+    chunks = list(history.export(session_factory, "csv", 1))
+
+    rows = list(csv.reader(io.StringIO("".join(chunks))))
+    assert len(chunks) == 3
+    assert rows[0] == history.EXPORT_FIELDS and len(rows) == 11
@@ -0,0 +1,66 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from inference_pool import InferencePool
+
+
+def slow_square(x, delay=0.0):
+    time.sleep(delay)
+    return x * x
+
+
+def test_tasks_accepted_before_restart_finish_in_the_old_pool():
+    pool = InferencePool("thread", workers=2)
+
+    async def scenario():
+        pending = [asyncio.ensure_future(pool.run(slow_square, i, 0.1)) for i in range(4)]
+        await asyncio.sleep(0.02)
+        old = pool._executor
+        pool.restart()
+        assert pool._executor is not old
+        return await asyncio.gather(*pending)
+
+    try:
+        assert asyncio.run(scenario()) == [0, 1, 4, 9]
+    finally:
+        pool.shutdown()
+
+
+def test_restart_from_another_thread_does_not_break_submissions(monkeypatch):
+    # Публикация моделей перезапускает пул из потока задачи переобучения.
+    # Исполнитель задерживает submit, чтобы restart() попал ровно между
+    # выбором исполнителя и отправкой задачи
+    submitting = threading.Event()
+
+    class SlowSubmit(ThreadPoolExecutor):
+        def submit(self, fn, *args, **kwargs):
+            submitting.set()
+            time.sleep(0.2)
+            return super().submit(fn, *args, **kwargs)
+
+    pool = InferencePool("thread", workers=1)
+    monkeypatch.setattr(pool, "_create_executor", lambda: SlowSubmit(max_workers=1))
+    pool.start()
+    restarter = threading.Thread(target=lambda: submitting.wait(5) and pool.restart())
+    restarter.start()
+    try:
+        assert asyncio.run(pool.run(slow_square, 7)) == 49
+    finally:
+        restarter.join()
+        pool.shutdown()
+
+
+def test_broken_pool_is_replaced_once():
+    pool = InferencePool("thread", workers=1)
+    pool.start()
+    broken = pool._executor
+    pool.restart(broken=broken)
+    replacement = pool._executor
+
+    # Второй запрос, упавший на том же пуле, уже заменённый пул не трогает
+    pool.restart(broken=broken)
+
+    assert pool._executor is replacement is not broken
+    pool.shutdown()
@@ -0,0 +1,47 @@
+import os
+
+from sklearn.preprocessing import LabelEncoder
+
+from model_store import (
+    ModelBundle, current_version, list_versions, prune_versions, publish_version, save_models
+)
+
+
+def save(models_path, version, mtime):
+    path = save_models(
+        models_path, version,
+        rf_model="rf", svm_model="svm", lr_model="lr", scaler=None,
+        label_encoder=LabelEncoder().fit(["a", "b"])
+    )
+    os.utime(path, (mtime, mtime))
+
+
+def test_publish_and_load_bundle(tmp_path):
+    save(tmp_path, "v1", 1000)
+    publish_version(tmp_path, "v1")
+
+    bundle = ModelBundle(tmp_path)
+
+    assert current_version(tmp_path) == "v1"
+    assert bundle.version == "v1" and bundle.speakers == ["a", "b"]
+
+
+def test_prune_keeps_latest_versions_and_the_published_one(tmp_path):
+    # Имена не по порядку: старшинство определяется временем сохранения
+    for i, version in enumerate(["old", "published", "v3", "v4", "newest"]):
+        save(tmp_path, version, 1000 + i)
+    publish_version(tmp_path, "published")
+
+    removed = prune_versions(tmp_path, keep=2)
+
+    assert removed == ["old", "v3"]
+    assert list_versions(tmp_path) == ["published", "v4", "newest"]
+    assert ModelBundle(tmp_path).version == "published"
+
+
+def test_prune_disabled_and_empty_store(tmp_path):
+    assert prune_versions(tmp_path, keep=2) == []
+    save(tmp_path, "v1", 1000)
+    save(tmp_path, "v2", 1001)
+    assert prune_versions(tmp_path, keep=0) == []
+    assert list_versions(tmp_path) == ["v1", "v2"]
@@ -0,0 +1,71 @@
+import numpy as np
+
+import online_model
+from online_model import OnlineModel, latest_version
+
+
+# Центры говорящих в общем положении (на одной прямой средний класс
+# линейно «один против всех» не отделить)
+CENTERS = np.random.default_rng(0).normal(0, 2, (6, 8))
+
+
+def samples(speaker, n=10, seed=0):
+    return np.random.default_rng(seed).normal(CENTERS[speaker], 0.3, (n, CENTERS.shape[1]))
+
+
+def test_learns_new_speakers_without_retraining():
+    model = OnlineModel(capacity=3)
+    model.learn("anna", samples(0))
+    model.learn("boris", samples(1, seed=1))
+    model.learn("vera", samples(2, seed=2))
+
+    proba = model.predict_proba(np.vstack([samples(0, 2, seed=3), samples(1, 2, seed=4)]))
+
+    assert model.speakers == ["anna", "boris", "vera"]
+    assert proba.shape == (4, 3)
+    np.testing.assert_allclose(proba.sum(axis=1), 1.0)
+    assert proba.argmax(axis=1).tolist() == [0, 0, 1, 1]
+
+
+def test_growing_capacity_keeps_learned_speakers():
+    model = OnlineModel(capacity=3)
+    for i, name in enumerate(["a", "b", "c", "d"]):
+        model.learn(name, samples(i, seed=i))
+
+    assert model.capacity == 6
+    proba = model.predict_proba(np.vstack([samples(i, 1, seed=10 + i) for i in range(4)]))
+    assert proba.shape == (4, 4)
+    assert proba.argmax(axis=1).tolist() == [0, 1, 2, 3]
+
+
+def test_reuploaded_clip_replaces_its_replay_sample():
+    model = OnlineModel(capacity=3)
+    model.learn("anna", samples(0, 2), ["anna/1.wav", "anna/2.wav"])
+    model.learn("anna", samples(0, 1, seed=1), ["anna/1.wav"])
+
+    replay = model._replay[0]
+    assert [clip_id for clip_id, _ in replay] == ["anna/2.wav", "anna/1.wav"]
+
+
+def test_seed_adds_only_unknown_speakers():
+    model = OnlineModel(capacity=3)
+    model.learn("anna", samples(0))
+
+    added = model.seed({"anna": samples(2), "boris": samples(1), "empty": np.empty((0, 8))})
+
+    assert added == 1 and model.speakers == ["anna", "boris"]
+
+
+def test_snapshots_are_versioned_and_trimmed(tmp_path, monkeypatch):
+    monkeypatch.setattr(online_model, "KEEP_SNAPSHOTS", 2)
+    model = OnlineModel(capacity=3)
+    for i in range(3):
+        model.learn(f"s{i}", samples(i, seed=i))
+        model.save(tmp_path)
+
+    assert latest_version(tmp_path) == model.version
+    assert len(list(tmp_path.glob("online-*.joblib"))) == 2
+    loaded = OnlineModel.load(tmp_path)
+    probe = samples(1, 2, seed=9)
+    np.testing.assert_allclose(loaded.predict_proba(probe), model.predict_proba(probe))
+    assert OnlineModel.load(tmp_path / "missing") is None
@@ -0,0 +1,41 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import soundfile as sf
+
+from prepare_initial_dataset import ingest_file
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def test_ingest_file_converts_links_and_reports_errors(tmp_path):
+    source = tmp_path / "source"
+    target = tmp_path / "target"
+    source.mkdir()
+    target.mkdir()
+    sf.write(source / "resample.wav", 0.1 * np.random.default_rng(0).standard_normal(22050), 22050)
+    sf.write(source / "canonical.wav", np.zeros(16000, dtype=np.float32), 16000, subtype="FLOAT")
+    (source / "broken.wav").write_bytes(b"not audio")
+
+    converted, error = ingest_file((source / "resample.wav", target / "resample.wav"))
+    assert error is None and converted["mode"] == "convert" and converted["sample_rate"] == 16000
+    assert sf.info(str(target / "resample.wav")).samplerate == 16000
+
+    linked, error = ingest_file((source / "canonical.wav", target / "canonical.wav"))
+    assert error is None and linked["mode"] in ("link", "copy")
+
+    entry, error = ingest_file((source / "broken.wav", target / "broken.wav"))
+    assert entry is None and error
+
+
+def test_runs_without_server_settings():
+    # Подготовка датасета не должна требовать DATABASE_URL и SECRET_KEY
+    env = {key: value for key, value in os.environ.items() if key not in ("DATABASE_URL", "SECRET_KEY")}
+    result = subprocess.run(
+        [sys.executable, "-c", "import prepare_initial_dataset, sys; assert 'config' not in sys.modules"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
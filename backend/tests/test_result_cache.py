@@ -0,0 +1,65 @@
+import result_cache
+from result_cache import ResultCache, audio_key
+
+
+def test_key_depends_on_content_and_parameters():
+    key = audio_key(b"audio", "v1", "classifier", True)
+    assert key == audio_key(b"audio", "v1", "classifier", True)
+    assert key != audio_key(b"audio", "v2", "classifier", True)
+    assert key != audio_key(b"other", "v1", "classifier", True)
+
+
+def test_lru_eviction_and_hit_rate():
+    cache = ResultCache(max_entries=2, ttl=60)
+    cache.set("a", {"speaker": "a"})
+    cache.set("b", {"speaker": "b"})
+    assert cache.get("a") == {"speaker": "a"}  # a становится самой свежей
+    cache.set("c", {"speaker": "c"})
+
+    assert cache.get("b") is None
+    assert cache.get("c") == {"speaker": "c"}
+    stats = cache.stats()
+    assert (stats["entries"], stats["hits"], stats["misses"], stats["hit_rate"]) == (2, 2, 1, 0.6667)
+
+
+def test_entries_expire(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(result_cache.time, "monotonic", lambda: now[0])
+    cache = ResultCache(max_entries=10, ttl=5)
+    cache.set("a", {"speaker": "a"})
+
+    now[0] += 4
+    assert cache.get("a") is not None
+    now[0] += 2
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_clear_and_disabled_cache():
+    cache = ResultCache(max_entries=10, ttl=60)
+    cache.set("a", {"speaker": "a"})
+    cache.clear()
+    assert cache.get("a") is None
+
+    disabled = ResultCache(max_entries=0)
+    disabled.set("a", {"speaker": "a"})
+    assert disabled.get("a") is None and disabled.stats()["misses"] == 0
+
+
+def test_backend_errors_do_not_break_requests():
+    class Broken:
+        def get(self, key):
+            raise ConnectionError("redis недоступен")
+
+        set = clear = get
+
+        def __len__(self):
+            raise ConnectionError("redis недоступен")
+
+    cache = ResultCache(max_entries=10)
+    cache.backend = Broken()
+    cache.set("a", {"speaker": "a"})
+    cache.clear()
+
+    assert cache.get("a") is None
+    assert cache.stats()["errors"] == 3 and cache.stats()["entries"] is None
@@ -0,0 +1,60 @@
+import threading
+
+import pytest
+
+from retrain_jobs import RetrainInProgress, RetrainJobManager
+
+
+class FakeTraining(RetrainJobManager):
+    """Вместо retrain_model.py — обучение, которое ждёт сигнала и может упасть"""
+
+    def __init__(self, on_success, fail=False):
+        super().__init__("models", on_success=on_success)
+        self.fail = fail
+        self.release = threading.Event()
+
+    def _train(self, job):
+        job.progress, job.stage = 0.5, "Обучение"
+        self.release.wait(5)
+        if self.fail:
+            raise Exception("Ошибка переобучения (код 1): нет данных")
+
+
+def wait_finished(job):
+    for _ in range(500):
+        if not job.active:
+            return job
+        threading.Event().wait(0.01)
+    raise AssertionError("задача не завершилась")
+
+
+def test_successful_job_publishes_its_version():
+    published = []
+    manager = FakeTraining(published.append)
+
+    job = manager.submit()
+    with pytest.raises(RetrainInProgress):
+        manager.submit()
+    manager.release.set()
+    wait_finished(job)
+
+    assert job.status == "succeeded" and job.progress == 1.0
+    assert published == [job.version]
+    assert manager.get(job.id) is job
+    assert manager.submit().id != job.id
+
+
+def test_failed_training_or_activation_marks_job_failed():
+    manager = FakeTraining(lambda version: None, fail=True)
+    manager.release.set()
+    job = wait_finished(manager.submit())
+    assert job.status == "failed" and "нет данных" in job.error
+
+    def broken_activation(version):
+        raise FileNotFoundError(f"Версия моделей {version} не найдена")
+
+    manager = FakeTraining(broken_activation)
+    manager.release.set()
+    job = wait_finished(manager.submit())
+    assert job.status == "failed" and job.version in job.error
+    assert job.finished_at is not None
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from retrain_model import fit_svm, holdout_split
+
+
+def speakers(counts, dim=8, seed=0):
+    """Хорошо разделимые говорящие с заданным числом записей"""
+    rng = np.random.default_rng(seed)
+    X = np.vstack([rng.normal(loc=3 * label, size=(count, dim)) for label, count in enumerate(counts)])
+    y = np.concatenate([np.full(count, label) for label, count in enumerate(counts)])
+    return X, y
+
+
+def test_holdout_split_keeps_every_class_on_both_sides():
+    _, y = speakers([7, 7, 6, 6, 6, 6, 2])
+    fit_idx, calibration_idx = holdout_split(y)
+
+    assert set(y[fit_idx]) == set(y[calibration_idx]) == set(y)
+    assert len(np.intersect1d(fit_idx, calibration_idx)) == 0
+    assert len(fit_idx) + len(calibration_idx) == len(y)
+
+
+def test_holdout_split_rejects_single_sample_class():
+    with pytest.raises(ValueError):
+        holdout_split(np.array([0, 0, 0, 1]))
+
+
+def test_holdout_svm_with_newly_enrolled_speaker():
+    # Новый говорящий с двумя образцами: раньше калибровка падала с IndexError
+    X, y = speakers([7, 7, 6, 6, 6, 6, 2])
+    model = fit_svm(X, y, calibration="holdout")
+
+    proba = model.predict_proba(X)
+    assert proba.shape == (len(X), 7)
+    assert np.mean(model.classes_[np.argmax(proba, axis=1)] == y) > 0.9
+
+
+def test_holdout_svm_falls_back_to_cv_for_single_sample_class():
+    X, y = speakers([6, 6, 6, 1])
+    model = fit_svm(X, y, calibration="holdout")
+    assert model.predict_proba(X).shape == (len(X), 4)
+
+
+def test_cascade_report_with_partial_stages():
+    # CASCADE_STAGES=lr,svm: эталонный ансамбль всё равно из всех трёх моделей
+    from retrain_model import evaluate_cascade, fit_logistic_regression, fit_random_forest
+
+    X, y = speakers([8, 8, 8])
+    models = {
+        "rf": fit_random_forest(X, y, n_jobs=1),
+        "svm": fit_svm(X, y, calibration="cv"),
+        "lr": fit_logistic_regression(X, y),
+    }
+    report = evaluate_cascade(models, X, y, stages=("lr", "svm"), margins=(0.1, 0.5))
+
+    assert report["ensemble_accuracy"] > 0.9
+    for result in report["margins"].values():
+        assert 1 <= result["mean_models"] <= 2
+        assert 0 <= result["agreement"] <= 1
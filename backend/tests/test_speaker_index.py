@@ -0,0 +1,141 @@
+import io
+
+import numpy as np
+import soundfile as sf
+
+from feature_engine import synthetic_speech
+from speaker_index import CLIPS_FILE, LABELS_FILE, VECTORS_FILE, SpeakerIndex
+
+
+def vectors(n, seed=0, dim=54):
+    return np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+
+
+def test_search_finds_nearest_speaker(tmp_path):
+    index = SpeakerIndex(tmp_path)
+    rows = vectors(6)
+    for i, row in enumerate(rows):
+        index.add(f"s{i % 3}", row, f"s{i % 3}/{i}.wav")
+
+    matches = index.search(rows[4], k=2)
+
+    assert matches[0]["speaker"] == "s1"
+    assert matches[0]["score"] > 0.99
+    assert len(matches) == 2
+    assert index.counts() == {"s0": 2, "s1": 2, "s2": 2}
+
+
+def test_replacing_clip_keeps_size_and_bumps_generation(tmp_path):
+    index = SpeakerIndex(tmp_path)
+    rows = vectors(3)
+    index.add("a", rows[0], "a/1.wav")
+    index.add("b", rows[1], "b/1.wav")
+    generation = index.generation
+
+    index.add("a", rows[2], "a/1.wav")
+
+    assert len(index) == 2
+    assert index.generation > generation
+    np.testing.assert_array_equal(index.vectors("a"), rows[2:3])
+    # После перезагрузки побеждает последняя запись
+    np.testing.assert_array_equal(SpeakerIndex(tmp_path).vectors("a"), rows[2:3])
+
+
+def test_torn_append_is_reconciled_on_load(tmp_path):
+    index = SpeakerIndex(tmp_path)
+    rows = vectors(4)
+    index.add("a", rows[0], "a/1.wav")
+    index.add("b", rows[1], "b/1.wav")
+    # Процесс упал посреди записи: вектор и половина ключа есть, имени нет
+    with open(tmp_path / VECTORS_FILE, "ab") as f:
+        f.write(rows[2].tobytes()[:100])
+    with open(tmp_path / CLIPS_FILE, "ab") as f:
+        f.write(b"c/1.w")
+
+    reloaded = SpeakerIndex(tmp_path)
+    assert len(reloaded) == 2
+    reloaded.add("d", rows[3], "d/1.wav")
+
+    # Новая запись не сдвинулась относительно старых
+    again = SpeakerIndex(tmp_path)
+    assert again.counts() == {"a": 1, "b": 1, "d": 1}
+    np.testing.assert_array_equal(again.vectors("d"), rows[3:4])
+    assert (tmp_path / CLIPS_FILE).read_text(encoding="utf-8").splitlines() == ["a/1.wav", "b/1.wav", "d/1.wav"]
+
+
+def test_crash_between_vector_and_label_is_reconciled(tmp_path):
+    index = SpeakerIndex(tmp_path)
+    rows = vectors(3)
+    index.add("a", rows[0], "a/1.wav")
+    with open(tmp_path / VECTORS_FILE, "ab") as f:
+        f.write(rows[1].tobytes())
+    with open(tmp_path / CLIPS_FILE, "a", encoding="utf-8") as f:
+        f.write("b/1.wav\n")
+
+    SpeakerIndex(tmp_path).add("c", rows[2], "c/1.wav")
+
+    again = SpeakerIndex(tmp_path)
+    assert again.speakers == ["a", "c"]
+    np.testing.assert_array_equal(again.vectors("c"), rows[2:3])
+
+
+def test_index_without_clip_keys_still_loads(tmp_path):
+    rows = vectors(2)
+    (tmp_path / VECTORS_FILE).write_bytes(rows.tobytes())
+    (tmp_path / LABELS_FILE).write_text("a\nb\n", encoding="utf-8")
+
+    index = SpeakerIndex(tmp_path)
+
+    assert index.counts() == {"a": 1, "b": 1}
+    assert (tmp_path / CLIPS_FILE).read_text(encoding="utf-8") == "\n\n"
+
+
+def wav_bytes(audio, sr=16000) -> bytes:
+    buffer = io.BytesIO()
+    sf.write(buffer, audio, sr, format="WAV")
+    return buffer.getvalue()
+
+
+def identify_by_index(client, token, audio):
+    response = client.post(
+        "/api/identify", params={"mode": "index"},
+        files={"audio_file": ("probe.wav", audio, "audio/wav")},
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_index_mode_rejects_unknown_voice_and_sees_replacements(client, token, app_main, monkeypatch):
+    from inference_pool import extract_audio_features
+
+    audio = wav_bytes(synthetic_speech(1.5, 16000, seed=7))
+    features = extract_audio_features([audio])[0][0]
+    index = app_main.speaker_index
+    for i, row in enumerate(vectors(6, seed=1)):
+        index.add(f"other{i % 3}", row * 50, f"other{i % 3}/{i}.wav")
+    index.add("dora", features, "dora/1.wav")
+
+    result = identify_by_index(client, token, audio)
+    assert result["identified_speaker"] == "dora"
+    assert result["confidence"] > 0.99
+
+    # Замена образца не меняет len(), но ответ из кэша уже не годится
+    index.add("dora", vectors(1, seed=2)[0] * 50, "dora/1.wav")
+    replaced = identify_by_index(client, token, audio)
+    assert replaced["probabilities"]["dora"] < result["probabilities"]["dora"]
+
+    # Голос дальше порога — не узнан, и доступ не выдаётся
+    monkeypatch.setattr(app_main.settings, "SPEAKER_INDEX_MIN_SCORE", 1.01)
+    index.add("dora", features, "dora/1.wav")
+    rejected = identify_by_index(client, token, audio)
+    assert rejected["identified_speaker"] is None
+    assert not app_main.access_granted(rejected["identified_speaker"], rejected["confidence"], rejected["model_used"])
+
+
+def test_access_threshold_depends_on_the_model(app_main):
+    settings = app_main.settings
+    assert app_main.access_granted("a", settings.SPEAKER_INDEX_MIN_SCORE, app_main.INDEX_MODEL)
+    assert not app_main.access_granted("a", settings.SPEAKER_INDEX_MIN_SCORE - 0.01, app_main.INDEX_MODEL)
+    assert not app_main.access_granted("a", settings.ACCESS_CONFIDENCE, "Ensemble (RF+SVM+LR)")
+    assert not app_main.access_granted(None, 1.0, app_main.INDEX_MODEL)
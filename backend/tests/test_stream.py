@@ -0,0 +1,73 @@
+from contextlib import asynccontextmanager
+
+import numpy as np
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from admission import AdmissionController, AdmissionRejected
+from feature_engine import synthetic_speech
+
+
+def stream(client, token, frames, sr=16000):
+    """Отправляет фрагменты в /ws/identify и возвращает все ответы сервера"""
+    replies = []
+    with client.websocket_connect(f"/ws/identify?token={token}&sr={sr}") as ws:
+        for frame in frames:
+            ws.send_bytes(frame)
+        ws.send_text("end")
+        while True:
+            reply = ws.receive_json()
+            replies.append(reply)
+            if reply.get("final"):
+                break
+    return replies
+
+
+def speech_frames(duration=2.0, size=1600):
+    audio = synthetic_speech(duration, 16000).astype("<f4")
+    return [audio[i:i + size].tobytes() for i in range(0, len(audio), size)]
+
+
+def test_stream_returns_final_result(client, token):
+    final = stream(client, token, speech_frames())[-1]
+
+    assert final["final"] is True
+    assert final["identified_speaker"] in ("alice", "bob", "carol")
+    assert final["duration"] > 0
+
+
+def test_stream_rejects_truncated_float32_frame(client, token):
+    with client.websocket_connect(f"/ws/identify?token={token}") as ws:
+        ws.send_bytes(np.zeros(100, dtype="<f4").tobytes()[:-1])
+        reply = ws.receive_json()
+        assert reply["final"] is True and "4" in reply["error"]
+        with pytest.raises(WebSocketDisconnect) as closed:
+            ws.receive_json()
+    assert closed.value.code == 1003
+
+
+def test_stream_goes_through_admission(client, token, app_main, monkeypatch):
+    controller = AdmissionController(max_inflight=1)
+    monkeypatch.setattr(app_main, "admission", controller)
+    frames = speech_frames()
+
+    stream(client, token, frames)
+
+    # Каждый фрагмент, каждая промежуточная оценка и итог
+    assert controller.admitted >= len(frames) + 1
+    assert controller.inflight == 0
+
+
+def test_stream_closes_with_retry_later_when_overloaded(client, token, app_main, monkeypatch):
+    class Overloaded:
+        @asynccontextmanager
+        async def slot(self):
+            raise AdmissionRejected("Сервис перегружен", 3)
+            yield
+
+    monkeypatch.setattr(app_main, "admission", Overloaded())
+    with client.websocket_connect(f"/ws/identify?token={token}") as ws:
+        ws.send_bytes(speech_frames()[0])
+        with pytest.raises(WebSocketDisconnect) as closed:
+            ws.receive_json()
+    assert closed.value.code == 1013
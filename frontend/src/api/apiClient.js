@@ -15,6 +15,37 @@ export const identifySpeaker = async (audioBlob) => {
   return response.json();
 };
 
+// Потоковая идентификация: PCM float32 с микрофона уходит по WebSocket,
+// сервер присылает промежуточные оценки и итог с final: true
+export const openIdentifyStream = (sampleRate, { onEstimate, onResult, onError }) => {
+  const token = localStorage.getItem('token') || '';
+  const params = new URLSearchParams({ token, sr: sampleRate, use_ensemble: true });
+  const ws = new WebSocket(`${API_BASE.replace(/^http/, 'ws')}/ws/identify?${params}`);
+  ws.binaryType = 'arraybuffer';
+
+  ws.onmessage = (event) => {
+    const message = JSON.parse(event.data);
+    if (message.error) onError(new Error(message.error));
+    else if (message.final) onResult(message);
+    else onEstimate(message);
+  };
+  ws.onerror = () => onError(new Error('Identification stream failed'));
+
+  // Пока соединение открывается, фрагменты копятся в очереди
+  const pending = [];
+  const send = (data) => {
+    if (ws.readyState === WebSocket.OPEN) ws.send(data);
+    else if (ws.readyState === WebSocket.CONNECTING) pending.push(data);
+  };
+  ws.onopen = () => pending.splice(0).forEach(data => ws.send(data));
+
+  return {
+    sendChunk: (samples) => send(samples.buffer),
+    end: () => send('end'),
+    close: () => ws.close()
+  };
+};
+
 // ======================== REGISTRATION ========================
 export const registerAudioSample = async (speakerName, sampleNumber, audioBlob) => {
   const formData = new FormData();
@@ -24,6 +55,7 @@ export const registerAudioSample = async (speakerName, sampleNumber, audioBlob)
     `${API_BASE}/api/register/audio?speaker_name=${encodeURIComponent(speakerName)}&sample_number=${sampleNumber}`,
     {
       method: 'POST',
+      headers: { Authorization: `Bearer ${localStorage.getItem('token') || ''}` },
       body: formData
     }
   );
@@ -38,15 +70,41 @@ export const getRegisteredSpeakers = async () => {
 };
 
 // ======================== MODEL MANAGEMENT ========================
-export const retrainModels = async () => {
+export const getRetrainStatus = async (jobId) => {
+  const response = await fetch(`${API_BASE}/api/models/retrain/${jobId}`);
+  if (!response.ok) throw new Error('Retraining status unavailable');
+  return response.json();
+};
+
+// Запускает переобучение в фоне и ждёт его завершения, сообщая прогресс
+export const retrainModels = async (onProgress = () => {}, pollInterval = 2000) => {
   const response = await fetch(`${API_BASE}/api/models/retrain`, {
     method: 'POST'
   });
-  if (!response.ok) throw new Error('Retraining failed');
-  return response.json();
+  if (!response.ok && response.status !== 409) throw new Error('Retraining failed');
+
+  const started = await response.json();
+  // 409: переобучение уже идёт — следим за текущей задачей
+  const jobId = started.job_id || started.detail?.job_id;
+
+  while (true) {
+    const job = await getRetrainStatus(jobId);
+    onProgress(job);
+    if (job.status === 'succeeded') return job;
+    if (job.status === 'failed') throw new Error(job.error || 'Retraining failed');
+    await new Promise(resolve => setTimeout(resolve, pollInterval));
+  }
 };
 
 export const getLatestIdentification = async () => {
   const response = await fetch(`${API_BASE}/api/monitor/latest`);
   return response.json();
-};
\ No newline at end of file
+};
+
+// Поток результатов идентификации для панели оператора (Server-Sent Events);
+// EventSource сам переподключается и передаёт Last-Event-ID
+export const subscribeMonitor = (onEvent, replay = 10) => {
+  const source = new EventSource(`${API_BASE}/api/monitor/stream?replay=${replay}`);
+  source.addEventListener('identification', (e) => onEvent(JSON.parse(e.data)));
+  return () => source.close();
+};
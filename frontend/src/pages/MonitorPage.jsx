@@ -1,7 +1,7 @@
 import React, { useState, useRef, useEffect } from 'react';
 import { UserPlus, Mic, Square, RefreshCw, CheckCircle, Activity } from 'lucide-react';
 import { motion } from 'framer-motion';
-import { registerAudioSample, getRegisteredSpeakers, retrainModels } from '../api/apiClient';
+import { registerAudioSample, getRegisteredSpeakers, retrainModels, subscribeMonitor } from '../api/apiClient';
 
 const MonitorPage = () => {
   const [mode, setMode] = useState('view'); // 'view' или 'register'
@@ -13,6 +13,8 @@ const MonitorPage = () => {
   const [audioLevel, setAudioLevel] = useState(0);
   const [registeredSpeakers, setRegisteredSpeakers] = useState([]);
   const [isRetraining, setIsRetraining] = useState(false);
+  const [retrainStage, setRetrainStage] = useState('');
+  const [identifications, setIdentifications] = useState([]);
   
   const mediaRecorderRef = useRef(null);
   const audioContextRef = useRef(null);
@@ -25,6 +27,14 @@ const MonitorPage = () => {
     loadSpeakers();
   }, []);
 
+  // Результаты идентификации приходят сразу, без опроса сервера
+  useEffect(() => {
+    const unsubscribe = subscribeMonitor((event) => {
+      setIdentifications(prev => [event, ...prev.filter(e => e.id !== event.id)].slice(0, 10));
+    });
+    return unsubscribe;
+  }, []);
+
   const loadSpeakers = async () => {
     try {
       const data = await getRegisteredSpeakers();
@@ -136,13 +146,16 @@ const MonitorPage = () => {
     
     setIsRetraining(true);
     try {
-      await retrainModels();
-      alert('Модель успешно переобучена! Перезапустите backend для загрузки новых моделей.');
+      await retrainModels((job) => {
+        setRetrainStage(`${Math.round(job.progress * 100)}% — ${job.stage}`);
+      });
+      alert('Модель успешно переобучена и загружена!');
     } catch (error) {
       console.error('Error:', error);
       alert('Ошибка при переобучении');
     } finally {
       setIsRetraining(false);
+      setRetrainStage('');
     }
   };
 
@@ -287,6 +300,60 @@ const MonitorPage = () => {
               )}
             </div>
 
+            <div style={{
+              background: 'rgba(255, 255, 255, 0.1)',
+              backdropFilter: 'blur(16px)',
+              borderRadius: '1rem',
+              padding: '2rem',
+              marginBottom: '1rem'
+            }}>
+              <h2 style={{
+                fontSize: '1.5rem',
+                fontWeight: 'bold',
+                color: 'white',
+                marginBottom: '1.5rem',
+                display: 'flex',
+                alignItems: 'center',
+                gap: '0.5rem'
+              }}>
+                <Activity style={{ width: '1.5rem', height: '1.5rem' }} />
+                Последние идентификации
+              </h2>
+
+              {identifications.length === 0 ? (
+                <p style={{ color: '#9ca3af', textAlign: 'center', padding: '2rem' }}>
+                  Ожидание результатов...
+                </p>
+              ) : (
+                <div style={{ display: 'grid', gap: '0.5rem' }}>
+                  {identifications.map((item) => (
+                    <div
+                      key={item.id}
+                      style={{
+                        background: 'rgba(30, 41, 59, 0.5)',
+                        padding: '0.75rem 1rem',
+                        borderRadius: '0.5rem',
+                        display: 'flex',
+                        justifyContent: 'space-between',
+                        alignItems: 'center',
+                        borderLeft: `4px solid ${item.is_access_granted ? '#4ade80' : '#f87171'}`
+                      }}
+                    >
+                      <div>
+                        <p style={{ color: 'white', fontWeight: 'bold' }}>{item.speaker}</p>
+                        <p style={{ color: '#9ca3af', fontSize: '0.875rem' }}>
+                          {item.timestamp} · {item.model}
+                        </p>
+                      </div>
+                      <p style={{ color: item.is_access_granted ? '#4ade80' : '#f87171', fontWeight: 'bold' }}>
+                        {(item.confidence * 100).toFixed(1)}%
+                      </p>
+                    </div>
+                  ))}
+                </div>
+              )}
+            </div>
+
             <button
               onClick={handleRetrain}
               disabled={isRetraining || registeredSpeakers.length === 0}
@@ -313,7 +380,7 @@ const MonitorPage = () => {
                   animation: isRetraining ? 'spin 1s linear infinite' : 'none'
                 }} 
               />
-              {isRetraining ? 'Переобучение...' : 'Переобучить модель'}
+              {isRetraining ? `Переобучение... ${retrainStage}` : 'Переобучить модель'}
             </button>
           </motion.div>
         )}
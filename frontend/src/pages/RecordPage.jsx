@@ -1,7 +1,7 @@
 import React, { useState, useRef } from 'react';
 import { Mic, Square, CheckCircle, XCircle, Activity, User } from 'lucide-react';
 import { motion, AnimatePresence } from 'framer-motion';
-import { identifySpeaker } from '../api/apiClient';
+import { openIdentifyStream } from '../api/apiClient';
 
 const RecordPage = () => {
   const [isRecording, setIsRecording] = useState(false);
@@ -9,45 +9,64 @@ const RecordPage = () => {
   const [audioLevel, setAudioLevel] = useState(0);
   const [status, setStatus] = useState('idle'); // idle, recording, processing, success, denied
   const [result, setResult] = useState(null);
+  const [estimate, setEstimate] = useState(null);
   
-  const mediaRecorderRef = useRef(null);
+  const mediaStreamRef = useRef(null);
   const audioContextRef = useRef(null);
   const analyserRef = useRef(null);
-  const chunksRef = useRef([]);
+  const processorRef = useRef(null);
+  const identifyStreamRef = useRef(null);
   const timerRef = useRef(null);
   const animationRef = useRef(null);
 
+  // Останавливает микрофон и анализ; соединение с сервером не трогает
+  const finishRecording = () => {
+    setIsRecording(false);
+    clearInterval(timerRef.current);
+    cancelAnimationFrame(animationRef.current);
+    
+    if (processorRef.current) processorRef.current.disconnect();
+    if (mediaStreamRef.current) {
+      mediaStreamRef.current.getTracks().forEach(track => track.stop());
+    }
+    if (audioContextRef.current && audioContextRef.current.state !== 'closed') {
+      audioContextRef.current.close();
+    }
+  };
+
   const startRecording = async () => {
     try {
       const stream = await navigator.mediaDevices.getUserMedia({ audio: true });
+      mediaStreamRef.current = stream;
+      setEstimate(null);
       
-      mediaRecorderRef.current = new MediaRecorder(stream);
-      chunksRef.current = [];
-      
-      mediaRecorderRef.current.ondataavailable = (e) => {
-        if (e.data.size > 0) chunksRef.current.push(e.data);
-      };
+      audioContextRef.current = new AudioContext();
+      analyserRef.current = audioContextRef.current.createAnalyser();
+      const source = audioContextRef.current.createMediaStreamSource(stream);
+      source.connect(analyserRef.current);
       
-      mediaRecorderRef.current.onstop = async () => {
-        const audioBlob = new Blob(chunksRef.current, { type: 'audio/wav' });
-        stream.getTracks().forEach(track => track.stop());
-        
-        setStatus('processing');
-        
-        try {
-          const response = await identifySpeaker(audioBlob);
+      // Сырые отсчёты уходят на сервер по мере записи; решение может прийти
+      // раньше, чем пользователь нажмёт «Остановить»
+      identifyStreamRef.current = openIdentifyStream(audioContextRef.current.sampleRate, {
+        onEstimate: (message) => setEstimate(message),
+        onResult: (response) => {
+          finishRecording();
           setResult(response);
           setStatus(response.confidence > 0.8 ? 'success' : 'denied');
-        } catch (error) {
+        },
+        onError: (error) => {
           console.error('Error:', error);
+          finishRecording();
           setStatus('denied');
         }
-      };
+      });
       
-      audioContextRef.current = new AudioContext();
-      analyserRef.current = audioContextRef.current.createAnalyser();
-      const source = audioContextRef.current.createMediaStreamSource(stream);
-      source.connect(analyserRef.current);
+      processorRef.current = audioContextRef.current.createScriptProcessor(4096, 1, 1);
+      processorRef.current.onaudioprocess = (e) => {
+        identifyStreamRef.current.sendChunk(new Float32Array(e.inputBuffer.getChannelData(0)));
+      };
+      source.connect(processorRef.current);
+      processorRef.current.connect(audioContextRef.current.destination);
       
       analyserRef.current.fftSize = 256;
       const bufferLength = analyserRef.current.frequencyBinCount;
@@ -60,7 +79,6 @@ const RecordPage = () => {
         animationRef.current = requestAnimationFrame(updateLevel);
       };
       
-      mediaRecorderRef.current.start();
       setIsRecording(true);
       setStatus('recording');
       setRecordingTime(0);
@@ -77,15 +95,11 @@ const RecordPage = () => {
   };
 
   const stopRecording = () => {
-    if (mediaRecorderRef.current && isRecording) {
-      mediaRecorderRef.current.stop();
-      setIsRecording(false);
-      clearInterval(timerRef.current);
-      cancelAnimationFrame(animationRef.current);
-      
-      if (audioContextRef.current) {
-        audioContextRef.current.close();
-      }
+    if (isRecording) {
+      finishRecording();
+      // Итог по всей записи сервер пришлёт в ответ на "end"
+      identifyStreamRef.current.end();
+      setStatus('processing');
     }
   };
 
@@ -94,6 +108,7 @@ const RecordPage = () => {
     setResult(null);
     setRecordingTime(0);
     setAudioLevel(0);
+    setEstimate(null);
   };
 
   return (
@@ -169,6 +184,11 @@ const RecordPage = () => {
                 />
               </div>
               <p style={{ color: '#a5f3fc' }}>{recordingTime.toFixed(1)} / 5.0 сек</p>
+              {estimate && (
+                <p style={{ color: '#9ca3af', marginTop: '0.5rem' }}>
+                  Предварительно: {estimate.identified_speaker} ({(estimate.confidence * 100).toFixed(1)}%)
+                </p>
+              )}
             </motion.div>
           )}
 